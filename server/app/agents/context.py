@@ -0,0 +1,176 @@
+from __future__ import annotations
+from collections import OrderedDict, deque
+from sqlmodel import Session, select
+from ..core.config import settings
+from ..models import Post, Thread, ThreadSummary
+from ..services.authors import resolve_author_handles
+from ..services.summaries import SUMMARY_HEADER
+
+# older turns that no longer fit in full are kept as a one-line gist of about this many tokens
+GIST_TOKENS = 24
+
+
+def estimate_tokens(text: str) -> int:
+    """Rough token count (~4 characters per token); cheap enough to run on every post."""
+    return (len(text) + 3) // 4
+
+
+def _clip(text: str, tokens: int) -> str:
+    limit = tokens * 4
+    if len(text) <= limit:
+        return text
+    return text[: max(0, limit - 1)].rstrip() + "…"
+
+
+class Turn:
+    __slots__ = ("post_id", "author_type", "handle", "text", "tokens")
+
+    def __init__(self, post_id: int, author_type: str, handle: str, text: str) -> None:
+        self.post_id = post_id
+        self.author_type = author_type
+        self.handle = handle
+        self.text = _clip(text.strip(), settings.AGENT_CONTEXT_TURN_TOKENS)
+        self.tokens = estimate_tokens(self.text)
+
+    @property
+    def label(self) -> str:
+        return "AGENT" if self.author_type == "agent" else "USER"
+
+
+class ThreadWindow:
+    """The last AGENT_CONTEXT_MAX_TURNS visible posts of a thread plus its TL;DR summary."""
+
+    def __init__(self, thread_id: int) -> None:
+        self.thread_id = thread_id
+        self.turns: deque[Turn] = deque(maxlen=settings.AGENT_CONTEXT_MAX_TURNS)
+        self.summary = ""
+        self.summary_post_id: int | None = None
+        # posts up to this id are covered by the summary
+        self.summary_through = 0
+        # highest post id reflected here (turns or summary); anything newer means the window is stale
+        self.seen_through = 0
+        self._rendered: tuple[int, str, bool] | None = None
+
+    def add(self, turn: Turn) -> None:
+        if self.turns and turn.post_id <= self.turns[-1].post_id:
+            return
+        self.turns.append(turn)
+        self.seen_through = max(self.seen_through, turn.post_id)
+        self._rendered = None
+
+    def render(self, budget: int) -> tuple[str, bool]:
+        """Context text within `budget` tokens, and whether turns outside the summary had to be
+        condensed or left out (the summary should fold them in)."""
+        if self._rendered is not None and self._rendered[0] == budget:
+            return self._rendered[1], self._rendered[2]
+        used = 0
+        head = ""
+        if self.summary:
+            head = f"Thread summary so far:\n{_clip(self.summary, budget // 4)}\n\n"
+            used += estimate_tokens(head)
+
+        recent: list[str] = []
+        turns = list(self.turns)
+        i = len(turns)
+        while i > 0:
+            t = turns[i - 1]
+            line = f"{t.label}: {t.text}"
+            cost = t.tokens + 2
+            if used + cost > budget:
+                if recent:
+                    break
+                # always keep the newest turn, clipped to what is left
+                line = _clip(line, max(GIST_TOKENS, budget - used))
+                cost = estimate_tokens(line)
+            recent.append(line)
+            used += cost
+            i -= 1
+
+        gists: list[str] = []
+        older = [t for t in turns[:i] if t.post_id > self.summary_through]
+        for t in reversed(older):
+            line = f"- {t.label} @{t.handle}: {_clip(t.text, GIST_TOKENS)}"
+            cost = estimate_tokens(line)
+            if used + cost > budget:
+                break
+            gists.append(line)
+            used += cost
+
+        body = "\n\n".join(reversed(recent))
+        if gists:
+            body = "Earlier in the thread (condensed):\n" + "\n".join(reversed(gists)) + "\n\n" + body
+        out = (head + body, bool(older))
+        self._rendered = (budget, *out)
+        return out
+
+
+class ThreadContextCache:
+    """Per-thread context windows for agent prompts, kept in memory across replies.
+
+    A window is loaded from the database the first time an agent replies in a thread;
+    after that it is kept current from post_created events (note_post) and dropped on
+    post_hidden (invalidate). Each build re-checks two columns: the ThreadSummary row,
+    since summaries are written by the job workers of any process, and Thread.last_post_id,
+    since some posts are written without an event, in which case the window is reloaded.
+    At most AGENT_CONTEXT_MAX_THREADS windows are kept, least recently used first out.
+    """
+
+    def __init__(self) -> None:
+        self._windows: OrderedDict[int, ThreadWindow] = OrderedDict()
+
+    def note_post(self, post: dict) -> None:
+        w = self._windows.get(post.get("thread_id"))
+        content = post.get("content_md") or ""
+        if w is None or post.get("is_hidden") or content.startswith(SUMMARY_HEADER):
+            return
+        w.add(Turn(post["id"], post.get("author_type") or "user", post.get("author_handle") or "unknown", content))
+
+    def invalidate(self, thread_id: int | None) -> None:
+        self._windows.pop(thread_id, None)
+
+    def window(self, session: Session, thread_id: int) -> ThreadWindow:
+        """Sync (run via session.run_sync): the thread's window with a current summary."""
+        w = self._windows.get(thread_id)
+        if w is not None:
+            self._refresh_summary(session, w)
+            # posts that arrived without an event (webhooks, bounty submissions) or a missed event
+            last = session.exec(select(Thread.last_post_id).where(Thread.id == thread_id)).first()
+            if (last or 0) <= w.seen_through:
+                self._windows.move_to_end(thread_id)
+                return w
+        w = self._load(session, thread_id)
+        self._refresh_summary(session, w)
+        self._windows[thread_id] = w
+        self._windows.move_to_end(thread_id)
+        while len(self._windows) > settings.AGENT_CONTEXT_MAX_THREADS:
+            self._windows.popitem(last=False)
+        return w
+
+    def _load(self, session: Session, thread_id: int) -> ThreadWindow:
+        w = ThreadWindow(thread_id)
+        posts = session.exec(
+            select(Post).where(Post.thread_id == thread_id, Post.is_hidden == False)
+            .order_by(Post.id.desc()).limit(settings.AGENT_CONTEXT_MAX_TURNS)
+        ).all()[::-1]
+        if posts:
+            w.seen_through = posts[-1].id
+        posts = [p for p in posts if not p.content_md.startswith(SUMMARY_HEADER)]
+        handles = resolve_author_handles(session, posts)
+        for p in posts:
+            w.add(Turn(p.id, p.author_type, handles[p.id], p.content_md))
+        return w
+
+    def _refresh_summary(self, session: Session, w: ThreadWindow) -> None:
+        row = session.exec(
+            select(ThreadSummary.summary_post_id, ThreadSummary.source_last_post_id).where(ThreadSummary.thread_id == w.thread_id)
+        ).first()
+        if row is None or row[0] == w.summary_post_id:
+            return
+        post = session.get(Post, row[0])
+        w.summary = post.content_md.removeprefix(SUMMARY_HEADER) if post else ""
+        w.summary_post_id, w.summary_through = row[0], row[1]
+        w.seen_through = max(w.seen_through, row[0])
+        w._rendered = None
+
+
+thread_context = ThreadContextCache()
@@ -0,0 +1,147 @@
+from __future__ import annotations
+import asyncio
+import logging
+from collections import deque
+from typing import Any, Awaitable, Callable
+
+log = logging.getLogger("coevo.agents")
+
+Compose = Callable[[], Awaitable[Any]]
+Commit = Callable[[Any], Awaitable[None]]
+
+
+class _Unit:
+    __slots__ = ("agent_id", "compose", "commit")
+
+    def __init__(self, agent_id: int, compose: Compose, commit: Commit) -> None:
+        self.agent_id = agent_id
+        self.compose = compose
+        self.commit = commit
+
+
+class _Lane:
+    __slots__ = ("key", "units", "active", "queued", "tail")
+
+    def __init__(self, key: str) -> None:
+        self.key = key
+        self.units: deque[_Unit] = deque()
+        self.active = 0
+        self.queued = 0
+        # completion of the lane's most recently started unit; the next one commits after it
+        self.tail: asyncio.Future | None = None
+
+
+class AgentDispatcher:
+    """Runs agent work (LLM call, then store) on a bounded pool of workers.
+
+    Work is submitted to a lane, normally "thread:{id}". Different lanes run in
+    parallel; within a lane at most `per_thread` units compose at once and results are
+    committed in submission order, so replies in one thread keep their order. At most
+    `per_agent` units of the same agent compose at once; a lane whose next unit belongs
+    to a busy agent is not handed to a worker until one of that agent's units finishes
+    composing, so the workers stay free for other agents. Beyond `max_pending` queued
+    units, new work is dropped.
+    """
+
+    def __init__(self, workers: int, per_agent: int, per_thread: int, max_pending: int) -> None:
+        self.workers = workers
+        self.per_agent = max(1, per_agent)
+        self.per_thread = max(1, per_thread)
+        self.max_pending = max_pending
+        self.pending = 0
+        self.stats = {"submitted": 0, "dropped": 0, "failed": 0, "done": 0}
+        self._lanes: dict[str, _Lane] = {}
+        self._ready: asyncio.Queue[_Lane] = asyncio.Queue()
+        # units composing or queued to compose, per agent
+        self._agent_busy: dict[int, int] = {}
+        # lanes whose next unit waits for its agent: agent_id -> {lane key: lane}
+        self._blocked: dict[int, dict[str, _Lane]] = {}
+        self._tasks: list[asyncio.Task] = []
+
+    def start(self) -> None:
+        if not self._tasks:
+            self._tasks = [asyncio.create_task(self._worker()) for _ in range(self.workers)]
+
+    async def stop(self) -> None:
+        for t in self._tasks:
+            t.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    def submit(self, lane_key: str, agent_id: int, compose: Compose, commit: Commit) -> bool:
+        if self.pending >= self.max_pending:
+            self.stats["dropped"] += 1
+            log.warning("agent dispatcher full (%d pending); dropping work for %s", self.pending, lane_key)
+            return False
+        lane = self._lanes.get(lane_key)
+        if lane is None:
+            lane = self._lanes[lane_key] = _Lane(lane_key)
+        lane.units.append(_Unit(agent_id, compose, commit))
+        self.pending += 1
+        self.stats["submitted"] += 1
+        self._schedule(lane)
+        return True
+
+    def _schedule(self, lane: _Lane) -> None:
+        while len(lane.units) > lane.queued and lane.active + lane.queued < self.per_thread:
+            # units leave a lane in order, so the next one queued is units[queued]
+            agent_id = lane.units[lane.queued].agent_id
+            busy = self._agent_busy.get(agent_id, 0)
+            if busy >= self.per_agent:
+                self._blocked.setdefault(agent_id, {})[lane.key] = lane
+                return
+            self._agent_busy[agent_id] = busy + 1
+            lane.queued += 1
+            self._ready.put_nowait(lane)
+
+    def _release(self, agent_id: int) -> None:
+        busy = self._agent_busy[agent_id] - 1
+        if busy:
+            self._agent_busy[agent_id] = busy
+        else:
+            del self._agent_busy[agent_id]
+        for lane in self._blocked.pop(agent_id, {}).values():
+            self._schedule(lane)
+
+    async def _worker(self) -> None:
+        while True:
+            lane = await self._ready.get()
+            lane.queued -= 1
+            unit = lane.units.popleft()
+            lane.active += 1
+            prev, done = lane.tail, asyncio.get_running_loop().create_future()
+            lane.tail = done
+            self._schedule(lane)
+            try:
+                await self._run(unit, prev, lane.key)
+            finally:
+                done.set_result(None)
+                lane.active -= 1
+                self.pending -= 1
+                if lane.tail is done:
+                    lane.tail = None
+                if not lane.units and not lane.active:
+                    self._lanes.pop(lane.key, None)
+                else:
+                    self._schedule(lane)
+
+    async def _run(self, unit: _Unit, prev: asyncio.Future | None, lane_key: str) -> None:
+        result, ok = None, False
+        try:
+            result = await unit.compose()
+            ok = True
+        except Exception:
+            self.stats["failed"] += 1
+            log.exception("agent work failed in %s", lane_key)
+        finally:
+            self._release(unit.agent_id)
+        if prev is not None:
+            await prev
+        if not ok:
+            return
+        try:
+            await unit.commit(result)
+            self.stats["done"] += 1
+        except Exception:
+            self.stats["failed"] += 1
+            log.exception("storing agent work failed in %s", lane_key)
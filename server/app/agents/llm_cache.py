@@ -0,0 +1,142 @@
+from __future__ import annotations
+import asyncio
+import hashlib
+import json
+import logging
+import time
+from collections import OrderedDict
+from datetime import datetime, timedelta
+from typing import Awaitable, Callable
+from sqlalchemy import delete
+from sqlmodel import Session, select
+from ..core.config import settings
+from ..db import async_session_maker
+from ..models import LLMCacheEntry
+
+log = logging.getLogger("coevo.agents")
+
+# expired/overflow rows are pruned from the table once per this many stored responses
+PRUNE_EVERY = 100
+
+
+def cache_key(provider: str, model: str, system_prompt: str, user_prompt: str, max_tokens: int) -> str:
+    raw = json.dumps([provider, model, system_prompt, user_prompt, max_tokens], ensure_ascii=False)
+    return hashlib.sha256(raw.encode()).hexdigest()
+
+
+class LLMCache:
+    """Reuses generated text for identical requests.
+
+    Lookups go to an in-memory LRU, then to the llmcacheentry table (so a restart keeps
+    what was generated); both expire entries after LLM_CACHE_TTL_SECONDS. Concurrent
+    callers with the same key share one upstream call; if that call's caller is cancelled,
+    one of the waiters makes the call instead. Failures and empty replies are not cached.
+    """
+
+    def __init__(self) -> None:
+        self._entries: OrderedDict[str, tuple[float, str]] = OrderedDict()
+        self._inflight: dict[str, asyncio.Future] = {}
+        self._stored = 0
+        self.stats = {"hits": 0, "misses": 0, "coalesced": 0}
+
+    async def get_or_generate(self, key: str, generate: Callable[[], Awaitable[str]]) -> str:
+        if settings.LLM_CACHE_TTL_SECONDS <= 0:
+            return await generate()
+        while True:
+            text = self._get(key)
+            if text is not None:
+                self.stats["hits"] += 1
+                return text
+            pending = self._inflight.get(key)
+            if pending is None:
+                break
+            self.stats["coalesced"] += 1
+            try:
+                return await asyncio.shield(pending)
+            except asyncio.CancelledError:
+                if not pending.cancelled():
+                    raise  # this caller was cancelled
+                # the leader was cancelled (shutdown, timeout), not this caller: take over from it
+
+        fut = self._inflight[key] = asyncio.get_running_loop().create_future()
+        try:
+            text = await self._load(key)
+            fresh = text is None
+            if fresh:
+                self.stats["misses"] += 1
+                text = await generate()
+            else:
+                self.stats["hits"] += 1
+            if text:
+                self._put(key, text, time.time() + settings.LLM_CACHE_TTL_SECONDS)
+            fut.set_result(text)
+            if fresh and text:
+                await self._store(key, text)
+            return text
+        except asyncio.CancelledError:
+            if not fut.done():
+                fut.cancel()  # waiters see the future cancelled and retry
+            raise
+        except Exception as e:
+            fut.set_exception(e)
+            fut.exception()  # waiters re-raise it; don't warn when there are none
+            raise
+        finally:
+            if self._inflight.get(key) is fut:
+                del self._inflight[key]
+
+    def _get(self, key: str) -> str | None:
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        if entry[0] <= time.time():
+            del self._entries[key]
+            return None
+        self._entries.move_to_end(key)
+        return entry[1]
+
+    def _put(self, key: str, text: str, expires: float) -> None:
+        self._entries[key] = (expires, text)
+        self._entries.move_to_end(key)
+        while len(self._entries) > settings.LLM_CACHE_MAX_ENTRIES:
+            self._entries.popitem(last=False)
+
+    async def _load(self, key: str) -> str | None:
+        try:
+            async with async_session_maker() as session:
+                row = await session.get(LLMCacheEntry, key)
+        except Exception:
+            log.exception("llm cache lookup failed")
+            return None
+        if row is None or row.expires_at <= datetime.utcnow():
+            return None
+        return row.response
+
+    async def _store(self, key: str, text: str) -> None:
+        self._stored += 1
+        prune = self._stored % PRUNE_EVERY == 0
+        try:
+            async with async_session_maker() as session:
+                await session.run_sync(self._write, key, text, prune)
+        except Exception:
+            # the reply is still returned and kept in memory
+            log.exception("llm cache write failed")
+
+    @staticmethod
+    def _write(session: Session, key: str, text: str, prune: bool) -> None:
+        now = datetime.utcnow()
+        session.merge(LLMCacheEntry(
+            key=key, response=text, created_at=now, expires_at=now + timedelta(seconds=settings.LLM_CACHE_TTL_SECONDS),
+        ))
+        if prune:
+            session.execute(delete(LLMCacheEntry).where(LLMCacheEntry.expires_at <= now))
+            cutoff = session.exec(
+                select(LLMCacheEntry.created_at).order_by(LLMCacheEntry.created_at.desc())
+                .offset(settings.LLM_CACHE_MAX_ENTRIES).limit(1)
+            ).first()
+            if cutoff is not None:
+                session.execute(delete(LLMCacheEntry).where(LLMCacheEntry.created_at <= cutoff))
+        session.commit()
+
+
+llm_cache = LLMCache()
@@ -0,0 +1,159 @@
+from __future__ import annotations
+import logging
+import os
+import time
+from sqlalchemy import case, delete, update
+from sqlalchemy.exc import IntegrityError
+from sqlmodel import Session, select
+from ..core.config import settings
+from ..db import async_session_maker
+from ..models import AgentRateBucket
+
+log = logging.getLogger("coevo.agents")
+
+# slack for float refill arithmetic, so a 20s cooldown allows again at exactly 20s
+EPSILON = 1e-6
+# refilled buckets are evicted at most this often
+SWEEP_SECONDS = 60.0
+
+Spec = tuple[str, float, float]  # key, capacity, tokens refilled per second
+
+
+class Bucket:
+    __slots__ = ("tokens", "capacity", "rate", "updated_at")
+
+    def __init__(self, tokens: float, capacity: float, rate: float, updated_at: float) -> None:
+        self.tokens = tokens
+        self.capacity = capacity
+        self.rate = rate
+        self.updated_at = updated_at
+
+    def level(self, now: float) -> float:
+        return min(self.capacity, self.tokens + (now - self.updated_at) * self.rate)
+
+    @property
+    def full_at(self) -> float:
+        return self.updated_at + (self.capacity - self.tokens) / self.rate
+
+
+class ReplyRateLimiter:
+    """Token buckets that gate agent replies.
+
+    A reply takes one token from each of two buckets: a per (agent, thread) bucket holding
+    one token that refills over the caller's cooldown, and a per-agent bucket holding
+    AGENT_RATE_BURST tokens that refills at AGENT_RATE_PER_MINUTE (0 disables it). Both
+    buckets must have a token, or neither gives one up. A bucket that has refilled completely
+    is the same as no bucket, so it is evicted.
+
+    With AGENT_RATE_BACKEND=db the buckets live in the agentratebucket table and are taken
+    with conditional UPDATEs in one transaction, so all workers (and restarts) enforce one
+    limit. If that fails, this worker's in-memory buckets decide.
+    """
+
+    def __init__(self) -> None:
+        self._buckets: dict[str, Bucket] = {}
+        self._swept_at = 0.0
+        self.stats = {"allowed": 0, "limited": 0, "evicted": 0, "db_errors": 0}
+
+    @staticmethod
+    def _specs(agent_id: int, thread_id: int, cooldown: float) -> list[Spec]:
+        specs = [(f"thread:{agent_id}:{thread_id}", 1.0, 1.0 / max(cooldown, EPSILON))]
+        if settings.AGENT_RATE_PER_MINUTE > 0:
+            specs.append((f"agent:{agent_id}", float(max(1, settings.AGENT_RATE_BURST)), settings.AGENT_RATE_PER_MINUTE / 60))
+        return specs
+
+    async def allow(self, agent_id: int, thread_id: int, cooldown: float) -> bool:
+        """Take a token for one reply by `agent_id` in `thread_id`; False if it is rate limited."""
+        now = time.time()
+        specs = self._specs(agent_id, thread_id, cooldown)
+        sweep = now - self._swept_at >= SWEEP_SECONDS
+        if sweep:
+            self._swept_at = now
+            self._sweep(now)
+        ok = None
+        if settings.AGENT_RATE_BACKEND == "db":
+            try:
+                async with async_session_maker() as session:
+                    ok = await session.run_sync(self._take_shared, specs, now, sweep)
+            except Exception:
+                self.stats["db_errors"] += 1
+                log.exception("shared rate limit check failed; using this worker's buckets")
+        if ok is None:
+            ok = self._take_local(specs, now)
+        self.stats["allowed" if ok else "limited"] += 1
+        return ok
+
+    def _take_local(self, specs: list[Spec], now: float) -> bool:
+        levels = []
+        for key, capacity, rate in specs:
+            b = self._buckets.get(key)
+            levels.append(capacity if b is None else min(capacity, b.tokens + (now - b.updated_at) * rate))
+        if any(level < 1 - EPSILON for level in levels):
+            return False
+        for (key, capacity, rate), level in zip(specs, levels):
+            self._buckets[key] = Bucket(level - 1, capacity, rate, now)
+        return True
+
+    def _sweep(self, now: float) -> None:
+        expired = [key for key, b in self._buckets.items() if b.full_at <= now]
+        for key in expired:
+            del self._buckets[key]
+        self.stats["evicted"] += len(expired)
+
+    def _take_shared(self, session: Session, specs: list[Spec], now: float, sweep: bool) -> bool:
+        for key, capacity, rate in specs:
+            if not self._take_row(session, key, capacity, rate, now):
+                session.rollback()
+                return False
+        if sweep:
+            res = session.execute(delete(AgentRateBucket).where(AgentRateBucket.full_at <= now))
+            self.stats["evicted"] += res.rowcount or 0
+        session.commit()
+        return True
+
+    @staticmethod
+    def _take_row(session: Session, key: str, capacity: float, rate: float, now: float, retry: bool = True) -> bool:
+        B = AgentRateBucket
+        level = B.tokens + (now - B.updated_at) * rate
+        level = case((level > capacity, capacity), else_=level)
+        res = session.execute(
+            update(B).where(B.key == key, level >= 1 - EPSILON)
+            .values(tokens=level - 1, capacity=capacity, rate=rate, updated_at=now, full_at=now + (capacity - level + 1) / rate)
+        )
+        if res.rowcount:
+            return True
+        if session.exec(select(B.key).where(B.key == key)).first() is not None:
+            return False
+        try:
+            with session.begin_nested():
+                session.add(B(key=key, tokens=capacity - 1, capacity=capacity, rate=rate, updated_at=now, full_at=now + 1 / rate))
+            return True
+        except IntegrityError:
+            # another worker created it first; take from theirs
+            return retry and ReplyRateLimiter._take_row(session, key, capacity, rate, now, retry=False)
+
+    def snapshot(self, session: Session, limit: int = 200) -> dict:
+        """Current (not yet refilled) buckets and this worker's counters."""
+        now = time.time()
+        if settings.AGENT_RATE_BACKEND == "db":
+            rows = session.exec(
+                select(AgentRateBucket).where(AgentRateBucket.full_at > now).order_by(AgentRateBucket.key).limit(limit)
+            ).all()
+            buckets = [(r.key, Bucket(r.tokens, r.capacity, r.rate, r.updated_at)) for r in rows]
+        else:
+            buckets = sorted((k, b) for k, b in self._buckets.items() if b.full_at > now)[:limit]
+        return {
+            "backend": settings.AGENT_RATE_BACKEND,
+            "pid": os.getpid(),
+            "stats": dict(self.stats),
+            "buckets": [{
+                "key": key,
+                "tokens": round(b.level(now), 3),
+                "capacity": b.capacity,
+                "refill_per_second": round(b.rate, 6),
+                "full_in_seconds": round(max(0.0, b.full_at - now), 1),
+            } for key, b in buckets],
+        }
+
+
+reply_limiter = ReplyRateLimiter()
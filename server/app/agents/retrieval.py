@@ -0,0 +1,168 @@
+from __future__ import annotations
+import heapq
+import math
+import re
+from collections import Counter, OrderedDict
+from sqlalchemy import func
+from sqlmodel import Session, select
+from ..core.config import settings
+from ..models import Post
+from ..services.authors import resolve_author_handles
+from ..services.summaries import SUMMARY_HEADER
+from .context import estimate_tokens
+
+TERM_RE = re.compile(r"\w{2,}")
+STOPWORDS = frozenset(
+    "the and for are but not you all any can had her was one our out has him his how its may new now "
+    "see two who did get let say she too use that this with from have your what when where which about "
+    "into just they them then than there their will would could should been were also more some such "
+    "only other very here like".split()
+)
+BM25_K1 = 1.2
+BM25_B = 0.75
+# terms in more than this share of a thread's posts don't add new candidates to a query
+COMMON_TERM_SHARE = 0.05
+# text kept per indexed post for snippets
+SNIPPET_SOURCE_CHARS = 2000
+SYNC_CHUNK = 1000
+
+
+def terms(text: str) -> list[str]:
+    return [t for t in TERM_RE.findall(text.lower()) if t not in STOPWORDS]
+
+
+class ThreadIndex:
+    """BM25 inverted index over one thread's posts: term -> {post_id: term frequency}."""
+
+    def __init__(self) -> None:
+        self.postings: dict[str, dict[int, int]] = {}
+        # post_id -> (author handle, text for snippets, length in terms)
+        self.docs: dict[int, tuple[str, str, int]] = {}
+        self.total_len = 0
+        # every visible post up to this id has been read from the database
+        self.synced_through = 0
+        # posts after synced_through that were added from events
+        self.unsynced = 0
+
+    def add(self, post_id: int, handle: str, text: str) -> bool:
+        if post_id in self.docs:
+            return False
+        words = terms(text)
+        for term, n in Counter(words).items():
+            plist = self.postings.get(term)
+            if plist is None:
+                plist = self.postings[term] = {}
+            plist[post_id] = n
+        self.docs[post_id] = (handle, text[:SNIPPET_SOURCE_CHARS], len(words))
+        self.total_len += len(words)
+        return True
+
+    def search(self, query: str, k: int, exclude: frozenset[int] | set[int] = frozenset()) -> list[tuple[int, float]]:
+        n = len(self.docs)
+        if not n:
+            return []
+        avg_len = self.total_len / n or 1
+        scores: dict[int, float] = {}
+        plists = sorted((p for p in map(self.postings.get, set(terms(query))) if p), key=len)
+        for plist in plists:
+            idf = math.log(1 + (n - len(plist) + 0.5) / (len(plist) + 0.5))
+            if scores and len(plist) > n * COMMON_TERM_SHARE:
+                # a common term only reorders posts the rarer terms matched
+                items = [(pid, plist[pid]) for pid in scores if pid in plist]
+            else:
+                items = plist.items()
+            for post_id, tf in items:
+                if post_id in exclude:
+                    continue
+                norm = BM25_K1 * (1 - BM25_B + BM25_B * self.docs[post_id][2] / avg_len)
+                scores[post_id] = scores.get(post_id, 0.0) + idf * tf * (BM25_K1 + 1) / (tf + norm)
+        return heapq.nlargest(k, scores.items(), key=lambda kv: kv[1])
+
+    def snippet(self, post_id: int, query: str, tokens: int) -> str:
+        """About `tokens` of the post around the first query term it contains."""
+        text = self.docs[post_id][1].replace("\n", " ")
+        limit = tokens * 4
+        if len(text) <= limit:
+            return text
+        lowered = text.lower()
+        hits = [i for i in (lowered.find(t) for t in set(terms(query))) if i >= 0]
+        start = max(0, min(hits) - limit // 4) if hits else 0
+        out = text[start:start + limit].strip()
+        return ("…" if start else "") + out + ("…" if start + limit < len(text) else "")
+
+
+class RetrievalIndex:
+    """Per-thread BM25 indexes so agents can recall older posts beyond their context window.
+
+    A thread is indexed on its first query (one pass over its visible posts) and then kept
+    up to date from post_created events. Each query also counts the thread's posts past
+    `synced_through` and reads any that never came as an event (webhooks, TL;DR posts).
+    post_hidden drops the thread's index. At most AGENT_RETRIEVAL_MAX_THREADS are kept.
+    """
+
+    def __init__(self) -> None:
+        self._threads: OrderedDict[int, ThreadIndex] = OrderedDict()
+
+    def note_post(self, post: dict) -> None:
+        idx = self._threads.get(post.get("thread_id"))
+        content = post.get("content_md") or ""
+        if idx is None or post.get("is_hidden") or content.startswith(SUMMARY_HEADER):
+            return
+        if idx.add(post["id"], post.get("author_handle") or "unknown", content) and post["id"] > idx.synced_through:
+            idx.unsynced += 1
+
+    def invalidate(self, thread_id: int | None) -> None:
+        self._threads.pop(thread_id, None)
+
+    def index(self, session: Session, thread_id: int) -> ThreadIndex:
+        idx = self._threads.get(thread_id)
+        if idx is None:
+            idx = self._threads[thread_id] = ThreadIndex()
+            while len(self._threads) > settings.AGENT_RETRIEVAL_MAX_THREADS:
+                self._threads.popitem(last=False)
+        else:
+            self._threads.move_to_end(thread_id)
+        self._sync(session, thread_id, idx)
+        return idx
+
+    def _sync(self, session: Session, thread_id: int, idx: ThreadIndex) -> None:
+        visible = (Post.thread_id == thread_id, Post.is_hidden == False)
+        newer = session.exec(select(func.count()).select_from(Post).where(*visible, Post.id > idx.synced_through)).one()
+        if newer == idx.unsynced:
+            return
+        while True:
+            posts = session.exec(
+                select(Post).where(*visible, Post.id > idx.synced_through).order_by(Post.id).limit(SYNC_CHUNK)
+            ).all()
+            if not posts:
+                break
+            handles = resolve_author_handles(session, posts)
+            for p in posts:
+                if not p.content_md.startswith(SUMMARY_HEADER):
+                    idx.add(p.id, handles[p.id], p.content_md)
+            idx.synced_through = posts[-1].id
+        idx.unsynced = 0
+
+    def recall(self, session: Session, thread_id: int, query: str, exclude: set[int], budget: int) -> str:
+        """Sync (run via session.run_sync): the posts most relevant to `query` outside `exclude`,
+        as snippet lines within `budget` tokens."""
+        k = settings.AGENT_RETRIEVAL_K
+        if k <= 0 or budget <= 0 or not query.strip():
+            return ""
+        idx = self.index(session, thread_id)
+        hits = idx.search(query, k, exclude)
+        lines, used = [], 0
+        per_hit = max(24, budget // max(1, len(hits)))
+        for post_id, _ in hits:
+            line = f"- @{idx.docs[post_id][0]} (post #{post_id}): {idx.snippet(post_id, query, per_hit)}"
+            cost = estimate_tokens(line)
+            if used + cost > budget:
+                break
+            lines.append(line)
+            used += cost
+        if not lines:
+            return ""
+        return "Relevant earlier posts in this thread:\n" + "\n".join(lines)
+
+
+retrieval_index = RetrievalIndex()
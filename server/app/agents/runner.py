@@ -2,22 +2,41 @@ import os
 import re
 import time
 import json
+import logging
+import uuid
+from typing import AsyncIterator, Awaitable, Callable
 import httpx
-from sqlmodel import Session, select
-from ..db import engine
+from sqlalchemy import update
+from sqlmodel import select
+from sqlmodel.ext.asyncio.session import AsyncSession
+from ..db import async_session_maker
 from ..core.config import settings
 from ..core.events import broker
 from ..models import Agent, Post, Thread, Board, User, VoteProposal, VoteBallot
 from ..core.node_signing import sign
+from ..core.http_clients import http_clients
+from ..services.summaries import summary_scheduler
+from ..services.thread_activity import record_post
+from ..services.agent_memory import agent_memory
+from .dispatcher import AgentDispatcher
+from .llm_cache import cache_key, llm_cache
+from .context import thread_context
+from .rate_limit import reply_limiter
+from .retrieval import retrieval_index
+
+log = logging.getLogger("coevo.agents")
 
 MENTION_RE = re.compile(r"@([A-Za-z0-9_\-]{2,32})")
 
-_last_reply = {}  # (agent_id, thread_id) -> ts
-
-MEMORY_PATH = os.getenv("COEVO_AGENT_MEMORY_PATH", "./storage/agent_memory.json")
 NEVORA_TRANSLATOR_URL = os.getenv("NEVORA_TRANSLATOR_URL", "https://api.nevora.ai/translator")
 NEVORA_API_KEY = os.getenv("NEVORA_API_KEY", "").strip()
 
+# provider -> (default base URL, env var prefix for <PREFIX>_BASE_URL / <PREFIX>_API_KEY)
+OPENAI_COMPATIBLE = {"openai": ("https://api.openai.com/v1", "OPENAI"), "grok": ("https://api.x.ai/v1", "XAI")}
+# providers with a token-streaming API; others return the whole reply at once
+STREAMING_PROVIDERS = frozenset({"anthropic", "openai", "grok", "ollama"})
+OnDelta = Callable[[str], Awaitable[None]]
+
 PERSONAS = {
     "sage": {
         "name": "sage",
@@ -58,53 +77,16 @@ PERSONAS = {
 }
 
 
-def _should_rate_limit(agent_id: int, thread_id: int, seconds: int = 60) -> bool:
-    key = (agent_id, thread_id)
-    now = time.time()
-    last = _last_reply.get(key, 0)
-    if now - last < seconds:
-        return True
-    _last_reply[key] = now
-    return False
-
-
-
-
-def _load_memory() -> dict:
-    try:
-        with open(MEMORY_PATH, "r", encoding="utf-8") as f:
-            return json.load(f)
-    except Exception:
-        return {}
-
-
-def _save_memory(mem: dict):
-    os.makedirs(os.path.dirname(MEMORY_PATH), exist_ok=True)
-    with open(MEMORY_PATH, "w", encoding="utf-8") as f:
-        json.dump(mem, f, ensure_ascii=False, indent=2)
-
-
 def _remember_interaction(agent_handle: str, user_handle: str, content: str):
-    if not user_handle:
-        return
-    mem = _load_memory()
-    key = f"{agent_handle.lower()}::{user_handle.lower()}"
-    item = mem.get(key, {"notes": []})
-    snippet = content.strip().replace("\n", " ")[:200]
-    if snippet:
-        item["notes"] = (item.get("notes", []) + [snippet])[-5:]
-        mem[key] = item
-        _save_memory(mem)
+    agent_memory.remember(agent_handle, user_handle, content)
 
 
 def _memory_hint(agent_handle: str, user_handles: list[str]) -> str:
-    mem = _load_memory()
     hints = []
     for h in user_handles:
-        key = f"{agent_handle.lower()}::{h.lower()}"
-        item = mem.get(key)
-        if item and item.get("notes"):
-            hints.append(f"- {h}: {item['notes'][-1]}")
+        note = agent_memory.last_note(agent_handle, h)
+        if note:
+            hints.append(f"- {h}: {note}")
     if not hints:
         return ""
     return "Relevant memory snippets from past interactions:\n" + "\n".join(hints)
@@ -118,19 +100,11 @@ def _topic_tokens(text: str) -> list[str]:
 
 
 def _track_topic(text: str):
-    mem = _load_memory()
-    topics = mem.get("__topics__", {})
-    for tok in _topic_tokens(text):
-        topics[tok] = int(topics.get(tok, 0)) + 1
-    mem["__topics__"] = topics
-    _save_memory(mem)
+    agent_memory.track_topics(_topic_tokens(text))
 
 
 def _top_topics(limit: int = 3) -> list[str]:
-    mem = _load_memory()
-    topics = mem.get("__topics__", {})
-    pairs = sorted(topics.items(), key=lambda kv: kv[1], reverse=True)[:limit]
-    return [k for k, _ in pairs]
+    return agent_memory.top_topics(limit)
 
 def _mode_line(mode: str) -> str:
     return {
@@ -157,7 +131,7 @@ General behavior rules:
 - Never claim actions you did not perform.
 
 Current style: {base['style']}.
-Community currently talks most about: {", ".join(_top_topics()) if _top_topics() else "general collaboration"}.
+Community currently talks most about: {", ".join(_top_topics()) or "general collaboration"}.
 Let this subtly influence your tone and references.
 {_mode_line(mode)}"""
 
@@ -169,10 +143,9 @@ async def _nevora_translate(mode: str, prompt: str) -> str:
     if NEVORA_API_KEY:
         headers["Authorization"] = f"Bearer {NEVORA_API_KEY}"
     payload = {"mode": mode, "prompt": prompt}
-    async with httpx.AsyncClient(timeout=60) as client:
-        r = await client.post(NEVORA_TRANSLATOR_URL, json=payload, headers=headers)
-        r.raise_for_status()
-        data = r.json()
+    r = await http_clients.get("nevora").post(NEVORA_TRANSLATOR_URL, json=payload, headers=headers)
+    r.raise_for_status()
+    data = r.json()
     return (data.get("output") or data.get("result") or "").strip()
 
 
@@ -193,7 +166,7 @@ def _provider_and_model(model_ref: str) -> tuple[str, str]:
     return "anthropic", model_ref.strip()
 
 
-async def _openai_compatible_generate(base_url: str, api_key: str, model: str, system_prompt: str, user_prompt: str, max_tokens: int = 500) -> str:
+def _openai_compatible_request(api_key: str, model: str, system_prompt: str, user_prompt: str, max_tokens: int) -> tuple[dict, dict]:
     if not api_key:
         raise RuntimeError("Provider API key is not set")
     headers = {"Authorization": f"Bearer {api_key}", "content-type": "application/json"}
@@ -206,13 +179,36 @@ async def _openai_compatible_generate(base_url: str, api_key: str, model: str, s
         "temperature": 0.6,
         "max_tokens": max_tokens,
     }
-    async with httpx.AsyncClient(timeout=60) as client:
-        r = await client.post(base_url.rstrip("/")+"/chat/completions", headers=headers, json=payload)
-        r.raise_for_status()
-        d = r.json()
+    return headers, payload
+
+
+async def _openai_compatible_generate(provider: str, base_url: str, api_key: str, model: str, system_prompt: str, user_prompt: str, max_tokens: int = 500) -> str:
+    headers, payload = _openai_compatible_request(api_key, model, system_prompt, user_prompt, max_tokens)
+    r = await http_clients.get(provider).post(base_url.rstrip("/")+"/chat/completions", headers=headers, json=payload)
+    r.raise_for_status()
+    d = r.json()
     return ((d.get("choices") or [{}])[0].get("message") or {}).get("content", "").strip()
 
 
+async def _openai_compatible_stream(provider: str, base_url: str, api_key: str, model: str, system_prompt: str, user_prompt: str, max_tokens: int = 500) -> AsyncIterator[str]:
+    headers, payload = _openai_compatible_request(api_key, model, system_prompt, user_prompt, max_tokens)
+    payload["stream"] = True
+    async with http_clients.get(provider).stream("POST", base_url.rstrip("/")+"/chat/completions", headers=headers, json=payload) as r:
+        r.raise_for_status()
+        async for data in _sse_data(r):
+            if data == "[DONE]":
+                return
+            delta = ((json.loads(data).get("choices") or [{}])[0].get("delta") or {}).get("content")
+            if delta:
+                yield delta
+
+
+async def _sse_data(r: httpx.Response) -> AsyncIterator[str]:
+    async for line in r.aiter_lines():
+        if line.startswith("data:"):
+            yield line[5:].strip()
+
+
 async def _gemini_generate(model: str, system_prompt: str, user_prompt: str, max_tokens: int = 500) -> str:
     key = os.getenv("GEMINI_API_KEY", "").strip()
     if not key:
@@ -223,10 +219,9 @@ async def _gemini_generate(model: str, system_prompt: str, user_prompt: str, max
         "contents": [{"role": "user", "parts": [{"text": user_prompt}]}],
         "generationConfig": {"temperature": 0.6, "maxOutputTokens": max_tokens},
     }
-    async with httpx.AsyncClient(timeout=60) as client:
-        r = await client.post(url, json=payload)
-        r.raise_for_status()
-        d = r.json()
+    r = await http_clients.get("gemini").post(url, json=payload)
+    r.raise_for_status()
+    d = r.json()
     candidates = d.get("candidates") or []
     if not candidates:
         return ""
@@ -237,30 +232,68 @@ async def _gemini_generate(model: str, system_prompt: str, user_prompt: str, max
 async def _ollama_generate(model: str, system_prompt: str, user_prompt: str) -> str:
     url = os.getenv("COEVO_OLLAMA_URL", "http://localhost:11434").rstrip("/") + "/api/generate"
     prompt = f"{system_prompt}\n\n{user_prompt}"
-    async with httpx.AsyncClient(timeout=60) as client:
-        r = await client.post(url, json={"model": model, "prompt": prompt, "stream": False})
-        r.raise_for_status()
-        d = r.json()
+    r = await http_clients.get("ollama").post(url, json={"model": model, "prompt": prompt, "stream": False})
+    r.raise_for_status()
+    d = r.json()
     return (d.get("response") or "").strip()
 
 
-async def _generate_text(model_ref: str, system_prompt: str, user_prompt: str, max_tokens: int = 500) -> str:
+async def _ollama_stream(model: str, system_prompt: str, user_prompt: str) -> AsyncIterator[str]:
+    url = os.getenv("COEVO_OLLAMA_URL", "http://localhost:11434").rstrip("/") + "/api/generate"
+    prompt = f"{system_prompt}\n\n{user_prompt}"
+    async with http_clients.get("ollama").stream("POST", url, json={"model": model, "prompt": prompt, "stream": True}) as r:
+        r.raise_for_status()
+        async for line in r.aiter_lines():
+            if not line.strip():
+                continue
+            d = json.loads(line)
+            if d.get("error"):
+                raise RuntimeError(d["error"])
+            if d.get("response"):
+                yield d["response"]
+            if d.get("done"):
+                return
+
+
+async def _generate_text(model_ref: str, system_prompt: str, user_prompt: str, max_tokens: int = 500, on_delta: OnDelta | None = None) -> str:
+    """Full reply text. With `on_delta`, providers that can stream hand it each text chunk as
+    it arrives; a cached or coalesced reply comes back whole without deltas."""
     provider, model = _provider_and_model(model_ref)
+    key = cache_key(provider, model, system_prompt, user_prompt, max_tokens)
+    if on_delta is not None and provider in STREAMING_PROVIDERS:
+        generate = lambda: _stream_uncached(provider, model, system_prompt, user_prompt, max_tokens, on_delta)
+    else:
+        generate = lambda: _generate_uncached(provider, model, system_prompt, user_prompt, max_tokens)
+    return await llm_cache.get_or_generate(key, generate)
+
+
+async def _stream_uncached(provider: str, model: str, system_prompt: str, user_prompt: str, max_tokens: int, on_delta: OnDelta) -> str:
     if provider == "anthropic":
-        return await _anthropic_generate(model, system_prompt, user_prompt, max_tokens=max_tokens)
-    if provider == "openai":
-        return await _openai_compatible_generate(
-            os.getenv("OPENAI_BASE_URL", "https://api.openai.com/v1"),
-            os.getenv("OPENAI_API_KEY", "").strip(),
-            model,
-            system_prompt,
-            user_prompt,
-            max_tokens=max_tokens,
+        chunks = _anthropic_stream(model, system_prompt, user_prompt, max_tokens=max_tokens)
+    elif provider == "ollama":
+        chunks = _ollama_stream(model, system_prompt, user_prompt)
+    else:
+        base_url, env = OPENAI_COMPATIBLE[provider]
+        chunks = _openai_compatible_stream(
+            provider, os.getenv(f"{env}_BASE_URL", base_url), os.getenv(f"{env}_API_KEY", "").strip(),
+            model, system_prompt, user_prompt, max_tokens=max_tokens,
         )
-    if provider == "grok":
+    parts = []
+    async for chunk in chunks:
+        parts.append(chunk)
+        await on_delta(chunk)
+    return "".join(parts).strip()
+
+
+async def _generate_uncached(provider: str, model: str, system_prompt: str, user_prompt: str, max_tokens: int) -> str:
+    if provider == "anthropic":
+        return await _anthropic_generate(model, system_prompt, user_prompt, max_tokens=max_tokens)
+    if provider in OPENAI_COMPATIBLE:
+        base_url, env = OPENAI_COMPATIBLE[provider]
         return await _openai_compatible_generate(
-            os.getenv("XAI_BASE_URL", "https://api.x.ai/v1"),
-            os.getenv("XAI_API_KEY", "").strip(),
+            provider,
+            os.getenv(f"{env}_BASE_URL", base_url),
+            os.getenv(f"{env}_API_KEY", "").strip(),
             model,
             system_prompt,
             user_prompt,
@@ -273,7 +306,7 @@ async def _generate_text(model_ref: str, system_prompt: str, user_prompt: str, m
     raise RuntimeError(f"Unsupported model provider: {provider}")
 
 
-async def _anthropic_generate(model: str, system_prompt: str, user_prompt: str, max_tokens: int = 500) -> str:
+def _anthropic_request(model: str, system_prompt: str, user_prompt: str, max_tokens: int) -> tuple[dict, dict]:
     api_key = os.getenv("ANTHROPIC_API_KEY", "").strip()
     if not api_key:
         raise RuntimeError("ANTHROPIC_API_KEY is not set")
@@ -290,11 +323,14 @@ async def _anthropic_generate(model: str, system_prompt: str, user_prompt: str,
         "anthropic-version": "2023-06-01",
         "content-type": "application/json",
     }
+    return headers, payload
 
-    async with httpx.AsyncClient(timeout=60) as client:
-        r = await client.post("https://api.anthropic.com/v1/messages", headers=headers, json=payload)
-        r.raise_for_status()
-        data = r.json()
+
+async def _anthropic_generate(model: str, system_prompt: str, user_prompt: str, max_tokens: int = 500) -> str:
+    headers, payload = _anthropic_request(model, system_prompt, user_prompt, max_tokens)
+    r = await http_clients.get("anthropic").post("https://api.anthropic.com/v1/messages", headers=headers, json=payload)
+    r.raise_for_status()
+    data = r.json()
 
     text_parts = []
     for block in data.get("content", []):
@@ -303,141 +339,238 @@ async def _anthropic_generate(model: str, system_prompt: str, user_prompt: str,
     return "\n".join(text_parts).strip()
 
 
+async def _anthropic_stream(model: str, system_prompt: str, user_prompt: str, max_tokens: int = 500) -> AsyncIterator[str]:
+    headers, payload = _anthropic_request(model, system_prompt, user_prompt, max_tokens)
+    payload["stream"] = True
+    async with http_clients.get("anthropic").stream("POST", "https://api.anthropic.com/v1/messages", headers=headers, json=payload) as r:
+        r.raise_for_status()
+        async for data in _sse_data(r):
+            ev = json.loads(data)
+            if ev.get("type") == "content_block_delta" and (ev.get("delta") or {}).get("type") == "text_delta":
+                yield ev["delta"]["text"]
+            elif ev.get("type") == "error":
+                raise RuntimeError((ev.get("error") or {}).get("message") or "stream error")
+            elif ev.get("type") == "message_stop":
+                return
+
+
 async def agent_loop(node_priv):
     if not settings.AGENT_ENABLED:
         return
-    async for msg in broker.subscribe():
-        try:
-            import json
-            ev = json.loads(msg)
-        except Exception:
-            continue
-
-        et = ev.get("type")
-        if et not in ("post_created", "agent_summoned", "bounty_created", "vote_proposed"):
-            continue
-
-        with Session(engine) as session:
-            agents = session.exec(select(Agent).where(Agent.is_enabled == True).order_by(Agent.id)).all()
-            if not agents:
+    dispatcher = AgentDispatcher(
+        settings.AGENT_WORKERS, settings.AGENT_MAX_PER_AGENT, settings.AGENT_MAX_PER_THREAD, settings.AGENT_MAX_PENDING,
+    )
+    dispatcher.start()
+    try:
+        async for msg in broker.subscribe():
+            try:
+                ev = json.loads(msg)
+            except Exception:
                 continue
-
-            if et == "agent_summoned":
-                agent_id = int(ev.get("agent_id"))
-                thread_id = int(ev.get("thread_id"))
-                agent = session.get(Agent, agent_id)
-                if not agent or not agent.is_enabled:
-                    continue
-                if _should_rate_limit(agent.id, thread_id, 20):
-                    continue
-                await _reply_to_thread(session, node_priv, agent, thread_id, trigger="summon")
+            if ev.get("type") not in ("post_created", "post_hidden", "agent_summoned", "bounty_created", "vote_proposed"):
                 continue
+            try:
+                await _plan_event(dispatcher, node_priv, ev)
+            except Exception:
+                log.exception("agent loop failed to handle %s", ev.get("type"))
+    finally:
+        await dispatcher.stop()
+
+
+async def _plan_event(dispatcher: AgentDispatcher, node_priv, ev: dict):
+    """Decide which agents act on an event and hand the (slow) LLM work to the dispatcher."""
+    et = ev.get("type")
+    if et == "post_hidden":
+        thread_context.invalidate(ev.get("thread_id"))
+        retrieval_index.invalidate(ev.get("thread_id"))
+        return
+    if et == "post_created":
+        thread_context.note_post(ev.get("post", {}))
+        retrieval_index.note_post(ev.get("post", {}))
+    async with async_session_maker() as session:
+        agents = (await session.exec(select(Agent).where(Agent.is_enabled == True).order_by(Agent.id))).all()
+        if not agents:
+            return
 
-            if et == "bounty_created":
-                thread_id = int(ev.get("thread_id"))
-                forge = next((a for a in agents if a.handle.lower() == "forge"), None)
-                if forge and not _should_rate_limit(forge.id, thread_id, 20):
-                    await _bounty_analysis_reply(session, node_priv, forge, ev)
-                continue
+        if et == "agent_summoned":
+            agent_id = int(ev.get("agent_id"))
+            thread_id = int(ev.get("thread_id"))
+            agent = await session.get(Agent, agent_id)
+            if not agent or not agent.is_enabled:
+                return
+            if await reply_limiter.allow(agent.id, thread_id, 20):
+                _submit_reply(dispatcher, node_priv, agent, thread_id, trigger="summon")
+            return
 
-            if et == "vote_proposed":
-                proposal_id = int(ev.get("proposal_id"))
-                for a in agents:
-                    await _agent_vote_on_proposal(session, a, proposal_id, ev)
-                continue
+        if et == "bounty_created":
+            thread_id = int(ev.get("thread_id"))
+            forge = next((a for a in agents if a.handle.lower() == "forge"), None)
+            if forge and await reply_limiter.allow(forge.id, thread_id, 20):
+                async def commit(body: str, forge=forge):
+                    await _store_in_new_session(node_priv, forge, thread_id, body)
+                dispatcher.submit(f"thread:{thread_id}", forge.id, lambda: _bounty_analysis_reply(forge, ev), commit)
+            return
+
+        if et == "vote_proposed":
+            proposal_id = int(ev.get("proposal_id"))
+            for a in agents:
+                async def commit(ballot, a=a):
+                    if ballot:
+                        await _store_agent_ballot(a, proposal_id, *ballot)
+                dispatcher.submit(f"vote:{proposal_id}:{a.id}", a.id, lambda a=a: _agent_vote_on_proposal(a, ev), commit)
+            return
 
-            post = ev.get("post", {})
-            thread_id = int(post.get("thread_id"))
-            content = post.get("content_md", "")
-            author_type = post.get("author_type")
-            author_handle = (post.get("author_handle") or "").lower()
-            if author_type == "user" and author_handle:
-                for a in agents:
-                    _remember_interaction(a.handle, author_handle, content)
-                    _track_topic(content)
-
-            t = session.get(Thread, thread_id)
-            if not t:
+        post = ev.get("post", {})
+        thread_id = int(post.get("thread_id"))
+        content = post.get("content_md", "")
+        author_type = post.get("author_type")
+        author_handle = (post.get("author_handle") or "").lower()
+        if author_type == "user" and author_handle:
+            for a in agents:
+                _remember_interaction(a.handle, author_handle, content)
+            _track_topic(content)
+
+        t = await session.get(Thread, thread_id)
+        if not t:
+            return
+        board = await session.get(Board, t.board_id)
+        board_slug = board.slug if board else ""
+
+        mentioned = set(m.group(1).lower() for m in MENTION_RE.finditer(content))
+
+        targets = []
+        if mentioned:
+            for a in agents:
+                if a.handle.lower() in mentioned and a.handle.lower() != author_handle:
+                    targets.append(a)
+        elif board_slug == "help" and author_type == "user":
+            sage = next((a for a in agents if a.handle.lower() == "sage"), None)
+            targets.append(sage or agents[0])
+
+        for a in targets:
+            if not await reply_limiter.allow(a.id, thread_id, 40):
                 continue
-            board = session.get(Board, t.board_id)
-            board_slug = board.slug if board else ""
-
-            mentioned = set(m.group(1).lower() for m in MENTION_RE.finditer(content))
-
-            targets = []
-            if mentioned:
-                for a in agents:
-                    if a.handle.lower() in mentioned and a.handle.lower() != author_handle:
-                        targets.append(a)
-            elif board_slug == "help" and author_type == "user":
-                sage = next((a for a in agents if a.handle.lower() == "sage"), None)
-                targets.append(sage or agents[0])
-
-            for a in targets:
-                if _should_rate_limit(a.id, thread_id, 40):
-                    continue
-                await _reply_to_thread(session, node_priv, a, thread_id, trigger="mention_or_help")
-
-
-async def _reply_to_thread(session: Session, node_priv, agent: Agent, thread_id: int, trigger: str):
-    posts = session.exec(
-        select(Post).where(Post.thread_id == thread_id, Post.is_hidden == False).order_by(Post.id.desc()).limit(18)
-    ).all()
-    posts = list(reversed(posts))
-
-    context = "\n\n".join([f"{'AGENT' if p.author_type == 'agent' else 'USER'}: {p.content_md}" for p in posts])
-    mentioned_users = []
-    for p in posts:
-        if p.author_type == "user" and p.author_user_id:
-            u = session.get(User, p.author_user_id)
-            if u:
-                mentioned_users.append(u.handle)
+            _submit_reply(dispatcher, node_priv, a, thread_id, trigger="mention_or_help")
+
+
+class ReplyStream:
+    """Publishes a reply's partial text as agent_post_delta events while it is generated.
+
+    Chunks are batched to one event per AGENT_STREAM_FLUSH_SECONDS. `offset` is the length
+    of the text already sent, so a client that missed a delta can tell and just wait: the
+    final post_created carries the same stream_id and the complete text.
+    """
+
+    def __init__(self, agent_handle: str, thread_id: int) -> None:
+        self.stream_id = uuid.uuid4().hex
+        self.agent_handle = agent_handle
+        self.thread_id = thread_id
+        self.offset = 0
+        self._buf: list[str] = []
+        self._flushed_at = 0.0
+
+    async def __call__(self, chunk: str) -> None:
+        self._buf.append(chunk)
+        if time.monotonic() - self._flushed_at >= settings.AGENT_STREAM_FLUSH_SECONDS:
+            await self.flush()
+
+    async def flush(self) -> None:
+        if not self._buf:
+            return
+        delta = "".join(self._buf)
+        self._buf.clear()
+        self._flushed_at = time.monotonic()
+        await broker.publish({
+            "type": "agent_post_delta",
+            "thread_id": self.thread_id,
+            "stream_id": self.stream_id,
+            "author_handle": self.agent_handle,
+            "offset": self.offset,
+            "delta": delta,
+        })
+        self.offset += len(delta)
+
+
+def _submit_reply(dispatcher: AgentDispatcher, node_priv, agent: Agent, thread_id: int, trigger: str):
+    stream = ReplyStream(agent.handle, thread_id) if settings.AGENT_STREAM_REPLIES else None
+
+    async def compose() -> str:
+        reply = await _reply_to_thread(agent, thread_id, trigger, on_delta=stream)
+        if stream:
+            # the post may wait behind earlier replies in this thread; show the whole draft meanwhile
+            await stream.flush()
+        return reply
+
+    async def commit(reply: str):
+        await _store_in_new_session(node_priv, agent, thread_id, reply, stream.stream_id if stream else None)
+
+    dispatcher.submit(f"thread:{thread_id}", agent.id, compose, commit)
+
+
+async def _store_in_new_session(node_priv, agent: Agent, thread_id: int, content: str, stream_id: str | None = None):
+    async with async_session_maker() as session:
+        await _store_agent_post(session, node_priv, agent, thread_id, content, stream_id=stream_id)
+
+
+async def _reply_prompts(session: AsyncSession, agent: Agent, thread_id: int, trigger: str) -> tuple[str, str, str]:
+    """Everything a reply needs from the database: (latest post text, system prompt, user prompt)."""
+    window = await session.run_sync(thread_context.window, thread_id)
+    turns = list(window.turns)
+    context, needs_fold = window.render(settings.AGENT_CONTEXT_TOKENS)
+    if needs_fold:
+        # turns the summary doesn't cover yet were condensed or left out; let the next TL;DR fold them in
+        await summary_scheduler.schedule(thread_id)
+    latest_text = turns[-1].text if turns else ""
+    recalled = await session.run_sync(
+        retrieval_index.recall, thread_id, latest_text, {t.post_id for t in turns}, settings.AGENT_RETRIEVAL_TOKENS,
+    )
+    mentioned_users = [t.handle for t in turns if t.author_type == "user" and t.handle != "unknown"]
     memory_hint = _memory_hint(agent.handle, mentioned_users)
-    latest_text = posts[-1].content_md if posts else ""
     disagreement_hint = ""
-    recent_agents = [p for p in posts[-6:] if p.author_type == "agent"]
+    recent_agents = [t for t in turns[-6:] if t.author_type == "agent"]
     if agent.handle.lower() in ("forge", "echo") and recent_agents:
         other = "echo" if agent.handle.lower() == "forge" else "forge"
-        if any((session.get(Agent, rp.author_agent_id).handle.lower() == other) if rp.author_agent_id and session.get(Agent, rp.author_agent_id) else False for rp in recent_agents):
+        if any(rt.handle.lower() == other for rt in recent_agents):
             disagreement_hint = f"If appropriate, respectfully disagree with @{other} from your personality perspective, while staying constructive."
-    if agent.handle.lower() == "forge" and _needs_forge_code_action(latest_text):
-        try:
-            code_out = await _nevora_translate("code", latest_text)
-            await _store_agent_post(session, node_priv, agent, thread_id, f"**@forge shipped code via Nevora Translator**\n\n```\n{code_out}\n```")
-            return
-        except Exception as e:
-            await _store_agent_post(session, node_priv, agent, thread_id, f"(nevora code action failed: {e})")
-            return
-    if agent.handle.lower() == "nova" and _needs_nova_creative_action(latest_text):
-        try:
-            creative = await _nevora_translate("creative", latest_text)
-            await _store_agent_post(session, node_priv, agent, thread_id, f"**@nova creative generation**\n\n{creative}")
-            return
-        except Exception as e:
-            await _store_agent_post(session, node_priv, agent, thread_id, f"(nevora creative action failed: {e})")
-            return
 
     system_prompt = _agent_persona(agent.handle, agent.autonomy_mode)
     user_prompt = f"""Trigger: {trigger}
 Recent thread context (oldest -> newest):
 {context}
 
+{recalled}
 {memory_hint}
 {disagreement_hint}
 
 Write @{agent.handle}'s next message. If useful, tag another agent with @handle."""
+    return latest_text, system_prompt, user_prompt
+
+
+async def _reply_to_thread(agent: Agent, thread_id: int, trigger: str, on_delta: OnDelta | None = None) -> str:
+    # the session is closed before any slow call, so no pooled connection or read
+    # transaction (which would hold back WAL checkpoints) outlives the prompt building
+    async with async_session_maker() as session:
+        latest_text, system_prompt, user_prompt = await _reply_prompts(session, agent, thread_id, trigger)
+    if agent.handle.lower() == "forge" and _needs_forge_code_action(latest_text):
+        try:
+            code_out = await _nevora_translate("code", latest_text)
+            return f"**@forge shipped code via Nevora Translator**\n\n```\n{code_out}\n```"
+        except Exception as e:
+            return f"(nevora code action failed: {e})"
+    if agent.handle.lower() == "nova" and _needs_nova_creative_action(latest_text):
+        try:
+            creative = await _nevora_translate("creative", latest_text)
+            return f"**@nova creative generation**\n\n{creative}"
+        except Exception as e:
+            return f"(nevora creative action failed: {e})"
 
-    model = agent.model.split(":", 1)[-1] if ":" in agent.model else agent.model
     try:
-        reply = await _generate_text(agent.model, system_prompt, user_prompt)
+        return await _generate_text(agent.model, system_prompt, user_prompt, on_delta=on_delta)
     except Exception as e:
-        reply = f"(agent runner error calling Anthropic: {e})"
-
-    await _store_agent_post(session, node_priv, agent, thread_id, reply)
+        return f"(agent runner error calling Anthropic: {e})"
 
 
-async def _bounty_analysis_reply(session: Session, node_priv, forge: Agent, ev: dict):
-    thread_id = int(ev.get("thread_id"))
+async def _bounty_analysis_reply(forge: Agent, ev: dict) -> str:
     bounty = ev.get("bounty", {})
     system_prompt = _agent_persona(forge.handle, forge.autonomy_mode)
     user_prompt = f"""A new bounty was posted.
@@ -452,26 +585,56 @@ Output:
 3) Short rationale
 4) Suggested next step for the creator"""
 
-    model = forge.model.split(":", 1)[-1] if ":" in forge.model else forge.model
     try:
         analysis = await _generate_text(forge.model, system_prompt, user_prompt, max_tokens=300)
     except Exception as e:
         analysis = f"(forge analysis unavailable: {e})"
 
-    body = f"**@forge bounty triage (#{bounty.get('id','?')})**\n\n{analysis}"
-    await _store_agent_post(session, node_priv, forge, thread_id, body)
+    return f"**@forge bounty triage (#{bounty.get('id','?')})**\n\n{analysis}"
+
+
+async def _agent_vote_on_proposal(agent: Agent, ev: dict) -> tuple[str, str] | None:
+    system_prompt = _agent_persona(agent.handle, agent.autonomy_mode)
+    user_prompt = f"""A community vote was proposed.
+Title: {ev.get('title','')}
+Type: {ev.get('proposal_type','')}
+Details: {ev.get('details_md','')}
+
+Answer YES or NO on the first line, then give a one or two sentence rationale."""
+    try:
+        out = await _generate_text(agent.model, system_prompt, user_prompt, max_tokens=160)
+    except Exception:
+        return None
+    first, _, rest = out.strip().partition("\n")
+    word = first.strip().strip("*#:. ").split(" ")[0].lower()
+    if word not in ("yes", "no"):
+        return None
+    return word, (rest.strip() or first.strip())[:1000]
+
+
+async def _store_agent_ballot(agent: Agent, proposal_id: int, vote: str, rationale: str):
+    async with async_session_maker() as session:
+        if not await session.get(VoteProposal, proposal_id):
+            return
+        existing = (await session.exec(
+            select(VoteBallot).where(VoteBallot.proposal_id == proposal_id, VoteBallot.voter_agent_id == agent.id)
+        )).first()
+        b = existing or VoteBallot(proposal_id=proposal_id, voter_agent_id=agent.id)
+        b.vote = vote
+        b.rationale = rationale
+        session.add(b)
+        await session.commit()
 
 
-async def _store_agent_post(session: Session, node_priv, agent: Agent, thread_id: int, content: str):
+async def _store_agent_post(session: AsyncSession, node_priv, agent: Agent, thread_id: int, content: str, stream_id: str | None = None):
     if not content or not content.strip():
         return
 
     p = Post(thread_id=thread_id, author_type="agent", author_agent_id=agent.id, content_md=content.strip())
-    agent.reputation = (agent.reputation or 0) + 1
-    session.add(agent)
+    # relative UPDATE: replies for one agent can be stored concurrently from several threads
+    await session.execute(update(Agent).where(Agent.id == agent.id).values(reputation=Agent.reputation + 1))
     session.add(p)
-    session.commit()
-    session.refresh(p)
+    await session.flush()
 
     if node_priv is not None:
         sig_payload = {
@@ -484,12 +647,15 @@ async def _store_agent_post(session: Session, node_priv, agent: Agent, thread_id
         }
         p.signature = sign(node_priv, sig_payload)
         session.add(p)
-        session.commit()
-        session.refresh(p)
+    await session.run_sync(record_post, p, agent.handle)
+    summary_due = await session.run_sync(summary_scheduler.note_post, thread_id)
+    await session.commit()
 
     await broker.publish({
         "type": "post_created",
         "thread_id": thread_id,
+        # set when the reply was streamed: replaces the agent_post_delta draft with this id
+        "stream_id": stream_id,
         "post": {
             "id": p.id,
             "thread_id": p.thread_id,
@@ -501,6 +667,8 @@ async def _store_agent_post(session: Session, node_priv, agent: Agent, thread_id
             "signature": p.signature,
         },
     })
+    if summary_due:
+        await summary_scheduler.schedule(thread_id)
 
 
 async def daily_digest_loop(node_priv):
@@ -511,21 +679,21 @@ async def daily_digest_loop(node_priv):
 
 async def _post_daily_digests(node_priv):
     from datetime import datetime, timedelta
-    with Session(engine) as session:
+    async with async_session_maker() as session:
         since = datetime.utcnow() - timedelta(hours=24)
-        posts = session.exec(select(Post).where(Post.created_at >= since).order_by(Post.id.desc()).limit(200)).all()
+        posts = (await session.exec(select(Post).where(Post.created_at >= since).order_by(Post.id.desc()).limit(200))).all()
         if not posts:
             return
-        agents = session.exec(select(Agent).where(Agent.is_enabled == True)).all()
-        help_board = session.exec(select(Board).where(Board.slug=="help")).first()
+        agents = (await session.exec(select(Agent).where(Agent.is_enabled == True))).all()
+        help_board = (await session.exec(select(Board).where(Board.slug=="help"))).first()
         if not help_board:
             return
-        thread = session.exec(select(Thread).where(Thread.board_id==help_board.id).order_by(Thread.id.desc())).first()
+        thread = (await session.exec(select(Thread).where(Thread.board_id==help_board.id).order_by(Thread.id.desc()))).first()
         if not thread:
             thread = Thread(board_id=help_board.id, title="Daily Agent Digest")
             session.add(thread)
-            session.commit()
-            session.refresh(thread)
+            await session.commit()
+            await session.refresh(thread)
         summary_source = "\n".join([p.content_md[:180] for p in posts[:25]])
         for a in agents:
             prompt = _agent_persona(a.handle, a.autonomy_mode)
@@ -549,12 +717,12 @@ async def _post_weekly_report(node_priv):
     from datetime import datetime, timedelta
     if datetime.utcnow().weekday() != 0:
         return
-    with Session(engine) as session:
-        sage = session.exec(select(Agent).where(Agent.handle=="sage", Agent.is_enabled==True)).first()
+    async with async_session_maker() as session:
+        sage = (await session.exec(select(Agent).where(Agent.handle=="sage", Agent.is_enabled==True))).first()
         if not sage:
             return
         since = datetime.utcnow() - timedelta(days=7)
-        posts = session.exec(select(Post).where(Post.created_at >= since).order_by(Post.id.desc()).limit(400)).all()
+        posts = (await session.exec(select(Post).where(Post.created_at >= since).order_by(Post.id.desc()).limit(400))).all()
         if not posts:
             return
         threads = {}
@@ -562,8 +730,8 @@ async def _post_weekly_report(node_priv):
             threads[p.thread_id] = threads.get(p.thread_id, 0) + 1
         top_threads = sorted(threads.items(), key=lambda kv: kv[1], reverse=True)[:5]
         from ..models import Bounty
-        paid = session.exec(select(Bounty).where(Bounty.status=="paid", Bounty.closed_at >= since)).all()
-        new_users = session.exec(select(User).where(User.created_at >= since)).all()
+        paid = (await session.exec(select(Bounty).where(Bounty.status=="paid", Bounty.closed_at >= since))).all()
+        new_users = (await session.exec(select(User).where(User.created_at >= since))).all()
         mood = "energized" if len(posts) > 100 else ("steady" if len(posts) > 40 else "quiet")
         summary_input = f"Top threads by activity: {top_threads}. Paid bounties: {len(paid)}. New members: {len(new_users)}. Mood: {mood}."
         prompt = _agent_persona("sage", "assistant")
@@ -572,12 +740,12 @@ async def _post_weekly_report(node_priv):
             text = await _generate_text(sage.model, prompt, user_prompt, max_tokens=340)
         except Exception as e:
             text = f"Weekly report unavailable: {e}"
-        board = session.exec(select(Board).where(Board.slug=="general")).first()
+        board = (await session.exec(select(Board).where(Board.slug=="general"))).first()
         if not board:
             return
-        thread = session.exec(select(Thread).where(Thread.board_id==board.id).order_by(Thread.id.desc())).first()
+        thread = (await session.exec(select(Thread).where(Thread.board_id==board.id).order_by(Thread.id.desc()))).first()
         if not thread:
             thread = Thread(board_id=board.id, title="Weekly Community Report")
-            session.add(thread); session.commit(); session.refresh(thread)
+            session.add(thread); await session.commit(); await session.refresh(thread)
         body = f"**Weekly report by @sage**\n\n{text}"
         await _store_agent_post(session, node_priv, sage, thread.id, body)
@@ -3,6 +3,16 @@ import os
 class Settings:
     APP_NAME: str = "CoEvo"
     DB_URL: str = os.getenv("COEVO_DB_URL", "sqlite:///./coevo.db")
+    # Async engine for async routers/agents; derived from DB_URL (aiosqlite/asyncpg) unless set
+    ASYNC_DB_URL: str = os.getenv("COEVO_ASYNC_DB_URL", "").strip()
+    DB_POOL_SIZE: int = int(os.getenv("COEVO_DB_POOL_SIZE", "10"))
+    DB_MAX_OVERFLOW: int = int(os.getenv("COEVO_DB_MAX_OVERFLOW", "20"))
+
+    # SQLite profile: "production" enables WAL + tuned pragmas on every connection
+    SQLITE_PROFILE: str = os.getenv("COEVO_SQLITE_PROFILE", "production").strip().lower()
+    SQLITE_BUSY_TIMEOUT_MS: int = int(os.getenv("COEVO_SQLITE_BUSY_TIMEOUT_MS", "5000"))
+    SQLITE_MMAP_SIZE: int = int(os.getenv("COEVO_SQLITE_MMAP_SIZE", str(256 * 1024 * 1024)))
+    SQLITE_CACHE_SIZE_KB: int = int(os.getenv("COEVO_SQLITE_CACHE_SIZE_KB", "65536"))
     JWT_SECRET: str = os.getenv("COEVO_JWT_SECRET", "dev-only-change-me")
     JWT_ALG: str = "HS256"
     JWT_EXPIRE_MINUTES: int = int(os.getenv("COEVO_JWT_EXPIRE_MINUTES", "10080"))  # 7 days
@@ -14,6 +24,67 @@ class Settings:
     # Agents
     AGENT_ENABLED: bool = os.getenv("COEVO_AGENT_ENABLED", "0") == "1"
     DEFAULT_AGENT_MODEL: str = os.getenv("COEVO_DEFAULT_AGENT_MODEL", "claude-3-5-haiku-latest")
+    # agent replies run on a worker pool; one agent and one thread get at most this many at a
+    # time (replies within a thread are always posted in order); work beyond MAX_PENDING is dropped
+    AGENT_WORKERS: int = int(os.getenv("COEVO_AGENT_WORKERS", "8"))
+    AGENT_MAX_PER_AGENT: int = int(os.getenv("COEVO_AGENT_MAX_PER_AGENT", "4"))
+    AGENT_MAX_PER_THREAD: int = int(os.getenv("COEVO_AGENT_MAX_PER_THREAD", "1"))
+    AGENT_MAX_PENDING: int = int(os.getenv("COEVO_AGENT_MAX_PENDING", "500"))
+    # reply rate limits (token buckets): each agent gets BURST replies refilled at RATE_PER_MINUTE (0 = no
+    # per-agent limit) on top of per-thread cooldowns; "db" keeps the buckets in the database so all workers share them
+    AGENT_RATE_PER_MINUTE: float = float(os.getenv("COEVO_AGENT_RATE_PER_MINUTE", "10"))
+    AGENT_RATE_BURST: int = int(os.getenv("COEVO_AGENT_RATE_BURST", "20"))
+    AGENT_RATE_BACKEND: str = os.getenv("COEVO_AGENT_RATE_BACKEND", "memory").strip().lower()
+    # reply prompts carry at most CONTEXT_TOKENS (estimated) of thread context: the TL;DR summary, the
+    # newest of the last CONTEXT_MAX_TURNS posts (each clipped to CONTEXT_TURN_TOKENS), older ones condensed
+    AGENT_CONTEXT_TOKENS: int = int(os.getenv("COEVO_AGENT_CONTEXT_TOKENS", "3000"))
+    AGENT_CONTEXT_MAX_TURNS: int = int(os.getenv("COEVO_AGENT_CONTEXT_MAX_TURNS", "30"))
+    AGENT_CONTEXT_TURN_TOKENS: int = int(os.getenv("COEVO_AGENT_CONTEXT_TURN_TOKENS", "600"))
+    AGENT_CONTEXT_MAX_THREADS: int = int(os.getenv("COEVO_AGENT_CONTEXT_MAX_THREADS", "500"))
+    # BM25 recall of older posts in the thread: up to RETRIEVAL_K snippets within RETRIEVAL_TOKENS (K=0 disables)
+    AGENT_RETRIEVAL_K: int = int(os.getenv("COEVO_AGENT_RETRIEVAL_K", "4"))
+    AGENT_RETRIEVAL_TOKENS: int = int(os.getenv("COEVO_AGENT_RETRIEVAL_TOKENS", "600"))
+    AGENT_RETRIEVAL_MAX_THREADS: int = int(os.getenv("COEVO_AGENT_RETRIEVAL_MAX_THREADS", "100"))
+    # stream replies from providers that support it as agent_post_delta events, batched per interval
+    AGENT_STREAM_REPLIES: bool = os.getenv("COEVO_AGENT_STREAM_REPLIES", "1") == "1"
+    AGENT_STREAM_FLUSH_SECONDS: float = float(os.getenv("COEVO_AGENT_STREAM_FLUSH_SECONDS", "0.1"))
+    # agent memory lives in memory; changed notes/topic counts are written to the database this often
+    AGENT_MEMORY_FLUSH_SECONDS: float = float(os.getenv("COEVO_AGENT_MEMORY_FLUSH_SECONDS", "10"))
+    # generated text is reused for identical (provider, model, prompts, max_tokens) requests for
+    # this long (0 disables); the in-memory LRU and the llmcacheentry table hold at most MAX_ENTRIES
+    LLM_CACHE_TTL_SECONDS: float = float(os.getenv("COEVO_LLM_CACHE_TTL_SECONDS", "86400"))
+    LLM_CACHE_MAX_ENTRIES: int = int(os.getenv("COEVO_LLM_CACHE_MAX_ENTRIES", "1000"))
+    # shared per-provider HTTP clients for LLM calls (keep-alive pools, HTTP/2 when h2 is installed)
+    LLM_HTTP_MAX_CONNECTIONS: int = int(os.getenv("COEVO_LLM_HTTP_MAX_CONNECTIONS", "20"))
+    LLM_HTTP_MAX_KEEPALIVE: int = int(os.getenv("COEVO_LLM_HTTP_MAX_KEEPALIVE", "10"))
+    LLM_HTTP_KEEPALIVE_SECONDS: float = float(os.getenv("COEVO_LLM_HTTP_KEEPALIVE_SECONDS", "60"))
+    LLM_HTTP_TIMEOUT_SECONDS: float = float(os.getenv("COEVO_LLM_HTTP_TIMEOUT_SECONDS", "60"))
+    LLM_HTTP_CONNECT_TIMEOUT_SECONDS: float = float(os.getenv("COEVO_LLM_HTTP_CONNECT_TIMEOUT_SECONDS", "10"))
+
+    # Background jobs (post side effects, email, summaries)
+    JOB_WORKERS: int = int(os.getenv("COEVO_JOB_WORKERS", "4"))
+    JOB_MAX_ATTEMPTS: int = int(os.getenv("COEVO_JOB_MAX_ATTEMPTS", "5"))
+    JOB_POLL_SECONDS: float = float(os.getenv("COEVO_JOB_POLL_SECONDS", "1.0"))
+    JOB_LEASE_SECONDS: int = int(os.getenv("COEVO_JOB_LEASE_SECONDS", "300"))
+    # quiet period before a due thread summary runs, so a burst of posts yields one summary
+    SUMMARY_DEBOUNCE_SECONDS: float = float(os.getenv("COEVO_SUMMARY_DEBOUNCE_SECONDS", "30"))
+
+    # Realtime events: recent events kept for Last-Event-ID replay
+    EVENT_REPLAY_BUFFER: int = int(os.getenv("COEVO_EVENT_REPLAY_BUFFER", "2048"))
+    # what to do when a subscriber's queue is full: drop_oldest | coalesce | disconnect
+    EVENT_OVERFLOW_POLICY: str = os.getenv("COEVO_EVENT_OVERFLOW_POLICY", "drop_oldest")
+    # v2 WebSocket clients get a {"type": "ping"} this often and are dropped after two silent intervals
+    EVENT_WS_PING_SECONDS: float = float(os.getenv("COEVO_EVENT_WS_PING_SECONDS", "25"))
+    # SSE heartbeat comment interval; subscribers with events queued but nothing read for
+    # EVENT_IDLE_TIMEOUT_SECONDS are reaped; EVENT_MAX_CONNECTIONS caps SSE+WS clients (0 = no cap)
+    EVENT_HEARTBEAT_SECONDS: float = float(os.getenv("COEVO_EVENT_HEARTBEAT_SECONDS", "15"))
+    EVENT_IDLE_TIMEOUT_SECONDS: float = float(os.getenv("COEVO_EVENT_IDLE_TIMEOUT_SECONDS", "120"))
+    EVENT_MAX_CONNECTIONS: int = int(os.getenv("COEVO_EVENT_MAX_CONNECTIONS", "10000"))
+    # memory (single process) | unix (fan out across uvicorn workers through a Unix-socket hub)
+    EVENT_BACKEND: str = os.getenv("COEVO_EVENT_BACKEND", "memory")
+    EVENT_SOCKET_PATH: str = os.getenv("COEVO_EVENT_SOCKET_PATH", "./storage/events.sock")
+    # host-wide lock files that keep startup and singleton loops to one worker
+    LOCK_DIR: str = os.getenv("COEVO_LOCK_DIR", "./storage")
 
     # Admin seed
     SEED_ADMIN: bool = os.getenv("COEVO_SEED_ADMIN", "0") == "1"
@@ -0,0 +1,151 @@
+from __future__ import annotations
+import asyncio
+import json
+import logging
+import os
+from typing import Any
+from .events import EventBroker, TRANSIENT_TYPES, coalesce_key
+from .locks import FileLock
+
+log = logging.getLogger("coevo.events")
+
+LINE_LIMIT = 16 * 1024 * 1024
+PEER_BUFFER_LIMIT = 8 * 1024 * 1024
+RECONNECT_SECONDS = 0.2
+
+
+class UnixSocketBus:
+    """Fans broker events out across the processes (uvicorn workers) of one host.
+
+    Whichever process holds the hub lock listens on a Unix socket; the others connect
+    to it. Publishers send {"topics", "event"} lines to the hub, which stamps the event
+    id, delivers it locally and relays {"id", "topics", "msg"} lines to every connected
+    process, the publisher included, so ids and ordering are the same everywhere. A
+    publish_many batch travels as one {"batch": [...]} line each way.
+    When the hub process exits its lock is released and a follower takes over.
+    """
+
+    def __init__(self, broker: EventBroker, path: str) -> None:
+        self.broker = broker
+        self.path = path
+        self._hub_lock = FileLock("event-hub")
+        self._server: asyncio.AbstractServer | None = None
+        self._peers: set[asyncio.StreamWriter] = set()
+        self._writer: asyncio.StreamWriter | None = None
+        self._task: asyncio.Task | None = None
+        self._ready = asyncio.Event()
+
+    @property
+    def is_hub(self) -> bool:
+        return self._server is not None
+
+    async def start(self) -> None:
+        self._task = asyncio.create_task(self._run())
+        try:
+            await asyncio.wait_for(self._ready.wait(), timeout=5)
+        except asyncio.TimeoutError:
+            log.warning("event bus not connected yet; publishing locally until it is")
+
+    async def stop(self) -> None:
+        if self._task:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+        for w in list(self._peers):
+            w.close()
+        self._peers.clear()
+        if self._writer:
+            self._writer.close()
+            self._writer = None
+        if self._server:
+            self._server.close()
+            self._server = None
+            if os.path.exists(self.path):
+                os.unlink(self.path)
+        self._hub_lock.release()
+
+    async def publish(self, event: dict[str, Any], topics: frozenset[str]) -> bool:
+        """Route through the hub; False means no hub is reachable and the caller delivers locally."""
+        return await self.publish_many([(event, topics)])
+
+    async def publish_many(self, batch: list[tuple[dict[str, Any], frozenset[str]]]) -> bool:
+        """Like publish, for several events at once: one line to the hub, one line to each peer."""
+        if self._server is not None:
+            await self._hub_publish(batch)
+            return True
+        w = self._writer
+        if w is None or w.is_closing():
+            return False
+        reqs = [{"topics": sorted(topics), "event": event} for event, topics in batch]
+        w.write((json.dumps(reqs[0] if len(reqs) == 1 else {"batch": reqs}, ensure_ascii=False) + "\n").encode())
+        return True
+
+    async def _hub_publish(self, batch: list[tuple[dict[str, Any], frozenset[str]]]) -> None:
+        frames = []
+        for event, topics in batch:
+            key = coalesce_key(event)
+            replay = event.get("type") not in TRANSIENT_TYPES
+            event_id, msg = self.broker._stamp(event)
+            self.broker._deliver(event_id, topics, msg, key, replay)
+            frames.append({"id": event_id, "topics": sorted(topics), "key": key, "replay": replay, "msg": msg})
+        line = (json.dumps(frames[0] if len(frames) == 1 else {"batch": frames}, ensure_ascii=False) + "\n").encode()
+        for w in list(self._peers):
+            if w.transport.get_write_buffer_size() > PEER_BUFFER_LIMIT:
+                log.warning("event bus peer is not reading; disconnecting it")
+                self._peers.discard(w)
+                w.close()
+                continue
+            w.write(line)
+
+    async def _run(self) -> None:
+        while True:
+            if self._hub_lock.try_acquire():
+                await self._serve()
+                return
+            try:
+                reader, writer = await asyncio.open_unix_connection(self.path, limit=LINE_LIMIT)
+            except OSError:
+                await asyncio.sleep(RECONNECT_SECONDS)
+                continue
+            self._writer = writer
+            self._ready.set()
+            try:
+                await self._follow(reader)
+            finally:
+                self._writer = None
+                writer.close()
+            log.info("event hub went away; re-electing")
+
+    async def _serve(self) -> None:
+        # we hold the hub lock, so anything at the path is a dead hub's socket
+        if os.path.exists(self.path):
+            os.unlink(self.path)
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        self._server = await asyncio.start_unix_server(self._on_peer, self.path, limit=LINE_LIMIT)
+        self._ready.set()
+        log.info("event hub listening on %s", self.path)
+        await self._server.serve_forever()
+
+    async def _on_peer(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        self._peers.add(writer)
+        try:
+            while line := await reader.readline():
+                req = json.loads(line)
+                reqs = req["batch"] if "batch" in req else [req]
+                await self._hub_publish([(r["event"], frozenset(r["topics"])) for r in reqs])
+        except (ConnectionError, ValueError, KeyError) as e:
+            log.warning("event bus peer dropped: %s", e)
+        except asyncio.CancelledError:
+            # hub shutting down; asyncio's stream callback logs handlers that end cancelled
+            pass
+        finally:
+            self._peers.discard(writer)
+            writer.close()
+
+    async def _follow(self, reader: asyncio.StreamReader) -> None:
+        try:
+            while line := await reader.readline():
+                frame = json.loads(line)
+                for f in frame["batch"] if "batch" in frame else [frame]:
+                    self.broker._deliver(f["id"], frozenset(f["topics"]), f["msg"], f.get("key"), f.get("replay", True))
+        except (ConnectionError, ValueError, KeyError) as e:
+            log.warning("event hub connection lost: %s", e)
@@ -1,35 +1,401 @@
 import asyncio
 import json
-from typing import Any, AsyncGenerator
+import logging
+import time
+from collections import deque
+from typing import Any, AsyncGenerator, Iterable
+from .config import settings
+
+try:
+    import msgpack
+except ImportError:  # binary WebSocket frames are opt-in; without msgpack only JSON is offered
+    msgpack = None
+
+GLOBAL_TOPIC = "global"
+TOPIC_KINDS = ("thread", "board", "user")
+SUBSCRIBER_QUEUE_SIZE = 500
+# most queued frames handed to a lagging client in one write
+MAX_BATCH = 64
+OVERFLOW_POLICIES = ("drop_oldest", "coalesce", "disconnect")
+# event type -> field identifying what it describes, for the "coalesce" policy
+COALESCE_FIELDS = {"reaction_updated": "post_id", "post_hidden": "post_id"}
+# live-only events: delivered to current subscribers but kept out of the Last-Event-ID replay
+TRANSIENT_TYPES = frozenset({"agent_post_delta"})
+# events carrying one user's private data (watcher notifications): only ever sent on user:{id}
+# topics, never to public topics or topic-less subscribers, whatever the publisher passed
+PRIVATE_TYPES = frozenset({"notify"})
+
+log = logging.getLogger("coevo.events")
+
+
+def event_topics(event: dict[str, Any]) -> list[str]:
+    """Topics an event is routed to: its thread, board and user scopes, else global."""
+    topics = [f"{kind}:{event[f'{kind}_id']}" for kind in TOPIC_KINDS if event.get(f"{kind}_id") is not None]
+    return topics or [GLOBAL_TOPIC]
+
+
+def coalesce_key(event: dict[str, Any]) -> str | None:
+    """Events that only carry the latest state of something; a newer one supersedes a queued one."""
+    field = COALESCE_FIELDS.get(event.get("type"))
+    if field is None or event.get(field) is None:
+        return None
+    return f"{event['type']}:{event[field]}"
+
+
+class Frame:
+    """An event serialized once and shared by every subscriber: `text` for WebSocket, `sse` for
+    SSE, and `packed` (msgpack, built by the first binary client that needs it)."""
+
+    __slots__ = ("event_id", "text", "sse", "_packed")
+
+    def __init__(self, event_id: int | None, text: str, sse: bytes) -> None:
+        self.event_id = event_id
+        self.text = text
+        self.sse = sse
+        self._packed: bytes | None = None
+
+    @property
+    def packed(self) -> bytes:
+        if self._packed is None:
+            self._packed = msgpack.packb(json.loads(self.text))
+        return self._packed
+
+
+def make_frame(event_id: int | None, text: str) -> Frame:
+    head = f"id: {event_id}\n" if event_id is not None else ""
+    return Frame(event_id, text, f"{head}event: message\ndata: {text}\n\n".encode())
+
+
+KEEPALIVE = make_frame(None, json.dumps({"type": "keepalive"}))
+# SSE comment line: keeps proxies from timing out idle streams, ignored by EventSource
+HEARTBEAT = Frame(None, "", b": ping\n\n")
+
+
+def _wants(sub_topics: frozenset[str], topics: frozenset[str], private: bool) -> bool:
+    return bool(sub_topics & topics) if sub_topics else not private
+
+
+class SlowConsumer(Exception):
+    """Raised to a subscriber with the "disconnect" policy whose queue overflowed."""
+
+
+class TooManySubscribers(Exception):
+    """settings.EVENT_MAX_CONNECTIONS client subscriptions are already open."""
+
+
+class Subscription:
+    """One subscriber's pending events and what to do when it falls behind.
+
+    drop_oldest: discard the oldest pending event.
+    coalesce:    replace a pending event that has the same coalesce key, then drop oldest.
+    disconnect:  stop the stream with SlowConsumer; the client reconnects with Last-Event-ID.
+    """
+
+    __slots__ = ("topics", "firehose", "policy", "maxsize", "heartbeat", "task", "last_pull", "closed",
+                 "_pending", "_keyed", "_live", "_waiter")
+
+    def __init__(self, topics: frozenset[str], policy: str, maxsize: int, heartbeat: bool = False) -> None:
+        self.topics = topics
+        # no topics at subscribe time = every public event, until topics are set explicitly
+        self.firehose = not topics
+        self.policy = policy
+        self.maxsize = maxsize
+        # sent HEARTBEAT frames while idle (SSE); the task is what the idle reaper cancels
+        self.heartbeat = heartbeat
+        self.task = asyncio.current_task()
+        self.last_pull = time.monotonic()
+        self.closed = False
+        # Allocated on first use and released once drained: most connections sit idle
+        # with nothing queued. Entries are [frame, key]; frame is None once coalesced away.
+        self._pending: deque[list] | None = None
+        self._keyed: dict[str, list] | None = None
+        self._live = 0
+        self._waiter: asyncio.Future | None = None
+
+    @property
+    def queued(self) -> int:
+        return self._live
+
+    def push(self, frame: Frame, key: str | None, stats: dict[str, int]) -> bool:
+        """Queue a frame; False when the subscriber is disconnected instead."""
+        if key is not None and self._keyed:
+            old = self._keyed.get(key)
+            if old is not None and old[0] is not None:
+                old[0] = None
+                self._live -= 1
+                stats["coalesced"] += 1
+        if self._live >= self.maxsize:
+            if self.policy == "disconnect":
+                self.closed = True
+                self._wake()
+                stats["disconnected"] += 1
+                return False
+            self._pop()
+            stats["dropped"] += 1
+        entry = [frame, key]
+        if self._pending is None:
+            self._pending = deque()
+        self._pending.append(entry)
+        self._live += 1
+        if key is not None and self.policy == "coalesce":
+            if self._keyed is None:
+                self._keyed = {}
+            self._keyed[key] = entry
+        if len(self._pending) > 2 * self.maxsize:
+            self._pending = deque(e for e in self._pending if e[0] is not None)
+        self._wake()
+        return True
+
+    def _wake(self) -> None:
+        if self._waiter is not None and not self._waiter.done():
+            self._waiter.set_result(None)
+
+    def _pop(self) -> Frame | None:
+        while self._pending:
+            entry = self._pending.popleft()
+            if entry[0] is None:
+                continue
+            self._live -= 1
+            if self._keyed and entry[1] is not None and self._keyed.get(entry[1]) is entry:
+                del self._keyed[entry[1]]
+            return entry[0]
+        return None
+
+    async def get_batch(self, limit: int = MAX_BATCH) -> list[Frame]:
+        """Wait for at least one frame, then take everything queued (up to `limit`)."""
+        while True:
+            if self.closed:
+                raise SlowConsumer()
+            batch = []
+            while len(batch) < limit and (frame := self._pop()) is not None:
+                batch.append(frame)
+            if batch:
+                self.last_pull = time.monotonic()
+                if not self._live:
+                    self._pending = self._keyed = None
+                return batch
+            self._waiter = asyncio.get_running_loop().create_future()
+            try:
+                await self._waiter
+            finally:
+                self._waiter = None
+
 
 class EventBroker:
     def __init__(self) -> None:
-        self._subscribers: set[asyncio.Queue[str]] = set()
-        self._lock = asyncio.Lock()
-
-    async def publish(self, event: dict[str, Any]) -> None:
-        msg = json.dumps(event, ensure_ascii=False)
-        async with self._lock:
-            dead = []
-            for q in self._subscribers:
-                try:
-                    q.put_nowait(msg)
-                except Exception:
-                    dead.append(q)
-            for q in dead:
-                self._subscribers.discard(q)
-
-    async def subscribe(self) -> AsyncGenerator[str, None]:
-        q: asyncio.Queue[str] = asyncio.Queue(maxsize=500)
-        async with self._lock:
-            self._subscribers.add(q)
+        # Subscribers with no topics get every event except user-scoped ones (agent loop,
+        # legacy clients); the rest are indexed by topic so a publish only touches
+        # interested subscribers. Both are copy-on-write: subscribe/unsubscribe swap in new
+        # sets, so publishing iterates a snapshot without taking a lock.
+        self._firehose: frozenset[Subscription] = frozenset()
+        self._by_topic: dict[str, frozenset[Subscription]] = {}
+        self._open: set[Subscription] = set()
+        # Event ids keep growing across restarts (boot second * 1e6 + sequence, still exact
+        # as a JS number), so a Last-Event-ID from before a deploy reads as "too old"
+        # rather than colliding with new ids.
+        self._next_id = int(time.time()) * 1_000_000
+        self._recent: deque[tuple[frozenset[str], bool, Frame]] = deque(maxlen=settings.EVENT_REPLAY_BUFFER)
+        self.stats = {"dropped": 0, "coalesced": 0, "disconnected": 0, "reaped": 0}
+        self._sweeper: asyncio.Task | None = None
+        # optional cross-process transport (settings.EVENT_BACKEND); None = this process only
+        self.bus = None
+
+    def _add(self, sub: Subscription) -> None:
+        if sub.firehose:
+            self._firehose = self._firehose | {sub}
+            return
+        by_topic = dict(self._by_topic)
+        for t in sub.topics:
+            by_topic[t] = by_topic.get(t, frozenset()) | {sub}
+        self._by_topic = by_topic
+
+    def _remove(self, sub: Subscription) -> None:
+        if sub.firehose:
+            self._firehose = self._firehose - {sub}
+            return
+        by_topic = dict(self._by_topic)
+        for t in sub.topics:
+            rest = by_topic.get(t, frozenset()) - {sub}
+            if rest:
+                by_topic[t] = rest
+            else:
+                by_topic.pop(t, None)
+        self._by_topic = by_topic
+
+    def _stamp(self, event: dict[str, Any]) -> tuple[int, str]:
+        self._next_id += 1
+        return self._next_id, json.dumps({**event, "event_id": self._next_id}, ensure_ascii=False)
+
+    def _deliver(self, event_id: int, topics: frozenset[str], msg: str, key: str | None = None, replay: bool = True) -> None:
+        # also used by the cross-process bus for events stamped by the hub process
+        self._next_id = max(self._next_id, event_id)
+        private = any(t.startswith("user:") for t in topics)
+        frame = make_frame(event_id, msg)
+        if replay:
+            self._recent.append((topics, private, frame))
+        by_topic = self._by_topic
+        targets = set() if private else set(self._firehose)
+        for t in topics:
+            targets.update(by_topic.get(t, ()))
+        for sub in targets:
+            if not sub.push(frame, key, self.stats):
+                self._remove(sub)
+
+    @staticmethod
+    def _route(event: dict[str, Any], topics: Iterable[str] | None) -> frozenset[str] | None:
+        topics = frozenset(topics if topics is not None else event_topics(event))
+        if event.get("type") in PRIVATE_TYPES:
+            topics = frozenset(t for t in topics if t.startswith("user:"))
+            if not topics:
+                log.warning("dropped %s event without a user topic", event.get("type"))
+                return None
+        return topics
+
+    def _publish_local(self, event: dict[str, Any], topics: frozenset[str]) -> None:
+        event_id, msg = self._stamp(event)
+        self._deliver(event_id, topics, msg, coalesce_key(event), event.get("type") not in TRANSIENT_TYPES)
+
+    async def publish(self, event: dict[str, Any], topics: Iterable[str] | None = None) -> None:
+        topics = self._route(event, topics)
+        if topics is None:
+            return
+        if self.bus is not None and await self.bus.publish(event, topics):
+            return
+        self._publish_local(event, topics)
+
+    async def publish_many(self, events: Iterable[dict[str, Any]]) -> None:
+        """Publish a batch (e.g. one watcher fan-out, one event per recipient) in one step:
+        events are routed by their own scope fields and cross the bus as a single frame."""
+        batch = [(event, topics) for event in events if (topics := self._route(event, None)) is not None]
+        if not batch:
+            return
+        if self.bus is not None and await self.bus.publish_many(batch):
+            return
+        for event, topics in batch:
+            self._publish_local(event, topics)
+
+    async def start(self) -> None:
+        if self._sweeper is None:
+            self._sweeper = asyncio.create_task(self._sweep_loop())
+        if settings.EVENT_BACKEND == "unix" and self.bus is None:
+            from .event_bus import UnixSocketBus
+            self.bus = UnixSocketBus(self, settings.EVENT_SOCKET_PATH)
+            await self.bus.start()
+
+    async def stop(self) -> None:
+        if self._sweeper is not None:
+            self._sweeper.cancel()
+            self._sweeper = None
+        if self.bus is not None:
+            await self.bus.stop()
+            self.bus = None
+
+    async def _sweep_loop(self) -> None:
+        while True:
+            await asyncio.sleep(settings.EVENT_HEARTBEAT_SECONDS)
+            self.sweep()
+
+    def sweep(self, now: float | None = None) -> None:
+        """Heartbeat idle SSE subscribers and reap the ones whose client stopped reading."""
+        now = time.monotonic() if now is None else now
+        for sub in list(self._open):
+            idle = now - sub.last_pull
+            if sub.queued and idle > settings.EVENT_IDLE_TIMEOUT_SECONDS:
+                # events have been waiting that long: the write is stuck or the peer is gone
+                self.close(sub)
+                self.stats["reaped"] += 1
+                if sub.task is not None and sub.task is not asyncio.current_task():
+                    sub.task.cancel()
+            elif sub.heartbeat and not sub.queued and idle >= settings.EVENT_HEARTBEAT_SECONDS:
+                sub.push(HEARTBEAT, None, self.stats)
+
+    def subscriber_count(self) -> int:
+        return len(self._open)
+
+    def _replay(self, sub_topics: frozenset[str], last_event_id: int) -> list[Frame]:
+        if last_event_id >= self._next_id:
+            return []
+        oldest = self._recent[0][2].event_id if self._recent else self._next_id + 1
+        if last_event_id < oldest - 1:
+            # the gap is no longer buffered (or predates this process): tell the client to refetch
+            return [make_frame(None, json.dumps({"type": "resync", "last_event_id": last_event_id}))]
+        return [f for topics, private, f in self._recent if f.event_id > last_event_id and _wants(sub_topics, topics, private)]
+
+    def open(
+        self,
+        topics: Iterable[str] | None = None,
+        last_event_id: int | None = None,
+        policy: str | None = None,
+        heartbeat: bool = False,
+        internal: bool = False,
+    ) -> tuple[Subscription, list[Frame]]:
+        """Register a subscriber; also returns the replay after `last_event_id`. Pair with close().
+
+        Raises TooManySubscribers at settings.EVENT_MAX_CONNECTIONS (0 = no cap). `internal`
+        subscribers (in-process consumers such as the agent loop) are not clients: they don't
+        count toward the cap and the idle reaper never closes them.
+        """
+        if not internal and settings.EVENT_MAX_CONNECTIONS and len(self._open) >= settings.EVENT_MAX_CONNECTIONS:
+            raise TooManySubscribers()
+        sub = Subscription(frozenset(topics or ()), policy or settings.EVENT_OVERFLOW_POLICY, SUBSCRIBER_QUEUE_SIZE, heartbeat)
+        # no await between registering and taking the replay, so nothing falls in between
+        self._add(sub)
+        if not internal:
+            self._open.add(sub)
+        return sub, self._replay(sub.topics, last_event_id) if last_event_id is not None else []
+
+    def close(self, sub: Subscription) -> None:
+        self._remove(sub)
+        self._open.discard(sub)
+
+    def set_topics(self, sub: Subscription, topics: Iterable[str]) -> None:
+        """Re-scope a live subscriber; an empty set now means no events rather than all of them."""
+        self._remove(sub)
+        sub.topics = frozenset(topics)
+        sub.firehose = False
+        self._add(sub)
+
+    async def batches(
+        self,
+        topics: Iterable[str] | None = None,
+        last_event_id: int | None = None,
+        policy: str | None = None,
+        internal: bool = False,
+    ) -> AsyncGenerator[list[Frame], None]:
+        """Lists of frames, one per write: a keepalive, then the replay after
+        `last_event_id`, then whatever queued up while the client was busy.
+
+        Raises SlowConsumer if `policy` is "disconnect" and the subscriber falls behind.
+        """
+        sub, backlog = self.open(topics, last_event_id, policy, internal=internal)
         try:
-            yield json.dumps({"type": "keepalive"})
+            yield [KEEPALIVE]
+            for i in range(0, len(backlog), MAX_BATCH):
+                yield backlog[i:i + MAX_BATCH]
             while True:
-                msg = await q.get()
-                yield msg
+                yield await sub.get_batch()
         finally:
-            async with self._lock:
-                self._subscribers.discard(q)
+            self.close(sub)
+
+    async def stream(
+        self,
+        topics: Iterable[str] | None = None,
+        last_event_id: int | None = None,
+        policy: str | None = None,
+        internal: bool = False,
+    ) -> AsyncGenerator[tuple[int | None, str], None]:
+        """(event id, JSON) pairs, one at a time; see `batches`."""
+        batches = self.batches(topics, last_event_id, policy, internal)
+        try:
+            async for batch in batches:
+                for frame in batch:
+                    yield frame.event_id, frame.text
+        finally:
+            await batches.aclose()
+
+    async def subscribe(self, topics: Iterable[str] | None = None) -> AsyncGenerator[str, None]:
+        """In-process consumers: internal, and never disconnected for falling behind."""
+        async for _, msg in self.stream(topics, policy="drop_oldest", internal=True):
+            yield msg
 
 broker = EventBroker()
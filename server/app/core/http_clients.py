@@ -0,0 +1,46 @@
+import asyncio
+import httpx
+from .config import settings
+
+try:
+    import h2  # noqa: F401  (httpx[http2])
+except ImportError:  # HTTP/2 is optional; without h2 clients still keep HTTP/1.1 connections alive
+    h2 = None
+
+# providers whose public endpoints negotiate HTTP/2; local servers such as ollama stay on HTTP/1.1
+HTTP2_PROVIDERS = frozenset({"anthropic", "openai", "grok", "gemini", "nevora"})
+
+
+class HttpClients:
+    """One pooled httpx.AsyncClient per provider, shared by the whole process, so LLM calls
+    reuse open keep-alive (and HTTP/2) connections instead of a TCP+TLS handshake per call."""
+
+    def __init__(self) -> None:
+        self._clients: dict[str, tuple[httpx.AsyncClient, asyncio.AbstractEventLoop]] = {}
+
+    def get(self, provider: str) -> httpx.AsyncClient:
+        loop = asyncio.get_running_loop()
+        entry = self._clients.get(provider)
+        # pooled connections belong to the loop that opened them
+        if entry is not None and not entry[0].is_closed and entry[1] is loop:
+            return entry[0]
+        client = httpx.AsyncClient(
+            http2=h2 is not None and provider in HTTP2_PROVIDERS,
+            limits=httpx.Limits(
+                max_connections=settings.LLM_HTTP_MAX_CONNECTIONS,
+                max_keepalive_connections=settings.LLM_HTTP_MAX_KEEPALIVE,
+                keepalive_expiry=settings.LLM_HTTP_KEEPALIVE_SECONDS,
+            ),
+            timeout=httpx.Timeout(settings.LLM_HTTP_TIMEOUT_SECONDS, connect=settings.LLM_HTTP_CONNECT_TIMEOUT_SECONDS),
+        )
+        self._clients[provider] = (client, loop)
+        return client
+
+    async def aclose(self) -> None:
+        clients, self._clients = self._clients, {}
+        for client, loop in clients.values():
+            if loop is asyncio.get_running_loop():
+                await client.aclose()
+
+
+http_clients = HttpClients()
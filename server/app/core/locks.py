@@ -0,0 +1,54 @@
+import os
+from .config import settings
+
+try:
+    import fcntl
+except ImportError:  # not POSIX: a single process is assumed and locks always succeed
+    fcntl = None
+
+
+class FileLock:
+    """Host-wide advisory lock (flock) shared by uvicorn workers; released when the process dies."""
+
+    def __init__(self, name: str) -> None:
+        os.makedirs(settings.LOCK_DIR, exist_ok=True)
+        self.path = os.path.join(settings.LOCK_DIR, f"{name}.lock")
+        self._fd: int | None = None
+
+    @property
+    def held(self) -> bool:
+        return self._fd is not None
+
+    def _lock(self, flags: int) -> bool:
+        if self._fd is not None:
+            return True
+        fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o644)
+        if fcntl is not None:
+            try:
+                fcntl.flock(fd, flags)
+            except BlockingIOError:
+                os.close(fd)
+                return False
+        self._fd = fd
+        return True
+
+    def try_acquire(self) -> bool:
+        return self._lock(fcntl.LOCK_EX | fcntl.LOCK_NB if fcntl else 0)
+
+    def acquire(self) -> None:
+        self._lock(fcntl.LOCK_EX if fcntl else 0)
+
+    def release(self) -> None:
+        if self._fd is None:
+            return
+        if fcntl is not None:
+            fcntl.flock(self._fd, fcntl.LOCK_UN)
+        os.close(self._fd)
+        self._fd = None
+
+    def __enter__(self) -> "FileLock":
+        self.acquire()
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.release()
@@ -1,11 +1,82 @@
 from sqlmodel import SQLModel, create_engine, Session
+from sqlmodel.ext.asyncio.session import AsyncSession
+from sqlalchemy import event
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
 from .core.config import settings
 
-engine = create_engine(settings.DB_URL, echo=False, connect_args={"check_same_thread": False})
+
+def _async_url(url: str) -> str:
+    if settings.ASYNC_DB_URL:
+        return settings.ASYNC_DB_URL
+    if url.startswith("sqlite:"):
+        return "sqlite+aiosqlite:" + url[len("sqlite:"):]
+    if url.startswith("postgres://"):
+        return "postgresql+asyncpg://" + url[len("postgres://"):]
+    if url.startswith("postgresql://"):
+        return "postgresql+asyncpg://" + url[len("postgresql://"):]
+    return url
+
+
+def _is_sqlite(url: str) -> bool:
+    return url.startswith("sqlite")
+
+
+def _engine_kwargs(url: str) -> dict:
+    kwargs = {"echo": False}
+    if _is_sqlite(url):
+        kwargs["connect_args"] = {"check_same_thread": False}
+        if ":memory:" in url or url.rstrip("/").endswith(":"):
+            return kwargs
+    kwargs["pool_size"] = settings.DB_POOL_SIZE
+    kwargs["max_overflow"] = settings.DB_MAX_OVERFLOW
+    kwargs["pool_pre_ping"] = not _is_sqlite(url)
+    return kwargs
+
+
+def _sqlite_pragmas() -> list[str]:
+    if settings.SQLITE_PROFILE != "production":
+        return [f"PRAGMA busy_timeout={settings.SQLITE_BUSY_TIMEOUT_MS}"]
+    return [
+        "PRAGMA journal_mode=WAL",
+        "PRAGMA synchronous=NORMAL",
+        f"PRAGMA busy_timeout={settings.SQLITE_BUSY_TIMEOUT_MS}",
+        f"PRAGMA mmap_size={settings.SQLITE_MMAP_SIZE}",
+        f"PRAGMA cache_size=-{settings.SQLITE_CACHE_SIZE_KB}",
+        "PRAGMA temp_store=MEMORY",
+    ]
+
+
+def _install_sqlite_pragmas(sync_engine) -> None:
+    pragmas = _sqlite_pragmas()
+
+    @event.listens_for(sync_engine, "connect")
+    def _on_connect(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        try:
+            for pragma in pragmas:
+                cursor.execute(pragma)
+        finally:
+            cursor.close()
+
+
+engine = create_engine(settings.DB_URL, **_engine_kwargs(settings.DB_URL))
+async_engine = create_async_engine(_async_url(settings.DB_URL), **_engine_kwargs(_async_url(settings.DB_URL)))
+async_session_maker = async_sessionmaker(async_engine, class_=AsyncSession, expire_on_commit=False)
+
+if _is_sqlite(settings.DB_URL):
+    _install_sqlite_pragmas(engine)
+if _is_sqlite(_async_url(settings.DB_URL)):
+    _install_sqlite_pragmas(async_engine.sync_engine)
 
 def init_db() -> None:
+    from .migrations import run_migrations
     SQLModel.metadata.create_all(engine)
+    run_migrations(engine)
 
 def get_session():
     with Session(engine) as session:
         yield session
+
+async def get_async_session():
+    async with async_session_maker() as session:
+        yield session
@@ -3,16 +3,21 @@ from fastapi import FastAPI, Depends
 from fastapi.middleware.cors import CORSMiddleware
 from sqlmodel import Session, select
 from .core.config import settings
-from .db import init_db, engine
+from .db import init_db, engine, async_engine
 from .models import Board, User, Wallet, Agent
 from .deps import get_current_user
-from .routers import auth, boards, subscriptions, threads, events, artifacts, repos, wallet, bounties, agents, moderation, system, notifications, watches, audit, invites, profiles, reactions, public, votes, devapi, webhooks
+from .routers import auth, boards, subscriptions, threads, events, artifacts, repos, wallet, bounties, agents, moderation, system, notifications, watches, audit, invites, profiles, reactions, public, votes, devapi, webhooks, search
 from .core.node_signing import load_or_create_node_key, public_key_pem
 from .services import ledger as ledger_service
 from .services import events_log as events_log_service
+from .services.jobs import job_workers
 from .routers import threads as threads_router
 from .agents.runner import agent_loop, daily_digest_loop, weekly_report_loop
+from .services.agent_memory import agent_memory
 from .core.security import hash_password
+from .core.events import broker
+from .core.locks import FileLock
+from .core.http_clients import http_clients
 
 app = FastAPI(title=settings.APP_NAME)
 
@@ -79,18 +84,43 @@ def seed_admin(session: Session):
         session.add(admin)
         session.commit()
 
+SINGLETON_RETRY_SECONDS = 15
+_singleton_lock = FileLock("agent-loops")
+
+async def _run_singleton_loops():
+    # With several uvicorn workers only one runs the agent and digest loops; the others
+    # keep polling the lock and take over if that worker exits.
+    while not _singleton_lock.try_acquire():
+        await asyncio.sleep(SINGLETON_RETRY_SECONDS)
+    await agent_memory.load()
+    await asyncio.gather(
+        agent_loop(NODE_PRIV), daily_digest_loop(NODE_PRIV), weekly_report_loop(NODE_PRIV), agent_memory.flush_loop(),
+    )
+
 @app.on_event("startup")
 async def on_startup():
-    init_db()
-    with Session(engine) as session:
-        seed_boards(session)
-        seed_default_agents(session)
-        seed_admin(session)
+    # workers start together; migrations and seeds run one at a time
+    with FileLock("startup"):
+        init_db()
+        with Session(engine) as session:
+            seed_boards(session)
+            seed_default_agents(session)
+            seed_admin(session)
+
+    await broker.start()
+    job_workers.start()
 
     if settings.AGENT_ENABLED:
-        asyncio.create_task(agent_loop(NODE_PRIV))
-        asyncio.create_task(daily_digest_loop(NODE_PRIV))
-        asyncio.create_task(weekly_report_loop(NODE_PRIV))
+        asyncio.create_task(_run_singleton_loops())
+
+@app.on_event("shutdown")
+async def on_shutdown():
+    await job_workers.stop()
+    await broker.stop()
+    _singleton_lock.release()
+    await http_clients.aclose()
+    await agent_memory.flush()
+    await async_engine.dispose()
 
 @app.get("/api/health")
 def health():
@@ -125,3 +155,4 @@ app.include_router(votes.router)
 app.include_router(devapi.router)
 
 app.include_router(webhooks.router)
+app.include_router(search.router)
@@ -0,0 +1,166 @@
+"""Versioned schema migrations for live databases.
+
+`SQLModel.metadata.create_all` only creates missing tables, so anything added to an
+existing table (indexes, columns) is applied here. Each migration runs once, in
+version order, and is recorded in the `schemamigration` table. Steps are written
+to be idempotent so a fresh database (already built by create_all) passes through
+them safely. A step that can't run on this build raises Deferred: it is rolled back
+and left pending, so a later run on a capable build applies it.
+
+    python -m app.migrations            # apply pending migrations
+    python -m app.migrations --status   # list applied/pending versions
+"""
+from __future__ import annotations
+import logging
+import sys
+from datetime import datetime
+from typing import Callable
+from sqlalchemy import inspect, text
+from sqlalchemy.engine import Connection, Engine
+from .models import SchemaMigration
+
+log = logging.getLogger("coevo.migrations")
+
+
+class Deferred(Exception):
+    """Raised by a migration step that needs something this build lacks (e.g. FTS5)."""
+
+
+def _create_index(conn: Connection, name: str, table: str, columns: str, unique: bool = False) -> None:
+    conn.execute(text(f"CREATE {'UNIQUE ' if unique else ''}INDEX IF NOT EXISTS {name} ON {table} ({columns})"))
+
+
+def _add_column(conn: Connection, table: str, column: str, ddl: str) -> None:
+    if column not in {c["name"] for c in inspect(conn).get_columns(table)}:
+        conn.execute(text(f"ALTER TABLE {table} ADD COLUMN {column} {ddl}"))
+
+
+def _m001_hot_path_indexes(conn: Connection) -> None:
+    _create_index(conn, "ix_notification_user_id_read_at", "notification", "user_id, read_at")
+    _create_index(conn, "ix_wallet_owner_type_owner_user_id", "wallet", "owner_type, owner_user_id")
+    _create_index(conn, "ix_wallet_owner_type_owner_agent_id", "wallet", "owner_type, owner_agent_id")
+    _create_index(conn, "ix_thread_board_id_updated_at", "thread", "board_id, updated_at")
+    _create_index(conn, "ix_threadwatch_thread_id", "threadwatch", "thread_id")
+
+
+def _m002_unique_post_reaction(conn: Connection) -> None:
+    # Toggle races could leave duplicate user reactions; keep the oldest before enforcing uniqueness.
+    conn.execute(text(
+        "DELETE FROM postreaction WHERE by_user_id IS NOT NULL AND id NOT IN ("
+        "SELECT MIN(id) FROM postreaction WHERE by_user_id IS NOT NULL GROUP BY post_id, by_user_id, reaction)"
+    ))
+    _create_index(conn, "ux_postreaction_post_id_by_user_id_reaction", "postreaction", "post_id, by_user_id, reaction", unique=True)
+
+
+def _m003_thread_summary_cursor(conn: Connection) -> None:
+    _add_column(conn, "threadsummary", "source_last_post_id", "INTEGER NOT NULL DEFAULT 0")
+    # existing summaries covered everything before their TL;DR post
+    conn.execute(text("UPDATE threadsummary SET source_last_post_id = summary_post_id WHERE source_last_post_id = 0"))
+
+
+def _m004_thread_activity(conn: Connection) -> None:
+    _add_column(conn, "thread", "post_count", "INTEGER NOT NULL DEFAULT 0")
+    _add_column(conn, "thread", "last_post_id", "INTEGER")
+    _add_column(conn, "thread", "last_post_at", "TIMESTAMP")
+    _add_column(conn, "thread", "last_author", "VARCHAR")
+    visible = "post.thread_id = thread.id AND post.is_hidden = :hidden"
+    conn.execute(text(
+        f"UPDATE thread SET post_count = (SELECT COUNT(*) FROM post WHERE {visible}), "
+        f"last_post_id = (SELECT MAX(post.id) FROM post WHERE {visible})"
+    ), {"hidden": False})
+    conn.execute(text(
+        "UPDATE thread SET "
+        "last_post_at = (SELECT post.created_at FROM post WHERE post.id = thread.last_post_id), "
+        "last_author = (SELECT COALESCE(u.handle, a.handle) FROM post "
+        "LEFT JOIN \"user\" u ON post.author_type = 'user' AND u.id = post.author_user_id "
+        "LEFT JOIN agent a ON post.author_type = 'agent' AND a.id = post.author_agent_id "
+        "WHERE post.id = thread.last_post_id) "
+        "WHERE last_post_id IS NOT NULL"
+    ))
+
+
+def _m005_search_index(conn: Connection) -> None:
+    from .services import search
+    if not search.fts5_available(conn):
+        raise Deferred("SQLite without FTS5")
+    search.install(conn)
+    search.rebuild(conn)
+
+
+ID_COMPOSITES = (
+    ("ix_post_thread_id_id", "post", "thread_id, id"),
+    ("ix_ledgertx_from_wallet_id_id", "ledgertx", "from_wallet_id, id"),
+    ("ix_ledgertx_to_wallet_id_id", "ledgertx", "to_wallet_id, id"),
+)
+
+
+def _m006_id_composites(conn: Connection) -> None:
+    # as models.unless_sqlite: redundant on SQLite (rowid suffix), needed elsewhere for ORDER BY id
+    for name, table, columns in ID_COMPOSITES:
+        if conn.dialect.name == "sqlite":
+            conn.execute(text(f"DROP INDEX IF EXISTS {name}"))
+        else:
+            _create_index(conn, name, table, columns)
+
+
+def _m007_search_index_repair(conn: Connection) -> None:
+    from .services import search
+    # migration 5 used to be recorded as applied without FTS5, leaving no index behind
+    if not search.index_exists(conn):
+        _m005_search_index(conn)
+
+
+MIGRATIONS: list[tuple[int, str, Callable[[Connection], None]]] = [
+    (1, "hot_path_indexes", _m001_hot_path_indexes),
+    (2, "unique_post_reaction", _m002_unique_post_reaction),
+    (3, "thread_summary_cursor", _m003_thread_summary_cursor),
+    (4, "thread_activity", _m004_thread_activity),
+    (5, "search_index", _m005_search_index),
+    (6, "id_composites", _m006_id_composites),
+    (7, "search_index_repair", _m007_search_index_repair),
+]
+
+
+def applied_versions(engine: Engine) -> set[int]:
+    SchemaMigration.__table__.create(engine, checkfirst=True)
+    with engine.connect() as conn:
+        return {row[0] for row in conn.execute(text("SELECT version FROM schemamigration"))}
+
+
+def run_migrations(engine: Engine) -> list[int]:
+    done = applied_versions(engine)
+    applied = []
+    for version, name, step in MIGRATIONS:
+        if version in done:
+            continue
+        try:
+            with engine.begin() as conn:
+                step(conn)
+                conn.execute(
+                    text("INSERT INTO schemamigration (version, name, applied_at) VALUES (:v, :n, :t)"),
+                    {"v": version, "n": name, "t": datetime.utcnow()},
+                )
+        except Deferred as e:
+            log.warning("migration %04d %s deferred: %s", version, name, e)
+            continue
+        applied.append(version)
+    return applied
+
+
+def main(argv: list[str]) -> int:
+    from sqlmodel import SQLModel
+    from .db import engine
+
+    if "--status" in argv:
+        done = applied_versions(engine)
+        for version, name, _ in MIGRATIONS:
+            print(f"{version:04d} {name:<32} {'applied' if version in done else 'pending'}")
+        return 0
+    SQLModel.metadata.create_all(engine)
+    applied = run_migrations(engine)
+    print(f"applied: {applied}" if applied else "up to date")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
@@ -1,7 +1,7 @@
 from typing import Optional
 from datetime import datetime
 from sqlmodel import SQLModel, Field, Relationship
-from sqlalchemy import Column
+from sqlalchemy import Column, Index
 from sqlalchemy.dialects.sqlite import JSON
 
 
@@ -9,6 +9,12 @@ def utcnow() -> datetime:
     return datetime.utcnow()
 
 
+def unless_sqlite(ddl, target, bind, **kw) -> bool:
+    # SQLite index entries already end in the rowid, so a (col, id) index would only
+    # duplicate the single-column one; other databases need it to walk col in id order.
+    return kw["dialect"].name != "sqlite"
+
+
 class User(SQLModel, table=True):
     id: Optional[int] = Field(default=None, primary_key=True)
     handle: str = Field(index=True, unique=True)
@@ -63,17 +69,30 @@ class Thread(SQLModel, table=True):
     created_by_agent_id: Optional[int] = Field(default=None, foreign_key="agent.id")
     created_at: datetime = Field(default_factory=utcnow)
     updated_at: datetime = Field(default_factory=utcnow)
+    # visible-post activity, maintained by services.thread_activity
+    post_count: int = Field(default=0)
+    last_post_id: Optional[int] = None
+    last_post_at: Optional[datetime] = None
+    last_author: Optional[str] = None
 
     board: "Board" = Relationship(back_populates="threads")
     posts: list["Post"] = Relationship(back_populates="thread")
     bounties: list["Bounty"] = Relationship(back_populates="thread")
 
+    __table_args__ = (
+        Index("ix_thread_board_id_updated_at", "board_id", "updated_at"),
+    )
+
 
 class ThreadWatch(SQLModel, table=True):
     user_id: int = Field(foreign_key="user.id", primary_key=True)
     thread_id: int = Field(foreign_key="thread.id", primary_key=True)
     created_at: datetime = Field(default_factory=utcnow)
 
+    __table_args__ = (
+        Index("ix_threadwatch_thread_id", "thread_id"),
+    )
+
 
 class Notification(SQLModel, table=True):
     id: Optional[int] = Field(default=None, primary_key=True)
@@ -84,6 +103,10 @@ class Notification(SQLModel, table=True):
     created_at: datetime = Field(default_factory=utcnow)
     read_at: Optional[datetime] = Field(default=None)
 
+    __table_args__ = (
+        Index("ix_notification_user_id_read_at", "user_id", "read_at"),
+    )
+
 
 class Post(SQLModel, table=True):
     id: Optional[int] = Field(default=None, primary_key=True)
@@ -98,6 +121,10 @@ class Post(SQLModel, table=True):
 
     thread: "Thread" = Relationship(back_populates="posts")
 
+    __table_args__ = (
+        Index("ix_post_thread_id_id", "thread_id", "id").ddl_if(callable_=unless_sqlite),
+    )
+
 
 class Artifact(SQLModel, table=True):
     id: Optional[int] = Field(default=None, primary_key=True)
@@ -139,6 +166,11 @@ class Wallet(SQLModel, table=True):
     user: Optional["User"] = Relationship(back_populates="wallet")
     agent: Optional["Agent"] = Relationship(back_populates="wallet")
 
+    __table_args__ = (
+        Index("ix_wallet_owner_type_owner_user_id", "owner_type", "owner_user_id"),
+        Index("ix_wallet_owner_type_owner_agent_id", "owner_type", "owner_agent_id"),
+    )
+
 
 class LedgerTx(SQLModel, table=True):
     id: Optional[int] = Field(default=None, primary_key=True)
@@ -151,6 +183,11 @@ class LedgerTx(SQLModel, table=True):
     created_at: datetime = Field(default_factory=utcnow)
     signature: Optional[str] = Field(default=None)
 
+    __table_args__ = (
+        Index("ix_ledgertx_from_wallet_id_id", "from_wallet_id", "id").ddl_if(callable_=unless_sqlite),
+        Index("ix_ledgertx_to_wallet_id_id", "to_wallet_id", "id").ddl_if(callable_=unless_sqlite),
+    )
+
 
 class Bounty(SQLModel, table=True):
     id: Optional[int] = Field(default=None, primary_key=True)
@@ -206,6 +243,10 @@ class PostReaction(SQLModel, table=True):
     by_agent_id: Optional[int] = Field(default=None, foreign_key="agent.id", index=True)
     created_at: datetime = Field(default_factory=utcnow)
 
+    __table_args__ = (
+        Index("ux_postreaction_post_id_by_user_id_reaction", "post_id", "by_user_id", "reaction", unique=True),
+    )
+
 
 class VoteProposal(SQLModel, table=True):
     id: Optional[int] = Field(default=None, primary_key=True)
@@ -233,4 +274,82 @@ class ThreadSummary(SQLModel, table=True):
     thread_id: int = Field(foreign_key="thread.id", unique=True, index=True)
     summary_post_id: int = Field(foreign_key="post.id")
     source_post_count: int = Field(default=0)
+    # highest post id folded into the summary; the next rolling summary starts after it
+    source_last_post_id: int = Field(default=0)
     updated_at: datetime = Field(default_factory=utcnow)
+
+
+class Job(SQLModel, table=True):
+    id: Optional[int] = Field(default=None, primary_key=True)
+    kind: str = Field(index=True)
+    payload: dict = Field(default_factory=dict, sa_column=Column(JSON))
+    status: str = Field(default="pending")  # pending|running|done|failed
+    idempotency_key: Optional[str] = Field(default=None, unique=True, index=True)
+    attempts: int = Field(default=0)
+    max_attempts: int = Field(default=5)
+    run_after: datetime = Field(default_factory=utcnow)
+    locked_at: Optional[datetime] = Field(default=None)
+    last_error: str = Field(default="")
+    created_at: datetime = Field(default_factory=utcnow)
+    updated_at: datetime = Field(default_factory=utcnow)
+
+    __table_args__ = (
+        Index("ix_job_status_run_after", "status", "run_after"),
+    )
+
+
+class EmailOutbox(SQLModel, table=True):
+    id: Optional[int] = Field(default=None, primary_key=True)
+    to_email: str
+    subject: str
+    body: str = Field(default="")
+    status: str = Field(default="pending", index=True)  # pending|sending|sent|skipped|failed
+    attempts: int = Field(default=0)
+    claim_token: Optional[str] = Field(default=None, index=True)
+    claimed_at: Optional[datetime] = Field(default=None)
+    last_error: str = Field(default="")
+    created_at: datetime = Field(default_factory=utcnow)
+    sent_at: Optional[datetime] = Field(default=None)
+
+
+class AgentMemoryNote(SQLModel, table=True):
+    id: Optional[int] = Field(default=None, primary_key=True)
+    agent_handle: str
+    user_handle: str
+    # most recent interaction snippets, oldest first
+    notes: list = Field(default_factory=list, sa_column=Column(JSON))
+    updated_at: datetime = Field(default_factory=utcnow)
+
+    __table_args__ = (
+        Index("ix_agentmemorynote_agent_user", "agent_handle", "user_handle", unique=True),
+    )
+
+
+class AgentTopic(SQLModel, table=True):
+    token: str = Field(primary_key=True)
+    count: int = Field(default=0)
+
+
+class LLMCacheEntry(SQLModel, table=True):
+    # sha256 of (provider, model, system prompt, user prompt, max_tokens)
+    key: str = Field(primary_key=True)
+    response: str
+    created_at: datetime = Field(default_factory=utcnow, index=True)
+    expires_at: datetime
+
+
+class AgentRateBucket(SQLModel, table=True):
+    # "agent:{agent_id}" or "thread:{agent_id}:{thread_id}"; times are unix seconds
+    key: str = Field(primary_key=True)
+    tokens: float
+    capacity: float
+    rate: float  # tokens refilled per second
+    updated_at: float
+    # when the bucket is full again; rows past this carry no state and are pruned
+    full_at: float = Field(index=True)
+
+
+class SchemaMigration(SQLModel, table=True):
+    version: int = Field(primary_key=True)
+    name: str
+    applied_at: datetime = Field(default_factory=utcnow)
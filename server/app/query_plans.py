@@ -0,0 +1,81 @@
+"""EXPLAIN QUERY PLAN check for the hot query shapes (SQLite).
+
+    python -m app.query_plans            # temp database built from models + migrations
+    python -m app.query_plans --live     # the database at COEVO_DB_URL
+
+Exits non-zero if any hot query falls back to a full table scan or sorts its ORDER BY
+in a temp B-tree instead of reading rows in index order.
+"""
+from __future__ import annotations
+import re
+import sys
+import tempfile
+from datetime import datetime
+from sqlalchemy import create_engine, text
+from sqlalchemy.dialects import sqlite
+from sqlmodel import SQLModel, select
+from .models import Post, Notification, Wallet, PostReaction, ThreadWatch, ThreadSummary
+from .migrations import run_migrations
+from .services.ledger import wallet_ledger_query
+from .services.thread_activity import board_threads_query
+
+FULL_SCAN_RE = re.compile(r"^SCAN (\w+)$")
+TEMP_SORT_RE = re.compile(r"^USE TEMP B-TREE FOR .*ORDER BY$")
+
+
+def hot_queries() -> dict[str, object]:
+    return {
+        "thread_posts": select(Post).where(Post.thread_id == 1).order_by(Post.id),
+        "thread_posts_after": select(Post).where(Post.thread_id == 1, Post.id > 10).order_by(Post.id).limit(50),
+        "thread_posts_before": select(Post).where(Post.thread_id == 1, Post.is_hidden == False, Post.id < 500).order_by(Post.id.desc()).limit(50),
+        "unread_notifications": select(Notification).where(Notification.user_id == 1, Notification.read_at == None),
+        "list_notifications": select(Notification).where(Notification.user_id == 1).order_by(Notification.id.desc()).limit(50),
+        "wallet_ledger": wallet_ledger_query(1),
+        "user_wallet": select(Wallet).where(Wallet.owner_type == "user", Wallet.owner_user_id == 1),
+        "agent_wallet": select(Wallet).where(Wallet.owner_type == "agent", Wallet.owner_agent_id == 1),
+        "board_threads": board_threads_query(1),
+        "board_threads_before": board_threads_query(1, datetime(2030, 1, 1), 10),
+        "reaction_toggle": select(PostReaction).where(PostReaction.post_id == 1, PostReaction.by_user_id == 1, PostReaction.reaction == "+1"),
+        "post_reactions": select(PostReaction).where(PostReaction.post_id == 1),
+        "thread_watchers": select(ThreadWatch).where(ThreadWatch.thread_id == 1),
+        "thread_summary": select(ThreadSummary).where(ThreadSummary.thread_id == 1),
+    }
+
+
+def _sql(stmt) -> str:
+    return str(stmt.compile(dialect=sqlite.dialect(), compile_kwargs={"literal_binds": True}))
+
+
+def check(engine) -> list[str]:
+    failures = []
+    with engine.connect() as conn:
+        for name, stmt in hot_queries().items():
+            plan = [row[3] for row in conn.execute(text("EXPLAIN QUERY PLAN " + _sql(stmt)))]
+            scans = [d for d in plan if FULL_SCAN_RE.match(d)]
+            sorts = [d for d in plan if TEMP_SORT_RE.match(d)]
+            status = "FULL SCAN" if scans else "TEMP SORT" if sorts else "ok"
+            print(f"{name:<24} {status:<10} {' | '.join(plan)}")
+            if scans or sorts:
+                failures.append(name)
+    return failures
+
+
+def main(argv: list[str]) -> int:
+    if "--live" in argv:
+        from .db import engine
+        failures = check(engine)
+    else:
+        with tempfile.TemporaryDirectory() as d:
+            engine = create_engine(f"sqlite:///{d}/plan.db")
+            SQLModel.metadata.create_all(engine)
+            run_migrations(engine)
+            failures = check(engine)
+            engine.dispose()
+    if failures:
+        print(f"full scans or temp sorts in: {', '.join(failures)}")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
@@ -1,11 +1,13 @@
 from datetime import datetime, timedelta
 from fastapi import APIRouter, Depends, HTTPException
 from sqlmodel import Session, select
-from ..db import get_session
+from sqlmodel.ext.asyncio.session import AsyncSession
+from ..db import get_session, get_async_session
 from ..models import Agent, Wallet, Post
 from ..deps import require_role, get_current_user
 from ..core.events import broker
 from ..services.events_log import log_event
+from ..agents.rate_limit import reply_limiter
 
 router = APIRouter(prefix="/api/agents", tags=["agents"])
 
@@ -46,6 +48,11 @@ def agent_directory(session: Session = Depends(get_session), user=Depends(get_cu
         })
     return out
 
+@router.get("/rate-limits")
+def rate_limits(limit: int = 200, session: Session = Depends(get_session), _admin=Depends(require_role("admin","mod"))):
+    # with the memory backend these are the buckets of the worker that serves the request
+    return reply_limiter.snapshot(session, max(1, min(limit, 1000)))
+
 @router.post("")
 def create_agent(handle: str, model: str="anthropic:claude-3-5-haiku-latest", autonomy_mode: str="assistant",
                  session: Session = Depends(get_session), _admin=Depends(require_role("admin","mod"))):
@@ -78,10 +85,10 @@ def update_agent(agent_id: int, is_enabled: bool | None=None, autonomy_mode: str
     return {"ok": True}
 
 @router.post("/{agent_id}/summon")
-async def summon(agent_id: int, thread_id: int, session: Session = Depends(get_session), user=Depends(get_current_user)):
-    a = session.get(Agent, agent_id)
+async def summon(agent_id: int, thread_id: int, session: AsyncSession = Depends(get_async_session), user=Depends(get_current_user)):
+    a = await session.get(Agent, agent_id)
     if not a or not a.is_enabled:
         raise HTTPException(404, "Agent not available")
     await broker.publish({"type":"agent_summoned","agent_id": agent_id, "thread_id": thread_id, "by": user.handle})
-    log_event(session, "agent_summoned", {"agent_id": agent_id, "thread_id": thread_id, "by": user.handle})
+    await session.run_sync(log_event, "agent_summoned", {"agent_id": agent_id, "thread_id": thread_id, "by": user.handle})
     return {"ok": True}
@@ -3,7 +3,8 @@ import hashlib
 from fastapi import APIRouter, Depends, UploadFile, File, HTTPException
 from fastapi.responses import FileResponse
 from sqlmodel import Session, select
-from ..db import get_session
+from sqlmodel.ext.asyncio.session import AsyncSession
+from ..db import get_session, get_async_session
 from ..models import Artifact, ThreadArtifact
 from ..deps import get_current_user
 from ..core.config import settings
@@ -17,7 +18,7 @@ def ensure_dirs():
 @router.post("/upload")
 async def upload_artifact(
     file: UploadFile = File(...),
-    session: Session = Depends(get_session),
+    session: AsyncSession = Depends(get_async_session),
     user = Depends(get_current_user)
 ):
     ensure_dirs()
@@ -39,9 +40,9 @@ async def upload_artifact(
         storage_path=storage_path,
     )
     session.add(art)
-    session.commit()
-    session.refresh(art)
-    log_event(session, "artifact_uploaded", {"artifact_id": art.id, "by": user.handle, "sha256": art.sha256})
+    await session.commit()
+    await session.refresh(art)
+    await session.run_sync(log_event, "artifact_uploaded", {"artifact_id": art.id, "by": user.handle, "sha256": art.sha256})
     return {
         "id": art.id,
         "filename": art.filename,
@@ -1,14 +1,17 @@
 from datetime import datetime, timedelta
 from fastapi import APIRouter, Depends, HTTPException
 from sqlmodel import Session, select
-from ..db import get_session
+from sqlmodel.ext.asyncio.session import AsyncSession
+from ..db import get_session, get_async_session
 from ..models import Bounty, Wallet, Thread, Post, User, Agent
 from ..schemas import CreateBountyIn, SubmitBountyIn, PayBountyIn
 from ..deps import get_current_user
 from ..services.ledger import get_or_create_system_wallet, transfer
 from ..services.events_log import log_event
 from ..core.events import broker
-from ..services.emailer import send_email
+from ..services.emailer import queue_email
+from ..services.jobs import job_workers
+from ..services.thread_activity import record_post
 
 router = APIRouter(prefix="/api/bounties", tags=["bounties"])
 
@@ -43,35 +46,35 @@ def list_for_thread(thread_id: int, session: Session = Depends(get_session), use
     } for b in bounties]
 
 @router.post("/thread/{thread_id}")
-async def create_bounty(thread_id: int, payload: CreateBountyIn, session: Session = Depends(get_session), user=Depends(get_current_user)):
+async def create_bounty(thread_id: int, payload: CreateBountyIn, session: AsyncSession = Depends(get_async_session), user=Depends(get_current_user)):
     if payload.amount <= 0:
         raise HTTPException(400, "Amount must be > 0")
-    t = session.get(Thread, thread_id)
+    t = await session.get(Thread, thread_id)
     if not t:
         raise HTTPException(404, "Thread not found")
 
-    u = session.get(User, user.id)
+    u = await session.get(User, user.id)
     since = datetime.utcnow() - timedelta(hours=24)
-    posted_today = session.exec(select(Bounty).where(Bounty.creator_user_id==user.id, Bounty.created_at >= since)).all()
+    posted_today = (await session.exec(select(Bounty).where(Bounty.creator_user_id==user.id, Bounty.created_at >= since))).all()
     limit = _daily_bounty_limit(u.reputation if u else 0)
     if len(posted_today) >= limit:
         raise HTTPException(403, f"Daily bounty limit reached ({limit}). Increase reputation to unlock more.")
 
-    creator_w = session.exec(select(Wallet).where(Wallet.owner_type=="user", Wallet.owner_user_id==user.id)).first()
+    creator_w = (await session.exec(select(Wallet).where(Wallet.owner_type=="user", Wallet.owner_user_id==user.id))).first()
     if not creator_w:
         raise HTTPException(404, "Wallet missing")
-    system_w = get_or_create_system_wallet(session)
+    system_w = await session.run_sync(get_or_create_system_wallet)
 
     try:
-        transfer(session, creator_w.id, system_w.id, payload.amount, "escrow", ref_type="thread", ref_id=thread_id)
+        await session.run_sync(transfer, creator_w.id, system_w.id, payload.amount, "escrow", ref_type="thread", ref_id=thread_id)
     except ValueError as e:
         raise HTTPException(400, str(e))
 
     b = Bounty(thread_id=thread_id, creator_user_id=user.id, amount=payload.amount, title=payload.title, requirements_md=payload.requirements_md)
     session.add(b)
-    session.commit()
-    session.refresh(b)
-    log_event(session, "bounty_created", {"bounty_id": b.id, "thread_id": thread_id, "amount": b.amount, "by": user.handle})
+    await session.commit()
+    await session.refresh(b)
+    await session.run_sync(log_event, "bounty_created", {"bounty_id": b.id, "thread_id": thread_id, "amount": b.amount, "by": user.handle})
     await broker.publish({
         "type": "bounty_created",
         "thread_id": thread_id,
@@ -95,13 +98,11 @@ def claim_bounty(bounty_id: int, session: Session = Depends(get_session), user=D
     b.status = "claimed"
     b.claimed_by_user_id = user.id
     session.add(b)
-    session.commit()
     creator = session.get(User, b.creator_user_id)
     if creator and creator.email:
-        try:
-            send_email(creator.email, f"CoEvo: Bounty #{b.id} was claimed", f"Your bounty '{b.title}' now has a taker (@{user.handle}).")
-        except Exception:
-            pass
+        queue_email(session, creator.email, f"CoEvo: Bounty #{b.id} was claimed", f"Your bounty '{b.title}' now has a taker (@{user.handle}).")
+    session.commit()
+    job_workers.wake()
     log_event(session, "bounty_claimed", {"bounty_id": b.id, "by": user.handle})
     return {"ok": True}
 
@@ -116,6 +117,8 @@ def submit_bounty(bounty_id: int, payload: SubmitBountyIn, session: Session = De
         raise HTTPException(403, "Not your bounty")
     p = Post(thread_id=b.thread_id, author_type="user", author_user_id=user.id, content_md=f"**Bounty submission** (bounty #{b.id}):\n\n{payload.note_md}")
     session.add(p)
+    session.flush()
+    record_post(session, p, user.handle)
     b.status = "submitted"
     session.add(b)
     session.commit()
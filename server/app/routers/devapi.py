@@ -1,8 +1,10 @@
-from fastapi import APIRouter, Depends
+from datetime import datetime
+from fastapi import APIRouter, Depends, Query
 from sqlmodel import Session, select
 from ..db import get_session
 from ..deps import get_current_user
-from ..models import Board, Thread
+from ..models import Board
+from ..services.thread_activity import board_threads_query, thread_out
 
 router = APIRouter(prefix='/api', tags=['developer-api'])
 
@@ -13,7 +15,7 @@ def api_docs(user=Depends(get_current_user)):
         "auth": "Bearer token (use /api/auth/login)",
         "endpoints": [
             {"method": "GET", "path": "/api/public-api/boards", "desc": "List boards"},
-            {"method": "GET", "path": "/api/public-api/threads/{board_id}", "desc": "List threads for a board"},
+            {"method": "GET", "path": "/api/public-api/threads/{board_id}", "desc": "List threads for a board, newest activity first (?limit, ?before=<updated_at>&before_id=<id> for the next page)"},
             {"method": "GET", "path": "/api/public-api/health", "desc": "API health"},
         ],
     }
@@ -28,6 +30,6 @@ def public_boards(session: Session = Depends(get_session), user=Depends(get_curr
     return [{"id":b.id, "slug":b.slug, "title":b.title, "description":b.description, "is_premium": b.is_premium} for b in boards]
 
 @router.get('/public-api/threads/{board_id}')
-def public_threads(board_id: int, session: Session = Depends(get_session), user=Depends(get_current_user)):
-    threads = session.exec(select(Thread).where(Thread.board_id==board_id).order_by(Thread.updated_at.desc())).all()
-    return [{"id":t.id, "title":t.title, "board_id": t.board_id, "updated_at": t.updated_at.isoformat()+"Z"} for t in threads]
+def public_threads(board_id: int, before: datetime | None = None, before_id: int | None = None, limit: int = Query(100, ge=1, le=500), session: Session = Depends(get_session), user=Depends(get_current_user)):
+    threads = session.exec(board_threads_query(board_id, before, before_id, limit)).all()
+    return [thread_out(t) for t in threads]
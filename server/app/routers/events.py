@@ -1,23 +1,245 @@
 import asyncio
-from fastapi import APIRouter, WebSocket
+import json
+import re
+import time
+from typing import AsyncIterator
+from fastapi import APIRouter, Header, HTTPException, Query, WebSocket
 from fastapi.responses import StreamingResponse
-from ..core.events import broker
+from sqlmodel import select
+from ..core.config import settings
+from ..core.events import KEEPALIVE, OVERFLOW_POLICIES, Frame, SlowConsumer, Subscription, TooManySubscribers, broker, msgpack
+from ..core.security import decode_token
+from ..db import async_session_maker
+from ..models import User
 
 router = APIRouter(prefix="/api", tags=["events"])
 
+MAX_TOPICS = 50
+TOPIC_RE = re.compile(r"^(global|(thread|board):\d+|user:(\d+|me))$")
+TOPICS_HELP = "Comma-separated: global, thread:{id}, board:{id}, user:me. Omit for all public events."
+OVERFLOW_HELP = "When this client falls behind: drop_oldest, coalesce or disconnect (then reconnect with Last-Event-ID)"
+# WebSocket subprotocols for the v2 control protocol (see WsSession)
+WS_JSON = "coevo.v2.json"
+WS_MSGPACK = "coevo.v2.msgpack"
+RETRY_AFTER_SECONDS = "5"
+SLOW_CONSUMER_CLOSE = f"event: close\ndata: {json.dumps({'type': 'disconnected', 'reason': 'slow_consumer'})}\n\n".encode()
+
+
+async def _resolve_topics(topics: str | None, token: str | None) -> list[str] | None:
+    # user:{id} topics carry private notifications, so they need the owner's token
+    # (EventSource cannot send headers, hence the query parameter).
+    if not topics:
+        return None
+    wanted = [t.strip() for t in topics.split(",") if t.strip()]
+    if len(wanted) > MAX_TOPICS:
+        raise HTTPException(400, f"At most {MAX_TOPICS} topics")
+    bad = [t for t in wanted if not TOPIC_RE.match(t)]
+    if bad:
+        raise HTTPException(400, f"Unknown topic: {bad[0]}")
+    if any(t.startswith("user:") for t in wanted):
+        payload = decode_token(token) if token else None
+        if not payload or "sub" not in payload:
+            raise HTTPException(401, "User topics need a valid token")
+        async with async_session_maker() as session:
+            user_id = (await session.exec(select(User.id).where(User.handle == payload["sub"]))).first()
+        if user_id is None:
+            raise HTTPException(401, "User not found")
+        mine = f"user:{user_id}"
+        if any(t.startswith("user:") and t not in ("user:me", mine) for t in wanted):
+            raise HTTPException(403, "Cannot subscribe to another user's topic")
+        wanted = [mine if t == "user:me" else t for t in wanted]
+    return wanted
+
+
+def _overflow_policy(value: str | None) -> str | None:
+    if value and value not in OVERFLOW_POLICIES:
+        raise HTTPException(400, f"on_overflow must be one of: {', '.join(OVERFLOW_POLICIES)}")
+    return value or None
+
+
+def _last_event_id(value: str | None) -> int | None:
+    try:
+        return int(value) if value else None
+    except ValueError:
+        return None
+
+
 @router.get("/events")
-async def sse_events():
-    async def gen():
-        async for msg in broker.subscribe():
-            yield f"event: message\ndata: {msg}\n\n"
+async def sse_events(
+    topics: str | None = Query(None, description=TOPICS_HELP),
+    token: str | None = None,
+    last_event_id: str | None = Query(None, description="Resume point when the Last-Event-ID header cannot be set"),
+    last_event_id_header: str | None = Header(None, alias="Last-Event-ID"),
+    on_overflow: str | None = Query(None, description=OVERFLOW_HELP),
+):
+    subscribed = await _resolve_topics(topics, token)
+    resume = _last_event_id(last_event_id_header or last_event_id)
+    policy = _overflow_policy(on_overflow)
+    try:
+        sub, backlog = broker.open(subscribed, resume, policy, heartbeat=True)
+    except TooManySubscribers:
+        raise HTTPException(503, "Too many event connections", headers={"Retry-After": RETRY_AFTER_SECONDS})
+    return StreamingResponse(sse_body(sub, backlog), media_type="text/event-stream")
+
+
+async def sse_body(sub: Subscription, backlog: list[Frame]) -> AsyncIterator[bytes]:
+    # Frames come pre-serialized from the broker; whatever queued up while the client
+    # was busy goes out as a single write.
+    try:
+        yield b"".join(f.sse for f in (KEEPALIVE, *backlog))
+        while True:
+            batch = await sub.get_batch()
+            yield batch[0].sse if len(batch) == 1 else b"".join(f.sse for f in batch)
             await asyncio.sleep(0)
-    return StreamingResponse(gen(), media_type="text/event-stream")
+    except SlowConsumer:
+        yield SLOW_CONSUMER_CLOSE
+    finally:
+        broker.close(sub)
+
+
+def _ws_protocol(ws: WebSocket) -> str | None:
+    # first v2 subprotocol the client offered that this server can speak; None = v1 (push only)
+    for proto in ws.scope.get("subprotocols", []):
+        if proto == WS_JSON or (proto == WS_MSGPACK and msgpack is not None):
+            return proto
+    return None
+
 
 @router.websocket("/ws")
 async def ws_events(ws: WebSocket):
-    await ws.accept()
     try:
-        async for msg in broker.subscribe():
-            await ws.send_text(msg)
+        subscribed = await _resolve_topics(ws.query_params.get("topics"), ws.query_params.get("token"))
+        policy = _overflow_policy(ws.query_params.get("on_overflow"))
+    except HTTPException as e:
+        await ws.close(code=1008, reason=str(e.detail))
+        return
+    try:
+        sub, backlog = broker.open(subscribed, _last_event_id(ws.query_params.get("last_event_id")), policy)
+    except TooManySubscribers:
+        await ws.close(code=1013, reason="too many connections")
+        return
+    try:
+        proto = _ws_protocol(ws)
+        await ws.accept(subprotocol=proto)
+        if proto is not None:
+            await WsSession(ws, sub, binary=proto == WS_MSGPACK, token=ws.query_params.get("token")).run(backlog)
+            return
+        for frame in (KEEPALIVE, *backlog):
+            await ws.send_text(frame.text)
+        while True:
+            for frame in await sub.get_batch():
+                await ws.send_text(frame.text)
+    except SlowConsumer:
+        await ws.close(code=1013, reason="slow consumer")
     except Exception:
         await ws.close()
+    finally:
+        broker.close(sub)
+
+
+class WsSession:
+    """A v2 socket: events pushed as before, plus client commands on the same connection.
+
+        {"op": "subscribe", "topics": ["thread:12"]}    -> {"type": "subscribed", "topics": [...]}
+        {"op": "unsubscribe", "topics": ["thread:12"]}  -> {"type": "subscribed", "topics": [...]}
+        {"op": "ping", "ts": 123}                      -> {"type": "pong", "ts": 123}
+        {"type": "ping"} from the server               <- {"op": "pong"}
+
+    Frames are JSON text, or msgpack binary with the coevo.v2.msgpack subprotocol.
+    A client that sends nothing for two ping intervals is disconnected.
+    """
+
+    def __init__(self, ws: WebSocket, sub: Subscription, binary: bool, token: str | None) -> None:
+        self.ws = ws
+        self.sub = sub
+        self.binary = binary
+        self.token = token
+        self._send_lock = asyncio.Lock()
+        self._last_seen = time.monotonic()
+
+    async def run(self, backlog: list[Frame]) -> None:
+        tasks = [asyncio.create_task(c) for c in (self._push([KEEPALIVE, *backlog]), self._read(), self._heartbeat())]
+        try:
+            done, _ = await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+            errors = [t.exception() for t in done if not t.cancelled()]
+            if any(isinstance(e, SlowConsumer) for e in errors):
+                await self.ws.close(code=1013, reason="slow consumer")
+        except Exception:
+            pass
+        finally:
+            # no awaiting here: this also runs when the connection task itself is cancelled
+            for t in tasks:
+                t.cancel()
+
+    async def _send_frames(self, frames: list[Frame]) -> None:
+        async with self._send_lock:
+            for f in frames:
+                if self.binary:
+                    await self.ws.send_bytes(f.packed)
+                else:
+                    await self.ws.send_text(f.text)
+
+    async def _send(self, obj: dict) -> None:
+        async with self._send_lock:
+            if self.binary:
+                await self.ws.send_bytes(msgpack.packb(obj))
+            else:
+                await self.ws.send_text(json.dumps(obj))
+
+    async def _push(self, first: list[Frame]) -> None:
+        await self._send_frames(first)
+        while True:
+            await self._send_frames(await self.sub.get_batch())
+
+    async def _heartbeat(self) -> None:
+        interval = settings.EVENT_WS_PING_SECONDS
+        while True:
+            await asyncio.sleep(interval)
+            if time.monotonic() - self._last_seen > 2 * interval:
+                await self.ws.close(code=1001, reason="heartbeat timeout")
+                return
+            await self._send({"type": "ping"})
+
+    async def _read(self) -> None:
+        while True:
+            message = await self.ws.receive()
+            if message["type"] == "websocket.disconnect":
+                return
+            self._last_seen = time.monotonic()
+            try:
+                if message.get("bytes") is not None:
+                    if msgpack is None:
+                        raise ValueError("binary frames need msgpack")
+                    cmd = msgpack.unpackb(message["bytes"])
+                else:
+                    cmd = json.loads(message.get("text") or "")
+                if not isinstance(cmd, dict):
+                    raise ValueError("expected an object")
+            except ValueError as e:
+                await self._send({"type": "error", "error": f"bad command: {e}"})
+                continue
+            reply = await self._command(cmd)
+            if reply is not None:
+                await self._send(reply)
+
+    async def _command(self, cmd: dict) -> dict | None:
+        op = cmd.get("op")
+        if op == "ping":
+            return {"type": "pong", "ts": cmd.get("ts")}
+        if op == "pong":
+            return None
+        if op not in ("subscribe", "unsubscribe"):
+            return {"type": "error", "op": op, "error": "unknown op"}
+        topics = cmd.get("topics")
+        if not isinstance(topics, list) or not all(isinstance(t, str) and "," not in t for t in topics):
+            return {"type": "error", "op": op, "error": "topics must be a list of strings"}
+        try:
+            resolved = set(await _resolve_topics(",".join(topics), cmd.get("token") or self.token) or ())
+        except HTTPException as e:
+            return {"type": "error", "op": op, "error": e.detail}
+        current = set(self.sub.topics)
+        wanted = current | resolved if op == "subscribe" else current - resolved
+        if len(wanted) > MAX_TOPICS:
+            return {"type": "error", "op": op, "error": f"At most {MAX_TOPICS} topics"}
+        broker.set_topics(self.sub, wanted)
+        return {"type": "subscribed", "topics": sorted(wanted)}
@@ -0,0 +1,32 @@
+from datetime import datetime
+from fastapi import APIRouter, Depends, HTTPException, Query
+from sqlmodel import Session
+from ..db import get_session, engine
+from ..deps import get_current_user
+from ..services.search import search, index_exists, SEARCH_PAGE_DEFAULT, SEARCH_PAGE_MAX
+
+router = APIRouter(prefix="/api", tags=["search"])
+
+
+@router.get("/search")
+def search_all(
+    q: str = Query(..., min_length=1, max_length=200),
+    board_id: int | None = None,
+    author: str | None = None,
+    since: datetime | None = None,
+    until: datetime | None = None,
+    kind: list[str] | None = Query(None, description="post, thread, bounty or repo; repeatable"),
+    limit: int = Query(SEARCH_PAGE_DEFAULT, ge=1, le=SEARCH_PAGE_MAX),
+    cursor: str | None = None,
+    session: Session = Depends(get_session),
+    user=Depends(get_current_user),
+):
+    if engine.dialect.name != "sqlite":
+        raise HTTPException(501, "Search requires the SQLite backend (FTS5)")
+    if not index_exists(session.connection()):
+        raise HTTPException(503, "Search index missing: run `python -m app.migrations` on a SQLite build with FTS5")
+    try:
+        hits, next_cursor = search(session, q, board_id, author, since, until, kind, limit, cursor)
+    except ValueError as e:
+        raise HTTPException(400, str(e))
+    return {"results": hits, "next_cursor": next_cursor}
@@ -2,10 +2,11 @@ from datetime import datetime, timedelta
 from fastapi import APIRouter, Depends
 from sqlmodel import Session, select
 from ..db import get_session
-from ..deps import get_current_user
+from ..deps import get_current_user, require_role
 from ..models import Post, Thread, Board
 from ..core.node_signing import load_or_create_node_key, public_key_pem
 from ..core.config import settings
+from ..core.events import broker
 
 router = APIRouter(prefix="/api/system", tags=["system"])
 
@@ -14,6 +15,10 @@ def public_key():
     _, pub = load_or_create_node_key(settings.NODE_KEY_PATH)
     return {"public_key_pem": public_key_pem(pub)}
 
+@router.get("/events")
+def event_stats(_admin=Depends(require_role("admin","mod"))):
+    return {"subscribers": broker.subscriber_count(), **broker.stats}
+
 @router.get("/pulse")
 def community_pulse(session: Session = Depends(get_session), user=Depends(get_current_user)):
     since_24h = datetime.utcnow() - timedelta(hours=24)
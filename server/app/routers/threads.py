@@ -1,17 +1,24 @@
 from datetime import datetime
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Query
+from sqlalchemy import func, insert, update
+from sqlalchemy.exc import IntegrityError
 from sqlmodel import Session, select
-from ..db import get_session
-from ..models import Thread, Post, User, Board, Agent, ThreadWatch, Notification, InviteRedemption, InviteCode, Wallet, ThreadSummary
+from sqlmodel.ext.asyncio.session import AsyncSession
+from ..db import get_session, get_async_session
+from ..models import Thread, Post, User, Board, Agent, ThreadWatch, Notification, InviteRedemption, InviteCode, Wallet, ThreadSummary, LedgerTx
 from ..schemas import ThreadOut, CreateThreadIn, CreatePostIn, PostOut
 from ..deps import get_current_user
 from ..core.events import broker
 from ..core.node_signing import sign
+from ..core.http_clients import http_clients
 from ..services.events_log import log_event
 from ..services.ledger import transfer
-from ..services.emailer import send_email
+from ..services.emailer import queue_emails_bulk
+from ..services.jobs import enqueue, job_handler, job_workers
+from ..services.authors import resolve_author_handles
+from ..services.thread_activity import record_post, board_threads_query, thread_out
+from ..services.summaries import summary_scheduler, SUMMARY_MIN_POSTS, SUMMARY_EVERY, SUMMARY_HEADER
 import os
-import httpx
 
 _NODE_PRIV = None
 def set_node_priv(priv):
@@ -22,20 +29,18 @@ router = APIRouter(prefix="/api", tags=["threads"])
 
 INVITE_POST_REWARD = 25
 POST_REWARD_BASE = 2
+POSTS_PAGE_DEFAULT = 100
+POSTS_PAGE_MAX = 500
+THREADS_PAGE_DEFAULT = 100
+THREADS_PAGE_MAX = 500
+SUMMARY_FOLD_MAX = 30
+# LLM calls per summary run (each up to 45s, well inside JOB_LEASE_SECONDS); a first
+# summary or a longer backlog folds only the newest SUMMARY_FOLD_MAX posts
+SUMMARY_MAX_FOLDS = 3
 
 
-def _author_handle(session: Session, post: Post) -> str:
-    if post.author_type == "user" and post.author_user_id:
-        u = session.get(User, post.author_user_id)
-        return u.handle if u else "unknown"
-    if post.author_type == "agent" and post.author_agent_id:
-        a = session.get(Agent, post.author_agent_id)
-        return a.handle if a else "agent"
-    return "unknown"
-
-
-def _maybe_reward_inviter_for_first_post(session: Session, user: User):
-    redemption = session.exec(select(InviteRedemption).where(InviteRedemption.invitee_user_id==user.id)).first()
+def _maybe_reward_inviter_for_first_post(session: Session, user_id: int):
+    redemption = session.exec(select(InviteRedemption).where(InviteRedemption.invitee_user_id==user_id)).first()
     if not redemption or redemption.rewarded_on_first_post:
         return
     invite = session.get(InviteCode, redemption.invite_code_id)
@@ -50,81 +55,179 @@ def _maybe_reward_inviter_for_first_post(session: Session, user: User):
         mul = 2.0
     elif inviter and inviter.reputation >= 120:
         mul = 1.5
-    transfer(session, None, inviter_wallet.id, int(INVITE_POST_REWARD * mul), "mint", ref_type="invite", ref_id=redemption.id)
+    # flag rides in the transfer's commit so a retried job cannot pay twice
     redemption.rewarded_on_first_post = True
     session.add(redemption)
-    session.commit()
+    transfer(session, None, inviter_wallet.id, int(INVITE_POST_REWARD * mul), "mint", ref_type="invite", ref_id=redemption.id)
 
 
-async def _auto_thread_summary(session: Session, thread_id: int):
-    posts = session.exec(select(Post).where(Post.thread_id==thread_id, Post.is_hidden==False).order_by(Post.id)).all()
-    if len(posts) < 20:
+def _reward_post_author(session: Session, post_id: int, user_id: int):
+    already = session.exec(select(LedgerTx.id).where(LedgerTx.ref_type=="post", LedgerTx.ref_id==post_id, LedgerTx.reason=="reward")).first()
+    if already is not None:
         return
-    existing = session.exec(select(ThreadSummary).where(ThreadSummary.thread_id==thread_id)).first()
-    if existing and len(posts) - existing.source_post_count < 10:
+    u = session.get(User, user_id)
+    if not u:
+        return
+    u.reputation += 1
+    session.add(u)
+    wallet = session.exec(select(Wallet).where(Wallet.owner_type=="user", Wallet.owner_user_id==user_id)).first()
+    if wallet:
+        mul = 1.0
+        if u.reputation >= 300:
+            mul = 2.0
+        elif u.reputation >= 100:
+            mul = 1.5
+        transfer(session, None, wallet.id, int(POST_REWARD_BASE * mul), "reward", ref_type="post", ref_id=post_id)
+
+
+def _enqueue_post_side_effects(session: Session, post_id: int, thread_id: int, user_id: int):
+    enqueue(session, "post_reward", {"post_id": post_id, "user_id": user_id}, idempotency_key=f"post_reward:{post_id}")
+    enqueue(session, "invite_reward", {"user_id": user_id}, idempotency_key=f"invite_reward:{post_id}")
+    enqueue(session, "notify_watchers", {"thread_id": thread_id, "post_id": post_id, "author_user_id": user_id}, idempotency_key=f"notify_watchers:{post_id}")
+
+
+@job_handler("post_reward")
+async def _post_reward_job(session: AsyncSession, payload: dict):
+    await session.run_sync(_reward_post_author, payload["post_id"], payload["user_id"])
+
+
+@job_handler("invite_reward")
+async def _invite_reward_job(session: AsyncSession, payload: dict):
+    await session.run_sync(_maybe_reward_inviter_for_first_post, payload["user_id"])
+
+
+@job_handler("notify_watchers")
+async def _notify_watchers_job(session: AsyncSession, payload: dict):
+    return await _notify_watchers(session, payload["thread_id"], payload.get("author_user_id"), payload["post_id"])
+
+
+@job_handler("thread_summary")
+async def _thread_summary_job(session: AsyncSession, payload: dict):
+    await _auto_thread_summary(session, payload["thread_id"])
+
+
+async def _fold_into_summary(model: str, previous: str, posts: list[Post], handles: dict[int, str]) -> str:
+    """One rolling-summary step: `previous` rewritten to also cover `posts` ("" on failure)."""
+    key = os.getenv("ANTHROPIC_API_KEY", "").strip()
+    if not key:
+        return ""
+    context = "\n\n".join([f"{handles[p.id]}: {p.content_md[:200]}" for p in posts])
+    if previous:
+        prompt = f"Current summary:\n{previous}\n\nNew posts since that summary:\n{context}\n\nRewrite the summary so it also covers the new posts."
+    else:
+        prompt = f"Summarize this thread:\n{context}"
+    try:
+        payload = {
+            "model": model,
+            "max_tokens": 220,
+            "temperature": 0.3,
+            "system": "You are @sage. Summarize long threads into concise TL;DR bullets.",
+            "messages": [{"role": "user", "content": prompt}],
+        }
+        headers = {"x-api-key": key, "anthropic-version": "2023-06-01", "content-type": "application/json"}
+        r = await http_clients.get("anthropic").post("https://api.anthropic.com/v1/messages", headers=headers, json=payload, timeout=45)
+        r.raise_for_status()
+        d = r.json()
+        return "\n".join([c.get("text", "") for c in d.get("content", []) if c.get("type") == "text"]).strip()
+    except Exception:
+        return ""
+
+
+async def _auto_thread_summary(session: AsyncSession, thread_id: int):
+    # Rolling summary: only posts after the last one folded in are read, and they are
+    # merged into the previous TL;DR instead of re-summarizing the whole thread.
+    existing = (await session.exec(select(ThreadSummary).where(ThreadSummary.thread_id==thread_id))).first()
+    since_id = existing.source_last_post_id if existing else 0
+    # TL;DR posts count toward the thread but are never folded into the next summary
+    fresh = (Post.thread_id==thread_id, Post.is_hidden==False, Post.id > since_id, ~Post.content_md.startswith(SUMMARY_HEADER))
+    new_count, upto = (await session.exec(select(func.count(), func.max(Post.id)).where(*fresh))).one()
+    upto = upto or since_id
+    total = (existing.source_post_count if existing else 0) + new_count
+    if total < SUMMARY_MIN_POSTS or (existing and new_count < SUMMARY_EVERY):
         return
 
-    sage = session.exec(select(Agent).where(Agent.handle=="sage", Agent.is_enabled==True)).first()
+    sage = (await session.exec(select(Agent).where(Agent.handle=="sage", Agent.is_enabled==True))).first()
     if not sage:
         return
 
-    context = "\n\n".join([f"{_author_handle(session, p)}: {p.content_md[:200]}" for p in posts[-30:]])
+    previous = ""
+    if existing:
+        prev_post = await session.get(Post, existing.summary_post_id)
+        if prev_post:
+            previous = prev_post.content_md.removeprefix(SUMMARY_HEADER)
     model = sage.model.split(":", 1)[-1] if ":" in sage.model else sage.model
-    summary = ""
-    key = os.getenv("ANTHROPIC_API_KEY", "").strip()
-    if key:
-        try:
-            payload = {
-                "model": model,
-                "max_tokens": 220,
-                "temperature": 0.3,
-                "system": "You are @sage. Summarize long threads into concise TL;DR bullets.",
-                "messages": [{"role": "user", "content": f"Summarize this thread:\n{context}"}],
-            }
-            headers = {"x-api-key": key, "anthropic-version": "2023-06-01", "content-type": "application/json"}
-            async with httpx.AsyncClient(timeout=45) as client:
-                r = await client.post("https://api.anthropic.com/v1/messages", headers=headers, json=payload)
-                r.raise_for_status()
-                d = r.json()
-            summary = "\n".join([c.get("text", "") for c in d.get("content", []) if c.get("type") == "text"]).strip()
-        except Exception:
-            summary = ""
+    # posts that arrive meanwhile (ids past `upto`) are left for the next run
+    if not previous or new_count > SUMMARY_FOLD_MAX * SUMMARY_MAX_FOLDS:
+        posts = (await session.exec(
+            select(Post).where(*fresh, Post.id <= upto).order_by(Post.id.desc()).limit(SUMMARY_FOLD_MAX)
+        )).all()[::-1]
+    else:
+        posts = (await session.exec(
+            select(Post).where(*fresh, Post.id <= upto).order_by(Post.id).limit(SUMMARY_FOLD_MAX * SUMMARY_MAX_FOLDS)
+        )).all()
+    handles = await session.run_sync(resolve_author_handles, posts)
+    # end the read transaction: no connection is held across the LLM calls
+    await session.commit()
+
+    summary = previous
+    for i in range(0, len(posts), SUMMARY_FOLD_MAX):
+        summary = await _fold_into_summary(model, summary, posts[i:i + SUMMARY_FOLD_MAX], handles) or summary
 
     if not summary:
         summary = "- Ongoing discussion with multiple contributors.\n- Review recent posts for details and decisions."
 
-    p = Post(thread_id=thread_id, author_type="agent", author_agent_id=sage.id, content_md=f"**TL;DR (auto)**\n\n{summary}")
+    p = Post(thread_id=thread_id, author_type="agent", author_agent_id=sage.id, content_md=f"{SUMMARY_HEADER}{summary}")
     session.add(p)
-    session.commit()
-    session.refresh(p)
+    await session.flush()
+    await session.run_sync(record_post, p, sage.handle)
 
-    if existing:
-        existing.summary_post_id = p.id
-        existing.source_post_count = len(posts)
-        existing.updated_at = datetime.utcnow()
-        session.add(existing)
-    else:
-        session.add(ThreadSummary(thread_id=thread_id, summary_post_id=p.id, source_post_count=len(posts)))
-    session.commit()
+    total += 1
+    # Claim the cursor: if another summary job for this thread committed since we read it,
+    # the UPDATE matches nothing (or the insert hits the unique thread_id) and this run is dropped.
+    claimed = {"summary_post_id": p.id, "source_post_count": total, "source_last_post_id": upto, "updated_at": datetime.utcnow()}
+    try:
+        if existing:
+            res = await session.execute(
+                update(ThreadSummary)
+                .where(ThreadSummary.id == existing.id, ThreadSummary.source_last_post_id == since_id)
+                .values(**claimed)
+            )
+            if not res.rowcount:
+                await session.rollback()
+                return
+        else:
+            session.add(ThreadSummary(thread_id=thread_id, **claimed))
+        await session.commit()
+    except IntegrityError:
+        await session.rollback()
+        return
+    summary_scheduler.note_summarized(thread_id, total)
 
 
 @router.get("/boards/{board_id}/threads", response_model=list[ThreadOut])
-def list_threads(board_id: int, session: Session = Depends(get_session), user=Depends(get_current_user)):
-    threads = session.exec(select(Thread).where(Thread.board_id==board_id).order_by(Thread.updated_at.desc())).all()
-    return [ThreadOut(id=t.id, board_id=t.board_id, title=t.title) for t in threads]
+def list_threads(
+    board_id: int,
+    before: datetime | None = None,
+    before_id: int | None = None,
+    limit: int = Query(THREADS_PAGE_DEFAULT, ge=1, le=THREADS_PAGE_MAX),
+    session: Session = Depends(get_session),
+    user=Depends(get_current_user),
+):
+    threads = session.exec(board_threads_query(board_id, before, before_id, limit)).all()
+    return [ThreadOut(**thread_out(t)) for t in threads]
 
 @router.post("/boards/{board_id}/threads", response_model=ThreadOut)
-async def create_thread(board_id: int, payload: CreateThreadIn, session: Session = Depends(get_session), user: User = Depends(get_current_user)):
-    board = session.get(Board, board_id)
+async def create_thread(board_id: int, payload: CreateThreadIn, session: AsyncSession = Depends(get_async_session), user: User = Depends(get_current_user)):
+    board = await session.get(Board, board_id)
     if not board:
         raise HTTPException(404, "Board not found")
     t = Thread(board_id=board_id, title=payload.title, created_by_user_id=user.id, updated_at=datetime.utcnow())
     session.add(t)
-    session.commit()
-    session.refresh(t)
-    log_event(session, "thread_created", {"thread_id": t.id, "board_id": board_id, "title": t.title, "by": user.handle})
+    await session.commit()
+    await session.refresh(t)
+    await session.run_sync(log_event, "thread_created", {"thread_id": t.id, "board_id": board_id, "title": t.title, "by": user.handle})
     await broker.publish({"type":"thread_created","board_id":board_id,"thread_id":t.id,"title":t.title})
-    return ThreadOut(id=t.id, board_id=t.board_id, title=t.title)
+    return ThreadOut(**thread_out(t))
 
 @router.get("/threads/{thread_id}")
 def get_thread(thread_id: int, session: Session = Depends(get_session), user=Depends(get_current_user)):
@@ -133,83 +236,100 @@ def get_thread(thread_id: int, session: Session = Depends(get_session), user=Dep
         raise HTTPException(404, "Thread not found")
     return {"id": t.id, "board_id": t.board_id, "title": t.title}
 
+def _post_out(p: Post, author_handle: str, is_pinned: bool = False) -> PostOut:
+    return PostOut(
+        id=p.id, thread_id=p.thread_id, author_type=p.author_type,
+        author_handle=author_handle, content_md=p.content_md,
+        created_at=p.created_at.isoformat() + "Z",
+        is_hidden=p.is_hidden,
+        signature=p.signature,
+        is_pinned=is_pinned,
+    )
+
 @router.get("/threads/{thread_id}/posts", response_model=list[PostOut])
-def list_posts(thread_id: int, session: Session = Depends(get_session), user: User = Depends(get_current_user)):
-    q = select(Post).where(Post.thread_id==thread_id).order_by(Post.id)
-    posts = session.exec(q).all()
-    out = []
+def list_posts(
+    thread_id: int,
+    after_id: int | None = None,
+    before_id: int | None = None,
+    limit: int = Query(POSTS_PAGE_DEFAULT, ge=1, le=POSTS_PAGE_MAX),
+    order: str = Query("asc", pattern="^(asc|desc)$"),
+    session: Session = Depends(get_session),
+    user: User = Depends(get_current_user),
+):
+    # Keyset pagination over (thread_id, id): after_id walks forward (catch-up),
+    # before_id walks backward (older history); the page is returned in `order`.
+    can_see_hidden = user.role in ("admin","mod")
     summary = session.exec(select(ThreadSummary).where(ThreadSummary.thread_id==thread_id)).first()
+    q = select(Post).where(Post.thread_id==thread_id)
     if summary:
+        q = q.where(Post.id != summary.summary_post_id)
+    if not can_see_hidden:
+        q = q.where(Post.is_hidden == False)
+    if after_id is not None:
+        q = q.where(Post.id > after_id)
+    if before_id is not None:
+        q = q.where(Post.id < before_id)
+    forward = after_id is not None or (before_id is None and order == "asc")
+    q = q.order_by(Post.id if forward else Post.id.desc()).limit(limit)
+    posts = list(session.exec(q).all())
+    if forward != (order == "asc"):
+        posts.reverse()
+
+    pinned = None
+    if summary and after_id is None and before_id is None:
         sp = session.get(Post, summary.summary_post_id)
-        if sp and (not sp.is_hidden or user.role in ("admin","mod")):
-            out.append(PostOut(id=sp.id, thread_id=sp.thread_id, author_type=sp.author_type, author_handle=_author_handle(session, sp), content_md=sp.content_md, created_at=sp.created_at.isoformat()+"Z", is_hidden=sp.is_hidden, signature=sp.signature))
-    for p in posts:
-        if summary and p.id == summary.summary_post_id:
-            continue
-        if p.is_hidden and user.role not in ("admin","mod"):
-            continue
-        out.append(PostOut(
-            id=p.id, thread_id=p.thread_id, author_type=p.author_type,
-            author_handle=_author_handle(session, p), content_md=p.content_md,
-            created_at=p.created_at.isoformat() + "Z",
-            is_hidden=p.is_hidden,
-            signature=p.signature
-        ))
+        if sp and (not sp.is_hidden or can_see_hidden):
+            pinned = sp
+    handles = resolve_author_handles(session, posts + ([pinned] if pinned else []))
+    out = [_post_out(pinned, handles[pinned.id], is_pinned=True)] if pinned else []
+    out.extend(_post_out(p, handles[p.id]) for p in posts)
     return out
 
-async def _notify_watchers(session: Session, thread_id: int, author_user_id: int | None, post_id: int):
-    watchers = session.exec(select(ThreadWatch).where(ThreadWatch.thread_id==thread_id)).all()
-    for w in watchers:
-        if author_user_id and w.user_id == author_user_id:
-            continue
-        n = Notification(
-            user_id=w.user_id,
-            thread_id=thread_id,
-            event_type="thread_post",
-            payload={"thread_id": thread_id, "post_id": post_id}
-        )
-        session.add(n)
-        session.commit()
-        session.refresh(n)
-        await broker.publish({"type":"notify", "user_id": w.user_id, "notification": {
-            "id": n.id,
-            "thread_id": n.thread_id,
-            "event_type": n.event_type,
-            "payload": n.payload,
-            "created_at": n.created_at.isoformat()+"Z",
-            "read_at": None
-        }})
-        watch_user = session.get(User, w.user_id)
-        if watch_user and watch_user.email:
-            try:
-                send_email(watch_user.email, f"CoEvo: New reply in thread #{thread_id}", f"A new reply was posted in thread #{thread_id}.\n\nOpen CoEvo to view it.")
-            except Exception:
-                pass
+async def _notify_watchers(session: AsyncSession, thread_id: int, author_user_id: int | None, post_id: int) -> list[dict]:
+    # Fan-out in one pass: one watcher+email query, one multi-row INSERT, user-topic
+    # broker events, and emails handed to the outbox.
+    q = (
+        select(ThreadWatch.user_id, User.email)
+        .join(User, User.id == ThreadWatch.user_id, isouter=True)
+        .where(ThreadWatch.thread_id == thread_id)
+    )
+    if author_user_id:
+        q = q.where(ThreadWatch.user_id != author_user_id)
+    recipients = (await session.exec(q)).all()
+    if not recipients:
+        return []
+
+    now = datetime.utcnow()
+    note_payload = {"thread_id": thread_id, "post_id": post_id}
+    inserted = (await session.execute(
+        insert(Notification).returning(Notification.id, Notification.user_id),
+        [{"user_id": uid, "thread_id": thread_id, "event_type": "thread_post", "payload": note_payload, "created_at": now} for uid, _ in recipients],
+    )).all()
+
+    subject = f"CoEvo: New reply in thread #{thread_id}"
+    body = f"A new reply was posted in thread #{thread_id}.\n\nOpen CoEvo to view it."
+    await queue_emails_bulk(session, [(email, subject, body) for _, email in recipients if email])
+
+    created_at = now.isoformat() + "Z"
+    # one event per recipient on its user:{id} topic; the broker only wakes that user's connections
+    return [{"type": "notify", "user_id": uid, "notification": {
+        "id": nid,
+        "thread_id": thread_id,
+        "event_type": "thread_post",
+        "payload": note_payload,
+        "created_at": created_at,
+        "read_at": None,
+    }} for nid, uid in inserted]
 
 @router.post("/threads/{thread_id}/posts", response_model=PostOut)
-async def create_post(thread_id: int, payload: CreatePostIn, session: Session = Depends(get_session), user: User = Depends(get_current_user)):
-    t = session.get(Thread, thread_id)
+async def create_post(thread_id: int, payload: CreatePostIn, session: AsyncSession = Depends(get_async_session), user: User = Depends(get_current_user)):
+    t = await session.get(Thread, thread_id)
     if not t:
         raise HTTPException(404, "Thread not found")
     p = Post(thread_id=thread_id, author_type="user", author_user_id=user.id, content_md=payload.content_md)
-    t.updated_at = datetime.utcnow()
     session.add(p)
-    session.add(t)
-    session.commit()
-    session.refresh(p)
-
-    # reputation & post reward multiplier
-    u = session.get(User, user.id)
-    u.reputation += 1
-    session.add(u)
-    wallet = session.exec(select(Wallet).where(Wallet.owner_type=="user", Wallet.owner_user_id==user.id)).first()
-    if wallet:
-        mul = 1.0
-        if u.reputation >= 300:
-            mul = 2.0
-        elif u.reputation >= 100:
-            mul = 1.5
-        transfer(session, None, wallet.id, int(POST_REWARD_BASE * mul), "reward", ref_type="post", ref_id=p.id)
+    await session.flush()
+    await session.run_sync(record_post, p, user.handle)
 
     if _NODE_PRIV is not None:
         sig_payload = {
@@ -222,11 +342,16 @@ async def create_post(thread_id: int, payload: CreatePostIn, session: Session =
         }
         p.signature = sign(_NODE_PRIV, sig_payload)
         session.add(p)
-        session.commit()
-        session.refresh(p)
 
-    _maybe_reward_inviter_for_first_post(session, user)
-    log_event(session, "post_created", {"post_id": p.id, "thread_id": thread_id, "by": user.handle})
+    # One commit for the post, its event log row and its side-effect jobs (rewards,
+    # watcher notifications); the job workers do the rest off-request.
+    await session.run_sync(log_event, "post_created", {"post_id": p.id, "thread_id": thread_id, "by": user.handle}, commit=False)
+    await session.run_sync(_enqueue_post_side_effects, p.id, thread_id, user.id)
+    summary_due = await session.run_sync(summary_scheduler.note_post, thread_id)
+    await session.commit()
+    job_workers.wake()
+    if summary_due:
+        await summary_scheduler.schedule(thread_id)
 
     event = {
         "type":"post_created",
@@ -243,6 +368,4 @@ async def create_post(thread_id: int, payload: CreatePostIn, session: Session =
         }
     }
     await broker.publish(event)
-    await _notify_watchers(session, thread_id, user.id, p.id)
-    await _auto_thread_summary(session, thread_id)
     return PostOut(**event["post"])
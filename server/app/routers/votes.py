@@ -1,6 +1,7 @@
 from fastapi import APIRouter, Depends, HTTPException
 from sqlmodel import Session, select
-from ..db import get_session
+from sqlmodel.ext.asyncio.session import AsyncSession
+from ..db import get_session, get_async_session
 from ..deps import get_current_user
 from ..models import VoteProposal, VoteBallot
 from ..schemas import CreateVoteIn, CastVoteIn
@@ -23,11 +24,11 @@ def list_votes(session: Session = Depends(get_session), user=Depends(get_current
     return out
 
 @router.post('')
-async def propose(payload: CreateVoteIn, session: Session = Depends(get_session), user=Depends(get_current_user)):
+async def propose(payload: CreateVoteIn, session: AsyncSession = Depends(get_async_session), user=Depends(get_current_user)):
     p = VoteProposal(title=payload.title, proposal_type=payload.proposal_type, details_md=payload.details_md, proposed_by_user_id=user.id)
     session.add(p)
-    session.commit()
-    session.refresh(p)
+    await session.commit()
+    await session.refresh(p)
     await broker.publish({"type":"vote_proposed", "proposal_id": p.id, "title": p.title, "details_md": p.details_md, "proposal_type": p.proposal_type})
     return {'id': p.id}
 
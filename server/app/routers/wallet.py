@@ -1,10 +1,10 @@
 from fastapi import APIRouter, Depends, HTTPException
 from sqlmodel import Session, select
 from ..db import get_session
-from ..models import Wallet, LedgerTx, User
+from ..models import Wallet, User
 from ..schemas import TipIn
 from ..deps import get_current_user
-from ..services.ledger import transfer
+from ..services.ledger import transfer, wallet_ledger_query
 from ..services.events_log import log_event
 
 router = APIRouter(prefix="/api/wallet", tags=["wallet"])
@@ -14,9 +14,7 @@ def get_wallet(session: Session = Depends(get_session), user=Depends(get_current
     w = session.exec(select(Wallet).where(Wallet.owner_type=="user", Wallet.owner_user_id==user.id)).first()
     if not w:
         raise HTTPException(404, "Wallet missing")
-    txs = session.exec(select(LedgerTx).where(
-        (LedgerTx.from_wallet_id==w.id) | (LedgerTx.to_wallet_id==w.id)
-    ).order_by(LedgerTx.id.desc()).limit(50)).all()
+    txs = session.scalars(wallet_ledger_query(w.id)).all()
 
     return {
         "wallet": {"id": w.id, "balance": w.balance},
@@ -1,24 +1,26 @@
 import os
 from fastapi import APIRouter, Depends, Header, HTTPException
-from sqlmodel import Session, select
-from ..db import get_session
+from sqlmodel import select
+from sqlmodel.ext.asyncio.session import AsyncSession
+from ..db import get_async_session
 from ..models import Thread, Post, Agent
 from ..core.events import broker
+from ..services.thread_activity import record_post
 
 router = APIRouter(prefix='/api/webhooks', tags=['webhooks'])
 
 
 @router.post('/nevora/thread/{thread_id}')
-async def nevora_to_thread(thread_id: int, payload: dict, x_coevo_webhook_secret: str | None = Header(default=None), session: Session = Depends(get_session)):
+async def nevora_to_thread(thread_id: int, payload: dict, x_coevo_webhook_secret: str | None = Header(default=None), session: AsyncSession = Depends(get_async_session)):
     secret = os.getenv('COEVO_WEBHOOK_SECRET', '').strip()
     if secret and x_coevo_webhook_secret != secret:
         raise HTTPException(401, 'Invalid webhook secret')
 
-    t = session.get(Thread, thread_id)
+    t = await session.get(Thread, thread_id)
     if not t:
         raise HTTPException(404, 'Thread not found')
 
-    forge = session.exec(select(Agent).where(Agent.handle=='forge')).first()
+    forge = (await session.exec(select(Agent).where(Agent.handle=='forge'))).first()
     content = payload.get('content_md') or payload.get('text') or payload.get('message') or ''
     source = payload.get('source', 'nevora')
     if not content.strip():
@@ -31,8 +33,9 @@ async def nevora_to_thread(thread_id: int, payload: dict, x_coevo_webhook_secret
         content_md=f"**Webhook event ({source})**\n\n{content.strip()}",
     )
     session.add(p)
-    session.commit()
-    session.refresh(p)
+    await session.flush()
+    await session.run_sync(record_post, p, forge.handle if forge else 'webhook')
+    await session.commit()
 
     await broker.publish({
         'type': 'post_created',
@@ -32,6 +32,11 @@ class ThreadOut(BaseModel):
     id: int
     board_id: int
     title: str
+    updated_at: Optional[str] = None
+    post_count: int = 0
+    last_post_id: Optional[int] = None
+    last_post_at: Optional[str] = None
+    last_author: Optional[str] = None
 
 class PostOut(BaseModel):
     id: int
@@ -42,6 +47,7 @@ class PostOut(BaseModel):
     created_at: str
     is_hidden: bool = False
     signature: Optional[str] = None
+    is_pinned: bool = False
 
 class CreateBoardIn(BaseModel):
     slug: str
@@ -0,0 +1,159 @@
+from __future__ import annotations
+import asyncio
+import json
+import logging
+import os
+from collections import deque
+from datetime import datetime
+from sqlmodel import Session, select
+from ..core.config import settings
+from ..db import async_session_maker
+from ..models import AgentMemoryNote, AgentTopic
+
+log = logging.getLogger("coevo.agents")
+
+MEMORY_NOTES = 5
+NOTE_CHARS = 200
+TOP_TOPICS = 10
+# the old JSON store; imported once into an empty database
+LEGACY_MEMORY_PATH = os.getenv("COEVO_AGENT_MEMORY_PATH", "./storage/agent_memory.json")
+
+
+class AgentMemory:
+    """Per (agent, user) interaction notes and community topic counts.
+
+    Everything is served from memory: a note is a bounded deque append and a topic is a
+    counter increment that also maintains the current top TOP_TOPICS, so persona building
+    never touches the database. Changed keys are written behind to the agentmemorynote
+    and agenttopic tables by flush(), every AGENT_MEMORY_FLUSH_SECONDS and on shutdown.
+    Only the process running the agent loops writes memory.
+    """
+
+    def __init__(self) -> None:
+        self._notes: dict[tuple[str, str], deque[str]] = {}
+        self._topics: dict[str, int] = {}
+        self._top: list[str] = []
+        self._dirty_notes: set[tuple[str, str]] = set()
+        self._dirty_topics: set[str] = set()
+        self.loaded = False
+
+    async def load(self) -> None:
+        async with async_session_maker() as session:
+            await session.run_sync(self._load)
+        self.loaded = True
+
+    def _load(self, session: Session) -> None:
+        notes = session.exec(select(AgentMemoryNote)).all()
+        topics = session.exec(select(AgentTopic)).all()
+        if not notes and not topics:
+            self._import_legacy()
+            return
+        for n in notes:
+            self._notes[(n.agent_handle, n.user_handle)] = deque(n.notes or [], maxlen=MEMORY_NOTES)
+        for t in topics:
+            self._topics[t.token] = t.count
+        self._top = sorted(self._topics, key=self._topics.__getitem__, reverse=True)[:TOP_TOPICS]
+
+    def _import_legacy(self) -> None:
+        try:
+            with open(LEGACY_MEMORY_PATH, "r", encoding="utf-8") as f:
+                mem = json.load(f)
+        except (OSError, ValueError):
+            return
+        for key, item in mem.items():
+            if key == "__topics__":
+                for tok, count in item.items():
+                    self._topics[tok] = int(count)
+                    self._dirty_topics.add(tok)
+            elif "::" in key:
+                agent, user = key.split("::", 1)
+                self._notes[(agent, user)] = deque(item.get("notes", []), maxlen=MEMORY_NOTES)
+                self._dirty_notes.add((agent, user))
+        self._top = sorted(self._topics, key=self._topics.__getitem__, reverse=True)[:TOP_TOPICS]
+        log.info("imported agent memory from %s", LEGACY_MEMORY_PATH)
+
+    def remember(self, agent_handle: str, user_handle: str, content: str) -> None:
+        snippet = content.strip().replace("\n", " ")[:NOTE_CHARS]
+        if not user_handle or not snippet:
+            return
+        key = (agent_handle.lower(), user_handle.lower())
+        notes = self._notes.get(key)
+        if notes is None:
+            notes = self._notes[key] = deque(maxlen=MEMORY_NOTES)
+        notes.append(snippet)
+        self._dirty_notes.add(key)
+
+    def last_note(self, agent_handle: str, user_handle: str) -> str:
+        notes = self._notes.get((agent_handle.lower(), user_handle.lower()))
+        return notes[-1] if notes else ""
+
+    def track_topics(self, tokens: list[str]) -> None:
+        for tok in tokens:
+            self._topics[tok] = self._topics.get(tok, 0) + 1
+            self._dirty_topics.add(tok)
+            self._bump_top(tok)
+
+    def _bump_top(self, tok: str) -> None:
+        # counts only grow, so a token can only enter the top list at the moment it is bumped
+        top = self._top
+        if tok not in top:
+            if len(top) < TOP_TOPICS:
+                top.append(tok)
+            elif self._topics[tok] > self._topics[top[-1]]:
+                top[-1] = tok
+            else:
+                return
+        top.sort(key=self._topics.__getitem__, reverse=True)
+
+    def top_topics(self, limit: int = 3) -> list[str]:
+        return self._top[:limit]
+
+    async def flush(self) -> None:
+        if not self._dirty_notes and not self._dirty_topics:
+            return
+        notes = {k: list(self._notes[k]) for k in self._dirty_notes}
+        topics = {t: self._topics[t] for t in self._dirty_topics}
+        self._dirty_notes, self._dirty_topics = set(), set()
+        try:
+            async with async_session_maker() as session:
+                await session.run_sync(self._write, notes, topics)
+        except Exception:
+            # keep them dirty for the next flush
+            self._dirty_notes.update(notes)
+            self._dirty_topics.update(topics)
+            raise
+
+    @staticmethod
+    def _write(session: Session, notes: dict[tuple[str, str], list[str]], topics: dict[str, int]) -> None:
+        if notes:
+            agents = {a for a, _ in notes}
+            users = {u for _, u in notes}
+            rows = session.exec(select(AgentMemoryNote).where(
+                AgentMemoryNote.agent_handle.in_(agents), AgentMemoryNote.user_handle.in_(users)
+            )).all()
+            existing = {(r.agent_handle, r.user_handle): r for r in rows}
+            now = datetime.utcnow()
+            for (agent, user), items in notes.items():
+                row = existing.get((agent, user)) or AgentMemoryNote(agent_handle=agent, user_handle=user)
+                row.notes = items
+                row.updated_at = now
+                session.add(row)
+        if topics:
+            rows = session.exec(select(AgentTopic).where(AgentTopic.token.in_(topics))).all()
+            existing_topics = {r.token: r for r in rows}
+            for tok, count in topics.items():
+                row = existing_topics.get(tok) or AgentTopic(token=tok)
+                row.count = count
+                session.add(row)
+        session.commit()
+
+    async def flush_loop(self) -> None:
+        while True:
+            await asyncio.sleep(settings.AGENT_MEMORY_FLUSH_SECONDS)
+            try:
+                await self.flush()
+            except Exception:
+                log.exception("agent memory flush failed")
+
+
+agent_memory = AgentMemory()
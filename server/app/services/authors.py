@@ -0,0 +1,106 @@
+from __future__ import annotations
+import threading
+from collections import OrderedDict
+from typing import Iterable
+from sqlalchemy import event, inspect
+from sqlmodel import Session, select
+from ..models import Post, User, Agent
+
+CACHE_SIZE = 4096
+
+_cache: OrderedDict[tuple[str, int], str] = OrderedDict()
+_lock = threading.Lock()
+
+
+def _author_key(p: Post) -> tuple[str, int] | None:
+    if p.author_type == "user" and p.author_user_id:
+        return ("user", p.author_user_id)
+    if p.author_type == "agent" and p.author_agent_id:
+        return ("agent", p.author_agent_id)
+    return None
+
+
+def _cache_get(key: tuple[str, int]) -> str | None:
+    with _lock:
+        h = _cache.get(key)
+        if h is not None:
+            _cache.move_to_end(key)
+        return h
+
+
+def _cache_put(key: tuple[str, int], handle: str) -> None:
+    with _lock:
+        _cache[key] = handle
+        _cache.move_to_end(key)
+        while len(_cache) > CACHE_SIZE:
+            _cache.popitem(last=False)
+
+
+def invalidate(kind: str, author_id: int | None) -> None:
+    with _lock:
+        _cache.pop((kind, author_id), None)
+
+
+def clear() -> None:
+    with _lock:
+        _cache.clear()
+
+
+def resolve_author_handles(session: Session, posts: Iterable[Post]) -> dict[int, str]:
+    """Map post id -> author handle, with one IN query per author type for cache misses."""
+    posts = list(posts)
+    found: dict[tuple[str, int], str] = {}
+    missing: dict[str, set[int]] = {"user": set(), "agent": set()}
+    for p in posts:
+        key = _author_key(p)
+        if key is None or key in found:
+            continue
+        h = _cache_get(key)
+        if h is None:
+            missing[key[0]].add(key[1])
+        else:
+            found[key] = h
+
+    if missing["user"]:
+        for uid, handle in session.exec(select(User.id, User.handle).where(User.id.in_(missing["user"]))).all():
+            found[("user", uid)] = handle
+            _cache_put(("user", uid), handle)
+    if missing["agent"]:
+        for aid, handle in session.exec(select(Agent.id, Agent.handle).where(Agent.id.in_(missing["agent"]))).all():
+            found[("agent", aid)] = handle
+            _cache_put(("agent", aid), handle)
+
+    out = {}
+    for p in posts:
+        key = _author_key(p)
+        if key and key in found:
+            out[p.id] = found[key]
+        else:
+            out[p.id] = "agent" if p.author_type == "agent" and p.author_agent_id else "unknown"
+    return out
+
+
+def _handle_changed(target) -> bool:
+    return inspect(target).attrs.handle.history.has_changes()
+
+
+@event.listens_for(User, "after_update")
+def _on_user_update(mapper, connection, target):
+    if _handle_changed(target):
+        invalidate("user", target.id)
+
+
+@event.listens_for(User, "after_delete")
+def _on_user_delete(mapper, connection, target):
+    invalidate("user", target.id)
+
+
+@event.listens_for(Agent, "after_update")
+def _on_agent_update(mapper, connection, target):
+    if _handle_changed(target):
+        invalidate("agent", target.id)
+
+
+@event.listens_for(Agent, "after_delete")
+def _on_agent_delete(mapper, connection, target):
+    invalidate("agent", target.id)
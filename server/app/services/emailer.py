@@ -1,27 +1,148 @@
+import asyncio
 import os
 import smtplib
+import time
+import uuid
+from datetime import datetime, timedelta
 from email.message import EmailMessage
+from sqlalchemy import insert, update
+from sqlalchemy.exc import IntegrityError
+from sqlmodel import Session, select
+from sqlmodel.ext.asyncio.session import AsyncSession
+from ..models import EmailOutbox
+from .jobs import enqueue, job_handler
 
+OUTBOX_BATCH = 50
+OUTBOX_MAX_ATTEMPTS = 5
+OUTBOX_LEASE_SECONDS = 300
+# queued mail is flushed by one job per window of this many seconds
+OUTBOX_FLUSH_WINDOW_SECONDS = 2.0
 
-def send_email(to_email: str, subject: str, body: str) -> bool:
-    host = os.getenv("COEVO_SMTP_HOST", "").strip()
-    port = int(os.getenv("COEVO_SMTP_PORT", "587"))
+
+def _smtp_config() -> dict:
     user = os.getenv("COEVO_SMTP_USER", "").strip()
-    password = os.getenv("COEVO_SMTP_PASSWORD", "").strip()
-    from_email = os.getenv("COEVO_SMTP_FROM", user or "no-reply@coevo.local")
+    return {
+        "host": os.getenv("COEVO_SMTP_HOST", "").strip(),
+        "port": int(os.getenv("COEVO_SMTP_PORT", "587")),
+        "user": user,
+        "password": os.getenv("COEVO_SMTP_PASSWORD", "").strip(),
+        "from_email": os.getenv("COEVO_SMTP_FROM", user or "no-reply@coevo.local"),
+    }
 
-    if not host or not to_email:
-        return False
 
+def _message(from_email: str, to_email: str, subject: str, body: str) -> EmailMessage:
     msg = EmailMessage()
     msg["From"] = from_email
     msg["To"] = to_email
     msg["Subject"] = subject
     msg.set_content(body)
+    return msg
+
+
+def send_email(to_email: str, subject: str, body: str) -> bool:
+    cfg = _smtp_config()
+    if not cfg["host"] or not to_email:
+        return False
 
-    with smtplib.SMTP(host, port, timeout=20) as server:
+    with smtplib.SMTP(cfg["host"], cfg["port"], timeout=20) as server:
         server.starttls()
-        if user and password:
-            server.login(user, password)
-        server.send_message(msg)
+        if cfg["user"] and cfg["password"]:
+            server.login(cfg["user"], cfg["password"])
+        server.send_message(_message(cfg["from_email"], to_email, subject, body))
     return True
+
+
+def send_emails(messages: list[tuple[str, str, str]]) -> list[str | None]:
+    """Send (to, subject, body) messages over one SMTP session; returns an error (or None) per message."""
+    cfg = _smtp_config()
+    if not cfg["host"]:
+        return ["smtp not configured"] * len(messages)
+    results: list[str | None] = []
+    with smtplib.SMTP(cfg["host"], cfg["port"], timeout=20) as server:
+        server.starttls()
+        if cfg["user"] and cfg["password"]:
+            server.login(cfg["user"], cfg["password"])
+        for to_email, subject, body in messages:
+            try:
+                server.send_message(_message(cfg["from_email"], to_email, subject, body))
+                results.append(None)
+            except smtplib.SMTPException as e:
+                results.append(str(e) or e.__class__.__name__)
+    return results
+
+
+def _enqueue_flush(session: Session) -> None:
+    # A burst of notifying posts shares its window's flush job instead of queueing one each.
+    # The job runs one window after its window closes, so mail committed by posts in that
+    # window is in by then; it drains every pending row, so later stragglers go with the next.
+    now = time.time()
+    window = int(now // OUTBOX_FLUSH_WINDOW_SECONDS)
+    delay = (window + 2) * OUTBOX_FLUSH_WINDOW_SECONDS - now
+    try:
+        with session.begin_nested():
+            enqueue(session, "email_outbox_flush", {}, f"email_outbox_flush:{window}", delay)
+    except IntegrityError:
+        pass  # a concurrent transaction queued this window's flush first
+
+
+def queue_email(session: Session, to_email: str, subject: str, body: str):
+    session.add(EmailOutbox(to_email=to_email, subject=subject, body=body))
+    _enqueue_flush(session)
+
+
+async def queue_emails_bulk(session: AsyncSession, messages: list[tuple[str, str, str]]) -> None:
+    if not messages:
+        return
+    await session.execute(insert(EmailOutbox), [
+        {"to_email": to_email, "subject": subject, "body": body, "status": "pending", "attempts": 0, "last_error": "", "created_at": datetime.utcnow()}
+        for to_email, subject, body in messages
+    ])
+    await session.run_sync(_enqueue_flush)
+
+
+@job_handler("email_outbox_flush")
+async def _flush_outbox_job(session: AsyncSession, payload: dict):
+    while True:
+        token = uuid.uuid4().hex
+        now = datetime.utcnow()
+        stale = now - timedelta(seconds=OUTBOX_LEASE_SECONDS)
+        ids = (await session.exec(
+            select(EmailOutbox.id)
+            .where((EmailOutbox.status == "pending") | ((EmailOutbox.status == "sending") & (EmailOutbox.claimed_at < stale)))
+            .order_by(EmailOutbox.id).limit(OUTBOX_BATCH)
+        )).all()
+        if not ids:
+            return
+        await session.execute(
+            update(EmailOutbox)
+            .where(EmailOutbox.id.in_(ids), (EmailOutbox.status == "pending") | (EmailOutbox.claimed_at < stale))
+            .values(status="sending", claim_token=token, claimed_at=now)
+        )
+        await session.commit()
+        rows = (await session.exec(select(EmailOutbox).where(EmailOutbox.claim_token == token).order_by(EmailOutbox.id))).all()
+        if not rows:
+            continue
+
+        if not _smtp_config()["host"]:
+            errors: list[str | None] = ["smtp not configured"] * len(rows)
+            final_status = "skipped"
+        else:
+            try:
+                errors = await asyncio.to_thread(send_emails, [(r.to_email, r.subject, r.body) for r in rows])
+            except (OSError, smtplib.SMTPException) as e:
+                errors = [str(e) or e.__class__.__name__] * len(rows)
+            final_status = None
+
+        for r, err in zip(rows, errors):
+            r.attempts += 1
+            if err is None:
+                r.status, r.sent_at, r.last_error = "sent", datetime.utcnow(), ""
+            elif final_status:
+                r.status, r.last_error = final_status, err
+            else:
+                r.status, r.last_error = ("failed" if r.attempts >= OUTBOX_MAX_ATTEMPTS else "pending"), err[:500]
+            session.add(r)
+        await session.commit()
+        if final_status is None and any(errors):
+            # Leave the rest for the job's backoff instead of hammering a failing relay.
+            raise RuntimeError(f"{sum(1 for e in errors if e)} of {len(rows)} emails failed")
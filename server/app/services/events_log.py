@@ -9,7 +9,7 @@ def set_node_priv(priv):
     global _NODE_PRIV
     _NODE_PRIV = priv
 
-def log_event(session: Session, event_type: str, payload: dict):
+def log_event(session: Session, event_type: str, payload: dict, commit: bool = True):
     e = EventLog(event_type=event_type, payload=payload)
     if _NODE_PRIV is not None:
         sig_payload = {
@@ -19,6 +19,8 @@ def log_event(session: Session, event_type: str, payload: dict):
         }
         e.signature = sign(_NODE_PRIV, sig_payload)
     session.add(e)
+    if not commit:
+        return e
     session.commit()
     session.refresh(e)
     return e
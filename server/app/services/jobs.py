@@ -0,0 +1,155 @@
+from __future__ import annotations
+import asyncio
+import logging
+from datetime import datetime, timedelta
+from typing import Any, Awaitable, Callable
+from sqlalchemy import or_, update
+from sqlmodel import Session, select
+from sqlmodel.ext.asyncio.session import AsyncSession
+from ..core.config import settings
+from ..core.events import broker
+from ..db import async_session_maker
+from ..models import Job
+
+log = logging.getLogger("coevo.jobs")
+
+# A handler runs inside the job's session. Writes it leaves uncommitted are committed
+# together with the job's "done" mark; events it returns are published after that commit.
+JobHandler = Callable[[AsyncSession, dict], Awaitable[list[dict] | None]]
+
+HANDLERS: dict[str, JobHandler] = {}
+
+
+def job_handler(kind: str):
+    def _register(fn: JobHandler) -> JobHandler:
+        HANDLERS[kind] = fn
+        return fn
+    return _register
+
+
+def enqueue(session: Session, kind: str, payload: dict[str, Any], idempotency_key: str | None = None,
+            delay_seconds: float = 0, max_attempts: int | None = None) -> Job | None:
+    """Stage a job in the caller's transaction; returns None if the key was already enqueued."""
+    if idempotency_key:
+        existing = session.exec(select(Job.id).where(Job.idempotency_key == idempotency_key)).first()
+        if existing is not None:
+            return None
+    job = Job(
+        kind=kind,
+        payload=payload,
+        idempotency_key=idempotency_key,
+        max_attempts=max_attempts or settings.JOB_MAX_ATTEMPTS,
+        run_after=datetime.utcnow() + timedelta(seconds=delay_seconds),
+    )
+    session.add(job)
+    return job
+
+
+class JobWorkerPool:
+    def __init__(self, concurrency: int, poll_seconds: float, lease_seconds: int) -> None:
+        self.concurrency = concurrency
+        self.poll_seconds = poll_seconds
+        self.lease_seconds = lease_seconds
+        self._tasks: list[asyncio.Task] = []
+        self._wakeup = asyncio.Event()
+        self._loop: asyncio.AbstractEventLoop | None = None
+
+    def start(self) -> None:
+        if self._tasks:
+            return
+        self._loop = asyncio.get_running_loop()
+        self._wakeup = asyncio.Event()
+        self._tasks = [asyncio.create_task(self._worker()) for _ in range(self.concurrency)]
+
+    async def stop(self) -> None:
+        for t in self._tasks:
+            t.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    def wake(self) -> None:
+        # Safe from sync routers running in the threadpool.
+        if self._loop is None:
+            return
+        try:
+            running = asyncio.get_running_loop()
+        except RuntimeError:
+            running = None
+        if running is self._loop:
+            self._wakeup.set()
+        else:
+            self._loop.call_soon_threadsafe(self._wakeup.set)
+
+    async def _worker(self) -> None:
+        while True:
+            try:
+                job = await self._claim()
+            except Exception:
+                log.exception("job claim failed")
+                job = None
+            if job is None:
+                self._wakeup.clear()
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), timeout=self.poll_seconds)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+            await self._run(job)
+
+    async def _claim(self) -> Job | None:
+        now = datetime.utcnow()
+        stale = now - timedelta(seconds=self.lease_seconds)
+        claimable = or_(
+            (Job.status == "pending") & (Job.run_after <= now),
+            (Job.status == "running") & (Job.locked_at < stale),
+        )
+        async with async_session_maker() as session:
+            candidates = (await session.exec(select(Job.id).where(claimable).order_by(Job.id).limit(self.concurrency))).all()
+            for job_id in candidates:
+                res = await session.execute(
+                    update(Job).where(Job.id == job_id, claimable)
+                    .values(status="running", locked_at=now, attempts=Job.attempts + 1, updated_at=now)
+                )
+                await session.commit()
+                if res.rowcount == 1:
+                    return await session.get(Job, job_id)
+        return None
+
+    async def _run(self, job: Job) -> None:
+        handler = HANDLERS.get(job.kind)
+        async with async_session_maker() as session:
+            try:
+                if handler is None:
+                    raise RuntimeError(f"no handler for job kind {job.kind!r}")
+                events = await handler(session, dict(job.payload or {}))
+                res = await session.execute(
+                    update(Job).where(Job.id == job.id, Job.locked_at == job.locked_at)
+                    .values(status="done", last_error="", updated_at=datetime.utcnow())
+                )
+                if not res.rowcount:
+                    # ran past the lease and another worker reclaimed the job; its run decides
+                    await session.rollback()
+                    log.warning("job %s (%s) lost its lease; discarding this run", job.id, job.kind)
+                    return
+                await session.commit()
+            except Exception as e:
+                await session.rollback()
+                await self._fail(session, job, e)
+                return
+        if events:
+            await broker.publish_many(events)
+
+    async def _fail(self, session: AsyncSession, job: Job, err: Exception) -> None:
+        final = job.attempts >= job.max_attempts
+        log.warning("job %s (%s) attempt %s failed: %s", job.id, job.kind, job.attempts, err)
+        values = {"last_error": str(err)[:500], "updated_at": datetime.utcnow(), "locked_at": None}
+        if final:
+            values["status"] = "failed"
+        else:
+            values["status"] = "pending"
+            values["run_after"] = datetime.utcnow() + timedelta(seconds=min(300, 2 ** job.attempts))
+        await session.execute(update(Job).where(Job.id == job.id, Job.locked_at == job.locked_at).values(**values))
+        await session.commit()
+
+
+job_workers = JobWorkerPool(settings.JOB_WORKERS, settings.JOB_POLL_SECONDS, settings.JOB_LEASE_SECONDS)
@@ -1,5 +1,6 @@
 from __future__ import annotations
 from datetime import datetime
+from sqlalchemy import desc, or_, union_all
 from sqlmodel import Session, select
 from ..models import Wallet, LedgerTx
 from ..core.node_signing import sign
@@ -10,6 +11,15 @@ def set_node_priv(priv):
     global _NODE_PRIV
     _NODE_PRIV = priv
 
+def wallet_ledger_query(wallet_id: int, limit: int = 50):
+    """Newest transactions touching a wallet, as a UNION ALL of the sent and received branches so
+    SQLite merges two index-ordered scans instead of sorting an OR. Run with session.scalars()."""
+    sent = select(LedgerTx).where(LedgerTx.from_wallet_id == wallet_id)
+    received = select(LedgerTx).where(
+        LedgerTx.to_wallet_id == wallet_id, or_(LedgerTx.from_wallet_id == None, LedgerTx.from_wallet_id != wallet_id)
+    )
+    return select(LedgerTx).from_statement(union_all(sent, received).order_by(desc("id")).limit(limit))
+
 def get_or_create_system_wallet(session: Session) -> Wallet:
     w = session.exec(select(Wallet).where(Wallet.owner_type == "system")).first()
     if w:
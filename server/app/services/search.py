@@ -0,0 +1,232 @@
+"""Full-text search (SQLite FTS5) over posts, thread titles, bounties and repo links.
+
+`search_index` holds one row per searchable record with rowid = ref_id * 4 + kind code,
+so a source row maps to exactly one index row and can be replaced without a scan.
+SQLite triggers keep it in sync with every writer; hidden posts are left out.
+
+    python -m app.services.search --rebuild     # repopulate from the source tables
+    python -m app.services.search "some words"  # ad-hoc query
+"""
+from __future__ import annotations
+import base64
+import re
+import sys
+from datetime import datetime
+from sqlalchemy import text
+from sqlalchemy.engine import Connection
+from sqlmodel import Session
+
+KIND_CODES = {"post": 0, "thread": 1, "bounty": 2, "repo": 3}
+SEARCH_PAGE_DEFAULT = 20
+SEARCH_PAGE_MAX = 100
+# bm25 column weights: title, body, tags
+BM25_WEIGHTS = "8.0, 1.0, 2.0"
+
+_USER_HANDLE = '(SELECT handle FROM "user" WHERE id = {})'
+_AGENT_HANDLE = "(SELECT handle FROM agent WHERE id = {})"
+_BOARD_OF = "(SELECT board_id FROM thread WHERE id = {})"
+
+# Per kind: source table, the columns whose update re-indexes the row, the row filter,
+# and the index columns as expressions over the source row `r`.
+_SOURCES = {
+    "post": ("post", "content_md, is_hidden", "r.is_hidden = 0", {
+        "title": "''",
+        "body": "r.content_md",
+        "tags": "''",
+        "thread_id": "r.thread_id",
+        "board_id": _BOARD_OF.format("r.thread_id"),
+        "author": f"CASE r.author_type WHEN 'user' THEN {_USER_HANDLE.format('r.author_user_id')} "
+                  f"WHEN 'agent' THEN {_AGENT_HANDLE.format('r.author_agent_id')} END",
+        "created_at": "r.created_at",
+    }),
+    "thread": ("thread", "title", "1", {
+        "title": "r.title",
+        "body": "''",
+        "tags": "''",
+        "thread_id": "r.id",
+        "board_id": "r.board_id",
+        "author": f"COALESCE({_USER_HANDLE.format('r.created_by_user_id')}, {_AGENT_HANDLE.format('r.created_by_agent_id')})",
+        "created_at": "r.created_at",
+    }),
+    "bounty": ("bounty", "title, requirements_md", "1", {
+        "title": "r.title",
+        "body": "r.requirements_md",
+        "tags": "''",
+        "thread_id": "r.thread_id",
+        "board_id": _BOARD_OF.format("r.thread_id"),
+        "author": _USER_HANDLE.format("r.creator_user_id"),
+        "created_at": "r.created_at",
+    }),
+    "repo": ("repolink", "title, description, tags", "1", {
+        "title": "r.title",
+        "body": "r.description",
+        "tags": "COALESCE(r.tags, '')",
+        "thread_id": "NULL",
+        "board_id": "NULL",
+        "author": _USER_HANDLE.format("r.added_by_user_id"),
+        "created_at": "r.created_at",
+    }),
+}
+
+_COLUMNS = ["title", "body", "tags", "thread_id", "board_id", "author", "created_at"]
+
+
+def fts5_available(conn: Connection) -> bool:
+    return conn.dialect.name == "sqlite" and bool(conn.execute(text("SELECT sqlite_compileoption_used('ENABLE_FTS5')")).scalar())
+
+
+def index_exists(conn: Connection) -> bool:
+    """Whether search_index has been created (migration 5 needs a SQLite build with FTS5)."""
+    return conn.dialect.name == "sqlite" and conn.execute(
+        text("SELECT 1 FROM sqlite_master WHERE name = 'search_index'")
+    ).first() is not None
+
+
+def _select(kind: str, row: str) -> tuple[str, str]:
+    table, _, where, cols = _SOURCES[kind]
+    exprs = re.sub(r"\br\.", f"{row}.", ", ".join(cols[c] for c in _COLUMNS))
+    return f"SELECT {row}.id * 4 + {KIND_CODES[kind]}, '{kind}', {row}.id, {exprs}", re.sub(r"\br\.", f"{row}.", where)
+
+
+def install(conn: Connection) -> None:
+    conn.execute(text(
+        "CREATE VIRTUAL TABLE IF NOT EXISTS search_index USING fts5("
+        "title, body, tags, kind UNINDEXED, ref_id UNINDEXED, thread_id UNINDEXED, board_id UNINDEXED, "
+        "author UNINDEXED, created_at UNINDEXED, tokenize = 'porter unicode61')"
+    ))
+    insert_cols = "rowid, kind, ref_id, " + ", ".join(_COLUMNS)
+    for kind, (table, watched, _, _) in _SOURCES.items():
+        code = KIND_CODES[kind]
+        select_new, where_new = _select(kind, "NEW")
+        add = f"INSERT INTO search_index ({insert_cols}) {select_new} WHERE {where_new};"
+        drop = f"DELETE FROM search_index WHERE rowid = OLD.id * 4 + {code};"
+        conn.execute(text(f"CREATE TRIGGER IF NOT EXISTS search_{table}_ai AFTER INSERT ON {table} BEGIN {add} END"))
+        conn.execute(text(f"CREATE TRIGGER IF NOT EXISTS search_{table}_au AFTER UPDATE OF {watched} ON {table} BEGIN {drop} {add} END"))
+        conn.execute(text(f"CREATE TRIGGER IF NOT EXISTS search_{table}_ad AFTER DELETE ON {table} BEGIN {drop} END"))
+
+
+def rebuild(conn: Connection) -> dict[str, int]:
+    """Repopulate the index from the source tables (e.g. after author handle renames)."""
+    conn.execute(text("DELETE FROM search_index"))
+    insert_cols = "rowid, kind, ref_id, " + ", ".join(_COLUMNS)
+    counts = {}
+    for kind, (table, _, _, _) in _SOURCES.items():
+        select_r, where_r = _select(kind, "r")
+        counts[kind] = conn.execute(text(f"INSERT INTO search_index ({insert_cols}) {select_r} FROM {table} AS r WHERE {where_r}")).rowcount
+    conn.execute(text("INSERT INTO search_index (search_index) VALUES ('optimize')"))
+    return counts
+
+
+def match_expression(q: str) -> str:
+    # User text never reaches FTS5 syntax: each word becomes a quoted term (implicit AND).
+    # A trailing * on a word asks for a prefix match; it is opt-in because a short prefix
+    # can expand to most of the vocabulary.
+    terms = [f'"{w}"{star}' for w, star in re.findall(r"(\w+)(\*?)", q)]
+    return " ".join(terms)
+
+
+def _encode_cursor(score: float, rowid: int) -> str:
+    return base64.urlsafe_b64encode(f"{score!r}:{rowid}".encode()).decode()
+
+
+def _decode_cursor(cursor: str) -> tuple[float, int]:
+    try:
+        score, rowid = base64.urlsafe_b64decode(cursor.encode()).decode().split(":")
+        return float(score), int(rowid)
+    except (ValueError, UnicodeDecodeError) as e:
+        raise ValueError("invalid cursor") from e
+
+
+def search(
+    session: Session,
+    q: str,
+    board_id: int | None = None,
+    author: str | None = None,
+    since: datetime | None = None,
+    until: datetime | None = None,
+    kinds: list[str] | None = None,
+    limit: int = SEARCH_PAGE_DEFAULT,
+    cursor: str | None = None,
+) -> tuple[list[dict], str | None]:
+    """BM25-ranked hits with snippets, plus the cursor for the next page (None at the end)."""
+    expr = match_expression(q)
+    if not expr:
+        return [], None
+    where = ["search_index MATCH :expr"]
+    params: dict = {"expr": expr, "limit": limit}
+    if board_id is not None:
+        where.append("board_id = :board_id")
+        params["board_id"] = board_id
+    if author:
+        where.append("author = :author")
+        params["author"] = author.lstrip("@")
+    if since is not None:
+        where.append("created_at >= :since")
+        params["since"] = str(since.replace(tzinfo=None))
+    if until is not None:
+        where.append("created_at < :until")
+        params["until"] = str(until.replace(tzinfo=None))
+    if kinds:
+        names = [k for k in kinds if k in KIND_CODES]
+        where.append(f"kind IN ({', '.join(repr(k) for k in names) or 'NULL'})")
+    if cursor:
+        params["c_score"], params["c_rowid"] = _decode_cursor(cursor)
+        where.append("(score > :c_score OR (score = :c_score AND rowid > :c_rowid))")
+
+    # Rank first and only build snippets/metadata for the page: computing them in the
+    # ranking query would run snippet() over every match before the sort.
+    ranked = session.execute(text(
+        f"SELECT rowid, bm25(search_index, {BM25_WEIGHTS}) AS score FROM search_index "
+        f"WHERE {' AND '.join(where)} ORDER BY score, rowid LIMIT :limit"
+    ), params).all()
+    if not ranked:
+        return [], None
+    details = {r.rowid: r for r in session.execute(text(
+        "SELECT rowid, kind, ref_id, thread_id, board_id, author, created_at, title, "
+        "snippet(search_index, -1, '**', '**', '…', 16) AS snip "
+        f"FROM search_index WHERE search_index MATCH :expr AND rowid IN ({', '.join(str(r.rowid) for r in ranked)})"
+    ), {"expr": expr}).all()}
+    rows = [(details[r.rowid], r.score) for r in ranked if r.rowid in details]
+
+    thread_ids = {r.thread_id for r, _ in rows if r.kind in ("post", "bounty") and r.thread_id is not None}
+    titles = {}
+    if thread_ids:
+        titles = dict(session.execute(
+            text(f"SELECT id, title FROM thread WHERE id IN ({', '.join(str(int(t)) for t in thread_ids)})")
+        ).all())
+    hits = [{
+        "kind": r.kind,
+        "id": r.ref_id,
+        "thread_id": r.thread_id,
+        "board_id": r.board_id,
+        "author": r.author,
+        "created_at": str(r.created_at).replace(" ", "T") + "Z" if r.created_at else None,
+        "title": r.title or titles.get(r.thread_id, ""),
+        "snippet": r.snip,
+        "score": score,
+    } for r, score in rows]
+    next_cursor = _encode_cursor(ranked[-1].score, ranked[-1].rowid) if len(ranked) == limit else None
+    return hits, next_cursor
+
+
+def main(argv: list[str]) -> int:
+    from ..db import engine
+
+    with engine.begin() as conn:
+        if not fts5_available(conn):
+            print("search needs SQLite with FTS5")
+            return 1
+        install(conn)
+        if "--rebuild" in argv:
+            print("indexed:", rebuild(conn))
+            return 0
+    query = " ".join(a for a in argv if not a.startswith("--"))
+    with Session(engine) as session:
+        hits, _ = search(session, query)
+    for h in hits:
+        print(f"{h['score']:9.3f}  {h['kind']:<6} #{h['id']:<8} {h['title'][:40]:<40}  {h['snippet']}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
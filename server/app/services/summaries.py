@@ -0,0 +1,76 @@
+from __future__ import annotations
+import threading
+from sqlalchemy.exc import IntegrityError
+from sqlmodel import Session, select
+from ..core.config import settings
+from ..db import async_session_maker
+from ..models import Thread, ThreadSummary
+from .jobs import enqueue
+
+SUMMARY_MIN_POSTS = 20
+SUMMARY_EVERY = 10
+# prefix of the TL;DR post a rolling summary is published as
+SUMMARY_HEADER = "**TL;DR (auto)**\n\n"
+
+
+class SummaryScheduler:
+    """Per-thread visible-post counters that decide when a rolling summary is due.
+
+    A thread's counter is seeded from Thread.post_count the first time a post lands in
+    it after startup; afterwards each post is a dict increment. The summary job itself
+    re-derives the exact count, so a counter that drifts (hidden posts, other
+    processes) only shifts when the job is scheduled, never what it writes.
+    """
+
+    def __init__(self) -> None:
+        self._posts: dict[int, int] = {}
+        self._summarized: dict[int, int] = {}
+        self._lock = threading.Lock()
+
+    def _seed(self, session: Session, thread_id: int) -> tuple[int, int]:
+        posts = session.exec(select(Thread.post_count).where(Thread.id == thread_id)).first() or 0
+        summarized = session.exec(select(ThreadSummary.source_post_count).where(ThreadSummary.thread_id == thread_id)).first() or 0
+        return posts, summarized
+
+    def note_post(self, session: Session, thread_id: int) -> bool:
+        """Count a post flushed in `session`; returns True when a summary should be scheduled."""
+        with self._lock:
+            known = thread_id in self._posts
+            if known:
+                self._posts[thread_id] += 1
+        if not known:
+            # the seed already includes the caller's flushed post
+            posts, summarized = self._seed(session, thread_id)
+            with self._lock:
+                self._posts.setdefault(thread_id, posts)
+                self._summarized.setdefault(thread_id, summarized)
+        with self._lock:
+            posts, summarized = self._posts[thread_id], self._summarized[thread_id]
+        return posts >= SUMMARY_MIN_POSTS and posts - summarized >= SUMMARY_EVERY
+
+    def note_summarized(self, thread_id: int, source_post_count: int) -> None:
+        with self._lock:
+            self._summarized[thread_id] = source_post_count
+            if thread_id in self._posts:
+                self._posts[thread_id] = max(self._posts[thread_id], source_post_count)
+
+    async def schedule(self, thread_id: int) -> None:
+        # One delayed job per block of SUMMARY_EVERY posts: a burst lands on the job that is
+        # already waiting, and a job that finds too few new posts is a cheap no-op.
+        with self._lock:
+            block = self._posts.get(thread_id, 0) // SUMMARY_EVERY
+        async with async_session_maker() as session:
+            job = await session.run_sync(
+                enqueue, "thread_summary", {"thread_id": thread_id},
+                f"thread_summary:{thread_id}:{block}", settings.SUMMARY_DEBOUNCE_SECONDS,
+            )
+            if job is None:
+                return
+            try:
+                await session.commit()
+            except IntegrityError:
+                await session.rollback()  # a concurrent post already scheduled it
+                return
+
+
+summary_scheduler = SummaryScheduler()
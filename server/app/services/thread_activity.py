@@ -0,0 +1,75 @@
+from __future__ import annotations
+from datetime import datetime
+from sqlalchemy import or_, update
+from sqlmodel import Session, select
+from ..models import Thread, Post
+from .authors import resolve_author_handles
+
+# Thread.post_count / last_post_* / last_author mirror the thread's visible posts. They
+# are written with relative UPDATEs in the same transaction as the post change, so
+# concurrent writers cannot lose increments.
+
+
+def record_post(session: Session, post: Post, author_handle: str) -> None:
+    """Count a post flushed (not yet committed) in `session` toward its thread."""
+    session.execute(
+        update(Thread).where(Thread.id == post.thread_id).values(
+            post_count=Thread.post_count + 1,
+            last_post_id=post.id,
+            last_post_at=post.created_at,
+            last_author=author_handle,
+            updated_at=post.created_at,
+        )
+    )
+
+
+def record_visibility(session: Session, post: Post) -> None:
+    """Apply a hide/unhide of `post` (already flushed) to its thread's counters."""
+    t = session.get(Thread, post.thread_id)
+    if not t:
+        return
+    if not post.is_hidden:
+        session.execute(update(Thread).where(Thread.id == t.id).values(post_count=Thread.post_count + 1))
+        if t.last_post_id is None or post.id > t.last_post_id:
+            _set_last(session, t.id, post)
+        return
+    session.execute(update(Thread).where(Thread.id == t.id, Thread.post_count > 0).values(post_count=Thread.post_count - 1))
+    if t.last_post_id == post.id:
+        prev = session.exec(
+            select(Post).where(Post.thread_id == t.id, Post.is_hidden == False, Post.id < post.id).order_by(Post.id.desc()).limit(1)
+        ).first()
+        _set_last(session, t.id, prev)
+
+
+def _set_last(session: Session, thread_id: int, post: Post | None) -> None:
+    if post is None:
+        values = {"last_post_id": None, "last_post_at": None, "last_author": None}
+    else:
+        values = {"last_post_id": post.id, "last_post_at": post.created_at, "last_author": resolve_author_handles(session, [post])[post.id]}
+    session.execute(update(Thread).where(Thread.id == thread_id).values(**values))
+
+
+def board_threads_query(board_id: int, before: datetime | None = None, before_id: int | None = None, limit: int = 100):
+    """Newest-activity-first threads of a board, keyset-paged on (updated_at, id).
+
+    Pass the last row's updated_at (and id, to break ties) to get the next page.
+    """
+    q = select(Thread).where(Thread.board_id == board_id)
+    if before is not None:
+        before = before.replace(tzinfo=None)
+        q = q.where(Thread.updated_at <= before)
+        q = q.where(or_(Thread.updated_at < before, Thread.id < before_id) if before_id is not None else Thread.updated_at < before)
+    return q.order_by(Thread.updated_at.desc(), Thread.id.desc()).limit(limit)
+
+
+def thread_out(t: Thread) -> dict:
+    return {
+        "id": t.id,
+        "board_id": t.board_id,
+        "title": t.title,
+        "updated_at": t.updated_at.isoformat() + "Z" if t.updated_at else None,
+        "post_count": t.post_count or 0,
+        "last_post_id": t.last_post_id,
+        "last_post_at": t.last_post_at.isoformat() + "Z" if t.last_post_at else None,
+        "last_author": t.last_author,
+    }
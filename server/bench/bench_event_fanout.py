@@ -0,0 +1,107 @@
+"""CPU cost of SSE fan-out per 10k deliveries: per-client frame building vs shared frames.
+
+Run from server/:
+    python -m bench.bench_event_fanout [--subscribers 1000] [--events 200] [--bursts 1,20]
+
+"per-message" rebuilds and encodes the SSE frame for every client and writes each
+event separately (the old sse_events loop); "shared" uses the broker's pre-built
+frames and flushes whatever queued up in one write. A burst is that many events
+published before the clients get to run, i.e. clients that have fallen behind.
+"""
+import argparse
+import asyncio
+import os
+import sys
+import tempfile
+import time
+
+PAYLOAD = {
+    "type": "post_created",
+    "board_id": 1,
+    "thread_id": 1,
+    "author": "bench",
+    "content_md": "Lorem ipsum dolor sit amet, consectetur adipiscing elit. " * 5,
+}
+
+
+class Sink:
+    """Stands in for the clients' transports: counts writes and delivered events."""
+
+    def __init__(self) -> None:
+        self.writes = 0
+        self.events = 0
+
+    def write(self, chunk: bytes) -> None:
+        self.writes += 1
+        self.events += chunk.count(b"\n\n")
+
+
+async def _per_message(broker, sink: Sink) -> None:
+    async for event_id, msg in broker.stream(["thread:1"]):
+        if event_id is None:
+            chunk = f"event: message\ndata: {msg}\n\n"
+        else:
+            chunk = f"id: {event_id}\nevent: message\ndata: {msg}\n\n"
+        sink.write(chunk.encode())
+        await asyncio.sleep(0)
+
+
+async def _shared(broker, sink: Sink) -> None:
+    from app.routers.events import sse_body
+
+    sub, backlog = broker.open(["thread:1"])
+    async for chunk in sse_body(sub, backlog):
+        sink.write(chunk)
+
+
+async def _run(mode: str, subscribers: int, events: int, burst: int) -> tuple[float, float]:
+    from app.core.events import broker
+
+    consume = _per_message if mode == "per-message" else _shared
+    sink = Sink()
+    tasks = [asyncio.create_task(consume(broker, sink)) for _ in range(subscribers)]
+    while sink.events < subscribers:  # keepalives
+        await asyncio.sleep(0)
+
+    expected = subscribers
+    t0 = time.process_time()
+    for start in range(0, events, burst):
+        n = min(burst, events - start)
+        for i in range(n):
+            await broker.publish({**PAYLOAD, "i": start + i})
+        expected += n * subscribers
+        while sink.events < expected:
+            await asyncio.sleep(0)
+    cpu = time.process_time() - t0
+
+    for t in tasks:
+        t.cancel()
+    await asyncio.gather(*tasks, return_exceptions=True)
+    deliveries = subscribers * events
+    writes = sink.writes - subscribers
+    return cpu / deliveries * 10_000, writes / deliveries * 10_000
+
+
+async def _main(subscribers: int, events: int, bursts: list[int]) -> None:
+    print(f"{subscribers} subscribers x {events} events")
+    print(f"{'burst':>5}  {'mode':<12} {'CPU per 10k deliveries':>24} {'writes per 10k':>15}")
+    for burst in bursts:
+        for mode in ("per-message", "shared"):
+            cpu, writes = await _run(mode, subscribers, events, burst)
+            print(f"{burst:>5}  {mode:<12} {cpu * 1000:>21.2f}ms {writes:>15.0f}")
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--subscribers", type=int, default=1000)
+    ap.add_argument("--events", type=int, default=200)
+    ap.add_argument("--bursts", default="1,20")
+    args = ap.parse_args()
+    with tempfile.TemporaryDirectory() as d:
+        os.environ["COEVO_DB_URL"] = f"sqlite:///{d}/bench.db"
+        sys.path.insert(0, os.getcwd())
+        asyncio.run(_main(args.subscribers, args.events, [int(b) for b in args.bursts.split(",")]))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,139 @@
+"""Per-call httpx clients vs the shared provider pool, against a local TLS stub of an LLM API.
+
+Run from server/:
+    python -m bench.bench_llm_http [--requests 400] [--concurrency 8] [--latency-ms 0]
+
+"per-call" opens a fresh AsyncClient for every request (the old provider helpers);
+"shared" uses app.core.http_clients. The stub serves a canned Anthropic-style reply
+over HTTPS with a self-signed certificate and counts the TLS handshakes it accepts.
+"""
+import argparse
+import asyncio
+import datetime
+import ipaddress
+import json
+import os
+import ssl
+import sys
+import tempfile
+import time
+
+REPLY = json.dumps({"content": [{"type": "text", "text": "stub reply " * 20}]}).encode()
+
+
+def _self_signed(d: str) -> tuple[str, str]:
+    from cryptography import x509
+    from cryptography.hazmat.primitives import hashes, serialization
+    from cryptography.hazmat.primitives.asymmetric import ec
+    from cryptography.x509.oid import NameOID
+
+    key = ec.generate_private_key(ec.SECP256R1())
+    name = x509.Name([x509.NameAttribute(NameOID.COMMON_NAME, "127.0.0.1")])
+    now = datetime.datetime.now(datetime.timezone.utc)
+    cert = (
+        x509.CertificateBuilder().subject_name(name).issuer_name(name).public_key(key.public_key())
+        .serial_number(x509.random_serial_number())
+        .not_valid_before(now - datetime.timedelta(minutes=1)).not_valid_after(now + datetime.timedelta(hours=1))
+        .add_extension(x509.SubjectAlternativeName([x509.IPAddress(ipaddress.ip_address("127.0.0.1"))]), critical=False)
+        .sign(key, hashes.SHA256())
+    )
+    cert_path, key_path = os.path.join(d, "stub.pem"), os.path.join(d, "stub.key")
+    with open(cert_path, "wb") as f:
+        f.write(cert.public_bytes(serialization.Encoding.PEM))
+    with open(key_path, "wb") as f:
+        f.write(key.private_bytes(serialization.Encoding.PEM, serialization.PrivateFormat.PKCS8, serialization.NoEncryption()))
+    return cert_path, key_path
+
+
+class Stub:
+    def __init__(self, latency: float) -> None:
+        self.latency = latency
+        self.handshakes = 0
+
+    async def handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        self.handshakes += 1
+        try:
+            while True:
+                head = await reader.readuntil(b"\r\n\r\n")
+                length = 0
+                for line in head.split(b"\r\n"):
+                    if line.lower().startswith(b"content-length:"):
+                        length = int(line.split(b":", 1)[1])
+                await reader.readexactly(length)
+                if self.latency:
+                    await asyncio.sleep(self.latency)
+                writer.write(
+                    b"HTTP/1.1 200 OK\r\ncontent-type: application/json\r\n"
+                    + f"content-length: {len(REPLY)}\r\n\r\n".encode() + REPLY
+                )
+                await writer.drain()
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            writer.close()
+
+
+async def _call(client, url: str) -> None:
+    r = await client.post(url, json={"model": "stub", "messages": [{"role": "user", "content": "hi"}]})
+    r.raise_for_status()
+    r.json()
+
+
+async def _run(mode: str, url: str, requests: int, concurrency: int) -> tuple[float, list[float]]:
+    import httpx
+    from app.core.http_clients import http_clients
+
+    latencies: list[float] = []
+    todo = iter(range(requests))
+
+    async def worker() -> None:
+        for _ in todo:
+            t0 = time.perf_counter()
+            if mode == "per-call":
+                async with httpx.AsyncClient(timeout=60) as client:
+                    await _call(client, url)
+            else:
+                await _call(http_clients.get("bench"), url)
+            latencies.append(time.perf_counter() - t0)
+
+    t0 = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    wall = time.perf_counter() - t0
+    await http_clients.aclose()
+    return wall, sorted(latencies)
+
+
+async def _main(requests: int, concurrency: int, latency: float, cert: str, key: str) -> None:
+    ctx = ssl.create_default_context(ssl.Purpose.CLIENT_AUTH)
+    ctx.load_cert_chain(cert, key)
+    stub = Stub(latency)
+    server = await asyncio.start_server(stub.handle, "127.0.0.1", 0, ssl=ctx)
+    url = f"https://127.0.0.1:{server.sockets[0].getsockname()[1]}/v1/messages"
+
+    print(f"{requests} requests, concurrency {concurrency}, stub latency {latency * 1000:.0f}ms")
+    print(f"{'mode':<10} {'wall':>9} {'p50':>9} {'p99':>9} {'handshakes':>11}")
+    for mode in ("per-call", "shared"):
+        stub.handshakes = 0
+        wall, lat = await _run(mode, url, requests, concurrency)
+        p50, p99 = lat[len(lat) // 2], lat[min(len(lat) - 1, int(len(lat) * 0.99))]
+        print(f"{mode:<10} {wall * 1000:>7.0f}ms {p50 * 1000:>7.2f}ms {p99 * 1000:>7.2f}ms {stub.handshakes:>11}")
+    server.close()
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--requests", type=int, default=400)
+    ap.add_argument("--concurrency", type=int, default=8)
+    ap.add_argument("--latency-ms", type=float, default=0)
+    args = ap.parse_args()
+    with tempfile.TemporaryDirectory() as d:
+        cert, key = _self_signed(d)
+        # httpx reads SSL_CERT_FILE (trust_env), so both modes verify the stub's certificate
+        os.environ["SSL_CERT_FILE"] = cert
+        os.environ["COEVO_DB_URL"] = f"sqlite:///{d}/bench.db"
+        sys.path.insert(0, os.getcwd())
+        asyncio.run(_main(args.requests, args.concurrency, args.latency_ms / 1000, cert, key))
+
+
+if __name__ == "__main__":
+    main()
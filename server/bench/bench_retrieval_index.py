@@ -0,0 +1,76 @@
+"""Agent recall index: per-post update cost and BM25 query latency as a thread grows.
+
+Run from server/:
+    python -m bench.bench_retrieval_index [--posts 1000,10000,50000] [--queries 200]
+
+Posts are added to a ThreadIndex one at a time, as post_created events do; the update
+cost is timed per post over the last tenth of each size, when the index is largest.
+Words follow a Zipf-like distribution over a synthetic vocabulary; queries are drawn
+from the same distribution, so they mix common and rare terms like a real reply would.
+"""
+import argparse
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+
+VOCAB = 20000
+WORDS_PER_POST = (12, 60)
+WORDS_PER_QUERY = (4, 20)
+
+
+def _us(values: list[float]) -> str:
+    values = sorted(values)
+    p99 = values[min(len(values) - 1, int(len(values) * 0.99))]
+    return f"p50={statistics.median(values) * 1e6:8.1f}us p99={p99 * 1e6:8.1f}us"
+
+
+def _text(rng: random.Random, vocab: list[str], weights: list[float], size: tuple[int, int]) -> str:
+    return " ".join(rng.choices(vocab, weights=weights, k=rng.randint(*size)))
+
+
+def _run(sizes: list[int], queries: int) -> None:
+    from app.agents.retrieval import ThreadIndex
+
+    rng = random.Random(7)
+    vocab = [f"w{i}" for i in range(VOCAB)]
+    weights = [1.0 / (i + 1) for i in range(VOCAB)]
+    print(f"{'posts':>7}  {'update per post':<34} {'query (k=4)':<34}")
+    for size in sizes:
+        texts = [_text(rng, vocab, weights, WORDS_PER_POST) for _ in range(size)]
+        idx = ThreadIndex()
+        tail = size - max(1, size // 10)
+        updates = []
+        for post_id, text in enumerate(texts, 1):
+            if post_id <= tail:
+                idx.add(post_id, "bench", text)
+                continue
+            t0 = time.perf_counter()
+            idx.add(post_id, "bench", text)
+            updates.append(time.perf_counter() - t0)
+        # the reply's own window is excluded, as in _reply_to_thread
+        window = set(range(size - 29, size + 1))
+        latencies = []
+        for _ in range(queries):
+            q = _text(rng, vocab, weights, WORDS_PER_QUERY)
+            t0 = time.perf_counter()
+            idx.search(q, 4, window)
+            latencies.append(time.perf_counter() - t0)
+        print(f"{size:>7}  {_us(updates):<34} {_us(latencies):<34}")
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--posts", default="1000,10000,50000")
+    ap.add_argument("--queries", type=int, default=200)
+    args = ap.parse_args()
+    with tempfile.TemporaryDirectory() as d:
+        os.environ["COEVO_DB_URL"] = f"sqlite:///{d}/bench.db"
+        sys.path.insert(0, os.getcwd())
+        _run([int(n) for n in args.posts.split(",")], args.queries)
+
+
+if __name__ == "__main__":
+    main()
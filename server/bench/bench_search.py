@@ -0,0 +1,131 @@
+"""FTS5 search: indexing throughput, query latency and rebuild time over a synthetic corpus.
+
+Run from server/:
+    python -m bench.bench_search [--posts 1000000] [--threads 20000] [--queries 50]
+
+Posts are inserted through the normal `post` table so the search triggers do the
+indexing. Words follow a Zipf-like distribution over a synthetic vocabulary, so
+"common" queries match a large share of the corpus and "rare" ones only a few rows.
+"""
+import argparse
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+
+VOCAB = 20000
+WORDS_PER_POST = (12, 60)
+BATCH = 20000
+
+
+def _ms(values: list[float]) -> str:
+    values = sorted(values)
+    p99 = values[min(len(values) - 1, int(len(values) * 0.99))]
+    return f"p50={statistics.median(values) * 1000:8.2f}ms p99={p99 * 1000:8.2f}ms"
+
+
+def _words(rng: random.Random) -> list[str]:
+    # w0 is the most frequent word, w19999 the rarest
+    vocab = [f"w{i}" for i in range(VOCAB)]
+    weights = [1.0 / (i + 1) for i in range(VOCAB)]
+    return rng.choices(vocab, weights=weights, k=2_000_000)
+
+
+def _build(posts: int, threads: int, rng: random.Random) -> None:
+    from datetime import datetime
+    from sqlalchemy import insert
+    from sqlmodel import Session
+    from app.db import engine, init_db
+    from app.models import User, Board, Thread, Post
+
+    init_db()
+    pool = _words(rng)
+    with Session(engine) as session:
+        session.add(User(handle="author", password_hash="x"))
+        session.add_all([Board(slug="b1", title="b1"), Board(slug="b2", title="b2")])
+        session.commit()
+        session.add_all([Thread(board_id=1 + i % 2, title=" ".join(rng.sample(pool, 5)), created_by_user_id=1) for i in range(threads)])
+        session.commit()
+
+    t0 = time.perf_counter()
+    done = 0
+    while done < posts:
+        n = min(BATCH, posts - done)
+        rows = []
+        for _ in range(n):
+            k = rng.randint(*WORDS_PER_POST)
+            start = rng.randrange(len(pool) - k)
+            rows.append({"thread_id": rng.randint(1, threads), "author_type": "user", "author_user_id": 1,
+                         "content_md": " ".join(pool[start:start + k]), "is_hidden": False, "created_at": datetime.utcnow()})
+        with engine.begin() as conn:
+            conn.execute(insert(Post), rows)
+        done += n
+        print(f"\r  indexed {done}/{posts} posts", end="", file=sys.stderr)
+    elapsed = time.perf_counter() - t0
+    print(file=sys.stderr)
+    print(f"insert+index: {posts} posts in {elapsed:.1f}s ({posts / elapsed:,.0f} posts/s)")
+
+
+def _queries(n: int) -> None:
+    from sqlmodel import Session
+    from app.db import engine
+    from app.services.search import search
+
+    cases = {
+        "common term": ("w1", {}),
+        "two common terms": ("w2 w3", {}),
+        "mid-frequency term": ("w500", {}),
+        "rare term": ("w19000", {}),
+        "prefix": ("w123*", {}),
+        "common + board filter": ("w1", {"board_id": 2}),
+        "common + author filter": ("w4", {"author": "author"}),
+    }
+    with Session(engine) as session:
+        for name, (q, kw) in cases.items():
+            lat = []
+            for _ in range(n):
+                t0 = time.perf_counter()
+                hits, cursor = search(session, q, **kw)
+                lat.append(time.perf_counter() - t0)
+            page2 = []
+            for _ in range(max(1, n // 5)):
+                if not cursor:
+                    break
+                t0 = time.perf_counter()
+                search(session, q, cursor=cursor, **kw)
+                page2.append(time.perf_counter() - t0)
+            print(f"{name:<24} {_ms(lat)}   page 2: {_ms(page2) if page2 else '-'}")
+
+
+def _rebuild() -> None:
+    from app.db import engine
+    from app.services.search import rebuild
+
+    t0 = time.perf_counter()
+    with engine.begin() as conn:
+        counts = rebuild(conn)
+    print(f"rebuild: {counts} in {time.perf_counter() - t0:.1f}s")
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--posts", type=int, default=1_000_000)
+    ap.add_argument("--threads", type=int, default=20_000)
+    ap.add_argument("--queries", type=int, default=50)
+    ap.add_argument("--skip-rebuild", action="store_true")
+    args = ap.parse_args()
+    with tempfile.TemporaryDirectory() as d:
+        os.environ["COEVO_DB_URL"] = f"sqlite:///{d}/bench.db"
+        sys.path.insert(0, os.getcwd())
+        rng = random.Random(42)
+        _build(args.posts, args.threads, rng)
+        _queries(args.queries)
+        if not args.skip_rebuild:
+            _rebuild()
+        print(f"database size: {os.path.getsize(f'{d}/bench.db') / 1e6:.0f} MB")
+
+
+if __name__ == "__main__":
+    main()
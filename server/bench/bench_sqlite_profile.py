@@ -0,0 +1,112 @@
+"""Concurrent list_posts reads against a create_post write loop, per SQLite profile.
+
+Run from server/:
+    python -m bench.bench_sqlite_profile [--seconds 10] [--readers 8] [--seed-posts 500]
+
+Each profile runs in a fresh subprocess (settings are read at import time) against
+a temporary database, and reports write/read throughput and latency percentiles.
+"""
+import argparse
+import asyncio
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+
+def _pct(values: list[float], p: float) -> float:
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * p))] * 1000
+
+
+async def _run(seconds: float, readers: int, seed_posts: int) -> dict:
+    import httpx
+    from app.main import app
+
+    await app.router.startup()
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as c:
+        await c.post("/api/auth/register", json={"handle": "bench", "password": "benchpw"})
+        tok = (await c.post("/api/auth/login", json={"handle": "bench", "password": "benchpw"})).json()["access_token"]
+        h = {"Authorization": f"Bearer {tok}"}
+        board_id = (await c.get("/api/boards", headers=h)).json()[0]["id"]
+        thread_id = (await c.post(f"/api/boards/{board_id}/threads", json={"title": "bench"}, headers=h)).json()["id"]
+        for i in range(seed_posts):
+            await c.post(f"/api/threads/{thread_id}/posts", json={"content_md": f"seed {i}"}, headers=h)
+
+        stop = time.perf_counter() + seconds
+        write_lat: list[float] = []
+        read_lat: list[float] = []
+        errors = 0
+
+        async def writer():
+            nonlocal errors
+            i = 0
+            while time.perf_counter() < stop:
+                t0 = time.perf_counter()
+                r = await c.post(f"/api/threads/{thread_id}/posts", json={"content_md": f"bench write {i}"}, headers=h)
+                write_lat.append(time.perf_counter() - t0)
+                errors += r.status_code != 200
+                i += 1
+
+        async def reader():
+            nonlocal errors
+            while time.perf_counter() < stop:
+                t0 = time.perf_counter()
+                r = await c.get(f"/api/threads/{thread_id}/posts", headers=h)
+                read_lat.append(time.perf_counter() - t0)
+                errors += r.status_code != 200
+
+        await asyncio.gather(writer(), *[reader() for _ in range(readers)])
+    await app.router.shutdown()
+    return {
+        "writes_per_s": round(len(write_lat) / seconds, 1),
+        "write_p50_ms": round(_pct(write_lat, 0.50), 2),
+        "write_p99_ms": round(_pct(write_lat, 0.99), 2),
+        "reads_per_s": round(len(read_lat) / seconds, 1),
+        "read_p50_ms": round(_pct(read_lat, 0.50), 2),
+        "read_p99_ms": round(_pct(read_lat, 0.99), 2),
+        "errors": errors,
+    }
+
+
+def _child(args) -> None:
+    result = asyncio.run(_run(args.seconds, args.readers, args.seed_posts))
+    print(json.dumps(result))
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--seconds", type=float, default=10.0)
+    ap.add_argument("--readers", type=int, default=8)
+    ap.add_argument("--seed-posts", type=int, default=500)
+    ap.add_argument("--profiles", default="default,production")
+    ap.add_argument("--child", action="store_true")
+    args = ap.parse_args()
+    if args.child:
+        _child(args)
+        return
+
+    for profile in [p.strip() for p in args.profiles.split(",") if p.strip()]:
+        with tempfile.TemporaryDirectory() as d:
+            env = dict(os.environ)
+            env.update({
+                "COEVO_DB_URL": f"sqlite:///{d}/bench.db",
+                "COEVO_SQLITE_PROFILE": profile,
+                "COEVO_NODE_KEY_PATH": f"{d}/node_key.pem",
+                "COEVO_AGENT_ENABLED": "0",
+            })
+            cmd = [sys.executable, "-m", "bench.bench_sqlite_profile", "--child",
+                   "--seconds", str(args.seconds), "--readers", str(args.readers), "--seed-posts", str(args.seed_posts)]
+            out = subprocess.run(cmd, env=env, capture_output=True, text=True, check=True)
+            result = json.loads(out.stdout.strip().splitlines()[-1])
+            print(f"{profile:>10}: " + "  ".join(f"{k}={v}" for k, v in result.items()))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,141 @@
+"""Hold many concurrent SSE connections against one server process and report RSS per connection.
+
+Run from server/:
+    python -m bench.bench_sse_connections [--connections 10000] [--port 8799]
+
+Starts uvicorn in a subprocess on a scratch database, opens the connections with raw
+sockets (each subscribed to one thread and waiting for its keepalive), then reports the
+server's RSS growth per connection and how long one post takes to reach every client.
+Needs an open-files limit above the connection count (ulimit -n).
+"""
+import argparse
+import asyncio
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+OPEN_BATCH = 500
+
+
+def _rss_kb(pid: int) -> int:
+    with open(f"/proc/{pid}/status") as f:
+        for line in f:
+            if line.startswith("VmRSS:"):
+                return int(line.split()[1])
+    return 0
+
+
+class Client:
+    def __init__(self) -> None:
+        self.reader: asyncio.StreamReader | None = None
+        self.writer: asyncio.StreamWriter | None = None
+        self.seen_post = asyncio.Event()
+
+    async def connect(self, port: int, path: str) -> None:
+        self.reader, self.writer = await asyncio.open_connection("127.0.0.1", port)
+        self.writer.write(f"GET {path} HTTP/1.1\r\nHost: bench\r\nAccept: text/event-stream\r\n\r\n".encode())
+        await self.reader.readuntil(b"\r\n\r\n")
+        await self.reader.readuntil(b"keepalive")
+
+    async def listen(self) -> None:
+        while True:
+            chunk = await self.reader.read(65536)
+            if not chunk:
+                return
+            if b"post_created" in chunk:
+                self.seen_post.set()
+
+
+async def _wait_healthy(port: int) -> None:
+    import httpx
+
+    async with httpx.AsyncClient() as c:
+        for _ in range(100):
+            try:
+                if (await c.get(f"http://127.0.0.1:{port}/api/health")).status_code == 200:
+                    return
+            except httpx.TransportError:
+                pass
+            await asyncio.sleep(0.2)
+    raise RuntimeError("server did not start")
+
+
+async def _thread(port: int) -> tuple[dict, int]:
+    import httpx
+
+    async with httpx.AsyncClient(base_url=f"http://127.0.0.1:{port}", timeout=30) as c:
+        await c.post("/api/auth/register", json={"handle": "bencher", "password": "benchpw"})
+        tok = (await c.post("/api/auth/login", json={"handle": "bencher", "password": "benchpw"})).json()["access_token"]
+        h = {"Authorization": f"Bearer {tok}"}
+        return h, (await c.post("/api/boards/1/threads", json={"title": "fan-out"}, headers=h)).json()["id"]
+
+
+async def _post(port: int, h: dict, thread_id: int) -> float:
+    import httpx
+
+    async with httpx.AsyncClient(base_url=f"http://127.0.0.1:{port}", timeout=30) as c:
+        t0 = time.perf_counter()
+        await c.post(f"/api/threads/{thread_id}/posts", json={"content_md": "hello everyone"}, headers=h)
+        return t0
+
+
+async def _run(pid: int, port: int, connections: int) -> None:
+    await _wait_healthy(port)
+    h, thread_id = await _thread(port)
+    base = _rss_kb(pid)
+    clients = [Client() for _ in range(connections)]
+    t0 = time.perf_counter()
+    for i in range(0, connections, OPEN_BATCH):
+        await asyncio.gather(*(c.connect(port, f"/api/events?topics=thread:{thread_id}") for c in clients[i:i + OPEN_BATCH]))
+        print(f"\r  open: {min(i + OPEN_BATCH, connections)}/{connections}", end="", file=sys.stderr)
+    print(file=sys.stderr)
+    opened = time.perf_counter() - t0
+    listeners = [asyncio.create_task(c.listen()) for c in clients]
+    await asyncio.sleep(2)
+    held = _rss_kb(pid)
+
+    posted_at = await _post(port, h, thread_id)
+    await asyncio.gather(*(c.seen_post.wait() for c in clients))
+    fanout = time.perf_counter() - posted_at
+
+    print(f"connections:          {connections} (opened in {opened:.1f}s)")
+    print(f"server RSS:           {base / 1024:.0f} MB idle -> {held / 1024:.0f} MB holding them")
+    print(f"RSS per connection:   {(held - base) / connections:.1f} KB")
+    print(f"post -> all clients:  {fanout * 1000:.0f} ms")
+    for t in listeners:
+        t.cancel()
+    for c in clients:
+        c.writer.close()
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--connections", type=int, default=10_000)
+    ap.add_argument("--port", type=int, default=8799)
+    args = ap.parse_args()
+    with tempfile.TemporaryDirectory() as d:
+        env = {
+            **os.environ,
+            "COEVO_DB_URL": f"sqlite:///{d}/bench.db",
+            "COEVO_LOCK_DIR": d,
+            "COEVO_NODE_KEY_PATH": f"{d}/node_key.pem",
+            "COEVO_AGENT_ENABLED": "0",
+            "COEVO_EVENT_MAX_CONNECTIONS": str(args.connections + 100),
+        }
+        server = subprocess.Popen(
+            [sys.executable, "-m", "uvicorn", "app.main:app", "--port", str(args.port), "--log-level", "warning",
+             "--backlog", "4096"],
+            env=env,
+        )
+        try:
+            asyncio.run(_run(server.pid, args.port, args.connections))
+        finally:
+            # open SSE streams would hold up a graceful shutdown
+            server.kill()
+            server.wait()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,83 @@
+"""Post latency and watcher fan-out time against watcher count.
+
+Run from server/:
+    python -m bench.bench_watcher_fanout [--watchers 0,10,100,500,2000] [--posts 20]
+
+For each watcher count, reports the create_post request latency and the time the
+notify_watchers job takes to insert notifications and stage the email outbox.
+"""
+import argparse
+import asyncio
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+
+def _ms(values: list[float]) -> str:
+    if not values:
+        return "-"
+    values = sorted(values)
+    p99 = values[min(len(values) - 1, int(len(values) * 0.99))]
+    return f"p50={statistics.median(values) * 1000:.2f}ms p99={p99 * 1000:.2f}ms"
+
+
+async def _run(watcher_counts: list[int], posts: int) -> None:
+    import httpx
+    from sqlmodel import Session
+    from app.main import app
+    from app.db import engine, async_session_maker
+    from app.models import User, ThreadWatch
+    from app.routers.threads import _notify_watchers
+    from app.services.jobs import job_workers
+
+    await app.router.startup()
+    await job_workers.stop()  # time the fan-out directly instead of racing the workers
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as c:
+        await c.post("/api/auth/register", json={"handle": "author", "password": "benchpw"})
+        tok = (await c.post("/api/auth/login", json={"handle": "author", "password": "benchpw"})).json()["access_token"]
+        h = {"Authorization": f"Bearer {tok}"}
+        board_id = (await c.get("/api/boards", headers=h)).json()[0]["id"]
+
+        print(f"{'watchers':>8}  {'create_post':<34}  fan-out job")
+        for n in watcher_counts:
+            thread_id = (await c.post(f"/api/boards/{board_id}/threads", json={"title": f"fanout {n}"}, headers=h)).json()["id"]
+            with Session(engine) as s:
+                users = [User(handle=f"w{thread_id}_{i}", email=f"w{i}@example.com", password_hash="x") for i in range(n)]
+                s.add_all(users)
+                s.commit()
+                s.add_all([ThreadWatch(user_id=u.id, thread_id=thread_id) for u in users])
+                s.commit()
+
+            post_lat, fan_lat = [], []
+            for i in range(posts):
+                t0 = time.perf_counter()
+                r = await c.post(f"/api/threads/{thread_id}/posts", json={"content_md": f"post {i}"}, headers=h)
+                post_lat.append(time.perf_counter() - t0)
+                t0 = time.perf_counter()
+                async with async_session_maker() as session:
+                    await _notify_watchers(session, thread_id, None, r.json()["id"])
+                    await session.commit()
+                fan_lat.append(time.perf_counter() - t0)
+            print(f"{n:>8}  {_ms(post_lat):<34}  {_ms(fan_lat)}")
+    await app.router.shutdown()
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--watchers", default="0,10,100,500,2000")
+    ap.add_argument("--posts", type=int, default=20)
+    args = ap.parse_args()
+    with tempfile.TemporaryDirectory() as d:
+        os.environ.setdefault("COEVO_DB_URL", f"sqlite:///{d}/bench.db")
+        os.environ.setdefault("COEVO_NODE_KEY_PATH", f"{d}/node_key.pem")
+        os.environ["COEVO_AGENT_ENABLED"] = "0"
+        os.environ.pop("COEVO_SMTP_HOST", None)
+        sys.path.insert(0, os.getcwd())
+        asyncio.run(_run([int(x) for x in args.watchers.split(",") if x.strip()], args.posts))
+
+
+if __name__ == "__main__":
+    main()
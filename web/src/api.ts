@@ -51,12 +51,22 @@ export const api = {
   toggleSub: (boardId: number, subscribe: boolean) =>
     request(`/api/subscriptions/boards/${boardId}`, { method: "POST", body: JSON.stringify({ subscribe }) }),
 
-  threads: (boardId: number) => request(`/api/boards/${boardId}/threads`),
+  threads: (boardId: number, params: { before?: string; before_id?: number; limit?: number } = {}) => {
+    const qs = new URLSearchParams(Object.entries(params).filter(([, v]) => v !== undefined).map(([k, v]) => [k, String(v)])).toString()
+    return request(`/api/boards/${boardId}/threads${qs ? `?${qs}` : ""}`)
+  },
   createThread: (boardId: number, title: string) =>
     request(`/api/boards/${boardId}/threads`, { method: "POST", body: JSON.stringify({ title }) }),
 
   thread: (threadId: number) => request(`/api/threads/${threadId}`),
-  posts: (threadId: number) => request(`/api/threads/${threadId}/posts`),
+  search: (q: string, params: { board_id?: number; author?: string; since?: string; until?: string; limit?: number; cursor?: string } = {}) => {
+    const qs = new URLSearchParams(Object.entries({ q, ...params }).filter(([, v]) => v !== undefined).map(([k, v]) => [k, String(v)])).toString()
+    return request(`/api/search?${qs}`)
+  },
+  posts: (threadId: number, params: { after_id?: number; before_id?: number; limit?: number; order?: "asc" | "desc" } = {}) => {
+    const qs = new URLSearchParams(Object.entries(params).filter(([, v]) => v !== undefined).map(([k, v]) => [k, String(v)])).toString()
+    return request(`/api/threads/${threadId}/posts${qs ? `?${qs}` : ""}`)
+  },
   createPost: (threadId: number, content_md: string) =>
     request(`/api/threads/${threadId}/posts`, { method: "POST", body: JSON.stringify({ content_md }) }),
 
@@ -116,8 +126,17 @@ export const api = {
   auditExportUrl: () => buildUrl(`/api/audit/export`)
 }
 
-export function connectEvents(onMessage: (ev: any) => void) {
-  const es = new EventSource(buildUrl(`/api/events`))
+// topics: "global", "thread:{id}", "board:{id}", "user:me" (sends the stored token); none = all public events
+function eventsQuery(topics?: string[]): string {
+  if (!topics?.length) return ""
+  const params = new URLSearchParams({ topics: topics.join(",") })
+  const token = getToken()
+  if (token && topics.some(t => t.startsWith("user:"))) params.set("token", token)
+  return `?${params.toString()}`
+}
+
+export function connectEvents(onMessage: (ev: any) => void, topics?: string[]) {
+  const es = new EventSource(buildUrl(`/api/events${eventsQuery(topics)}`))
   es.addEventListener("message", (e: MessageEvent) => {
     try {
       const data = JSON.parse(e.data)
@@ -129,12 +148,35 @@ export function connectEvents(onMessage: (ev: any) => void) {
 }
 
 
-export function connectRealtime(onMessage: (ev: any) => void) {
+export function connectRealtime(onMessage: (ev: any) => void, topics?: string[]) {
+  // Reconnects with the last seen event id so the server replays what was missed;
+  // a {type: "resync"} event means the gap was too old and the caller should refetch.
+  // Speaks the v2 protocol (coevo.v2.json), which needs answers to the server's pings.
   const wsBase = API_BASE ? API_BASE.replace(/^http/, "ws") : ""
-  const ws = new WebSocket((wsBase || `${window.location.protocol === "https:" ? "wss" : "ws"}://${window.location.host}`) + `/api/ws`)
-  ws.onmessage = (e) => {
-    try { onMessage(JSON.parse(e.data)) } catch {}
+  let lastEventId: number | null = null
+  let ws: WebSocket | null = null
+  let closed = false
+  let retry = 0
+  const open = () => {
+    const q = eventsQuery(topics)
+    const resume = lastEventId ? `${q ? "&" : "?"}last_event_id=${lastEventId}` : ""
+    ws = new WebSocket((wsBase || `${window.location.protocol === "https:" ? "wss" : "ws"}://${window.location.host}`) + `/api/ws${q}${resume}`, ["coevo.v2.json"])
+    ws.onopen = () => { retry = 0 }
+    ws.onmessage = (e) => {
+      try {
+        const ev = JSON.parse(e.data)
+        if (ev?.type === "ping") { ws?.send(JSON.stringify({ op: "pong" })); return }
+        if (ev?.event_id) lastEventId = ev.event_id
+        onMessage(ev)
+      } catch {}
+    }
+    ws.onerror = () => {}
+    ws.onclose = () => {
+      if (closed) return
+      retry += 1
+      setTimeout(open, Math.min(30000, 500 * 2 ** retry))
+    }
   }
-  ws.onerror = () => {}
-  return () => ws.close()
+  open()
+  return () => { closed = true; ws?.close() }
 }
@@ -31,7 +31,8 @@ export default function Layout({ children }: { children: React.ReactNode }) {
         setUnread(u => u + 1)
         setNotifs(prev => [ev.notification, ...prev].slice(0, 25))
       }
-    })
+      if (ev?.type === "resync") refreshNotifs()
+    }, ["user:me"])
     return () => disconnect()
   }, [me?.id])
 
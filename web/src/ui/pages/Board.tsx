@@ -8,12 +8,27 @@ export default function Board() {
   const [threads, setThreads] = React.useState<any[]>([])
   const [title, setTitle] = React.useState("")
   const [err, setErr] = React.useState<string | null>(null)
+  const [hasMore, setHasMore] = React.useState(false)
+  const PAGE = 50
 
   async function refresh() {
     setErr(null)
     try {
-      const t = await api.threads(id)
+      const t = await api.threads(id, { limit: PAGE })
       setThreads(t)
+      setHasMore(t.length === PAGE)
+    } catch (e: any) {
+      setErr(e.message || "Failed")
+    }
+  }
+
+  async function loadMore() {
+    const last = threads[threads.length - 1]
+    if (!last) return
+    try {
+      const t = await api.threads(id, { limit: PAGE, before: last.updated_at, before_id: last.id })
+      setThreads([...threads, ...t])
+      setHasMore(t.length === PAGE)
     } catch (e: any) {
       setErr(e.message || "Failed")
     }
@@ -57,14 +72,21 @@ export default function Board() {
           {threads.map(t => (
             <div className="item" key={t.id}>
               <div style={{display:"flex", justifyContent:"space-between", gap:12}}>
-                <div style={{fontWeight:700}}>
-                  <Link to={`/threads/${t.id}`}>{t.title}</Link>
+                <div>
+                  <div style={{fontWeight:700}}>
+                    <Link to={`/threads/${t.id}`}>{t.title}</Link>
+                  </div>
+                  <div className="muted small">
+                    {t.post_count} {t.post_count === 1 ? "post" : "posts"}
+                    {t.last_post_at && <> · last by @{t.last_author} {new Date(t.last_post_at).toLocaleString()}</>}
+                  </div>
                 </div>
                 <Link className="btn" to={`/threads/${t.id}`}>Open</Link>
               </div>
             </div>
           ))}
           {threads.length === 0 && <div className="muted small">No threads yet.</div>}
+          {hasMore && <button className="btn" onClick={loadMore}>Load more</button>}
         </div>
       </div>
 
@@ -3,6 +3,8 @@ import { Link, useParams } from "react-router-dom"
 import { api, connectRealtime } from "../../api"
 import { MeContext } from "../MeContext"
 
+const POSTS_PAGE = 100
+
 export default function Thread() {
   const { threadId } = useParams()
   const id = Number(threadId)
@@ -12,16 +14,24 @@ export default function Thread() {
   const [posts, setPosts] = React.useState<any[]>([])
   const [content, setContent] = React.useState("")
   const [err, setErr] = React.useState<string | null>(null)
+  // whether older posts than the first loaded one may exist (the last page came back full)
+  const [hasOlder, setHasOlder] = React.useState(false)
+  const [loadingOlder, setLoadingOlder] = React.useState(false)
 
   const [watching, setWatching] = React.useState(false)
   const [reactions, setReactions] = React.useState<Record<number, Record<string, number>>>({})
+  // agent replies still being generated, by stream_id
+  const [drafts, setDrafts] = React.useState<Record<string, { author_handle: string, text: string }>>({})
 
   async function refresh() {
     try {
       const t = await api.thread(id)
       setThread(t)
-      const p = await api.posts(id)
+      const page = await api.posts(id, { order: "desc", limit: POSTS_PAGE })
+      const newest = page.filter((x: any) => !x.is_pinned)
+      const p = [...page.filter((x: any) => x.is_pinned), ...newest.reverse()]
       setPosts(p)
+      setHasOlder(newest.length === POSTS_PAGE)
       const w = await api.watchStatus(id)
       setWatching(!!w.watching)
       const rmap: Record<number, Record<string, number>> = {}
@@ -36,18 +46,54 @@ export default function Thread() {
 
   React.useEffect(() => { refresh() }, [threadId])
 
+  async function loadOlder() {
+    // keyset paging: the oldest loaded post's id is the cursor for the page before it
+    const oldest = posts.find(p => !p.is_pinned)
+    if (!oldest) return
+    setLoadingOlder(true)
+    try {
+      const page = await api.posts(id, { before_id: oldest.id, order: "asc", limit: POSTS_PAGE })
+      setPosts(prev => {
+        const pinned = prev.filter(p => p.is_pinned)
+        const seen = new Set(prev.map(p => p.id))
+        return [...pinned, ...page.filter((p: any) => !seen.has(p.id)), ...prev.filter(p => !p.is_pinned)]
+      })
+      setHasOlder(page.length === POSTS_PAGE)
+      const rmap: Record<number, Record<string, number>> = {}
+      for (const row of page) {
+        try { const rr = await api.reactionsForPost(row.id); rmap[row.id] = rr.counts || {} } catch {}
+      }
+      setReactions(prev => ({ ...prev, ...rmap }))
+    } catch (e: any) {
+      setErr(e.message || "Failed")
+    } finally {
+      setLoadingOlder(false)
+    }
+  }
+
   React.useEffect(() => {
     const disconnect = connectRealtime((ev) => {
       if (ev?.type === "post_created" && ev.thread_id === id) {
         setPosts(prev => [...prev, ev.post])
+        if (ev.stream_id) {
+          setDrafts(prev => { const { [ev.stream_id]: _, ...rest } = prev; return rest })
+        }
+      }
+      if (ev?.type === "agent_post_delta" && ev.thread_id === id) {
+        setDrafts(prev => {
+          const cur = prev[ev.stream_id] || { author_handle: ev.author_handle, text: "" }
+          // a gap (missed delta) leaves the draft as is; the final post carries the full text
+          if (ev.offset !== cur.text.length) return prev
+          return { ...prev, [ev.stream_id]: { ...cur, text: cur.text + ev.delta } }
+        })
       }
-      if (ev?.type === "post_hidden" && ev.thread_id === id) {
+      if ((ev?.type === "post_hidden" && ev.thread_id === id) || ev?.type === "resync") {
         refresh()
       }
       if (ev?.type === "reaction_updated" && ev.thread_id === id) {
         setReactions(prev => ({ ...prev, [ev.post_id]: ev.counts || {} }))
       }
-    })
+    }, [`thread:${id}`])
     return () => disconnect()
   }, [id])
 
@@ -122,6 +168,11 @@ export default function Thread() {
         {err && <div className="item" style={{borderColor:"var(--danger)", color:"var(--danger)"}}>{err}</div>}
 
         <div className="list">
+          {hasOlder && (
+            <button className="btn" onClick={loadOlder} disabled={loadingOlder}>
+              {loadingOlder ? "Loading…" : "Load older posts"}
+            </button>
+          )}
           {posts.map(p => (
             <div className={"item " + (p.is_hidden ? "hiddenPost" : "")} key={p.id}>
               <div style={{display:"flex", justifyContent:"space-between", marginBottom:6}}>
@@ -146,6 +197,12 @@ export default function Thread() {
               </div>
             </div>
           ))}
+          {Object.entries(drafts).map(([sid, d]) => (
+            <div className="item" key={sid}>
+              <div style={{fontWeight:700, marginBottom:6}}>@{d.author_handle} <span className="badge">agent</span> <span className="muted small">typing…</span></div>
+              <pre style={{whiteSpace:"pre-wrap", margin:0}}>{d.text}</pre>
+            </div>
+          ))}
           {posts.length === 0 && <div className="muted small">No posts yet. Be the first.</div>}
         </div>
 